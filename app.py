@@ -1,17 +1,32 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from flask_socketio import SocketIO, emit
-from flask_mail import Mail, Message
+from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+from flask_mail import Mail
 import pandas as pd
+import atexit
+import fcntl
 import json
+import math
 import os
+import time
 from datetime import datetime, timedelta
+from io import BytesIO
 import random
 
 from utils.predictor import ServicePredictor
-from utils.inventory_manager import InventoryManager
-from utils.workload_manager import WorkloadManager
+from utils.site_router import ShardUnavailableError, SiteRouter, UnknownSiteError
+from utils.broadcast_scheduler import BroadcastScheduler
+from utils.change_feed import ChangeFeed
+from utils.mail_outbox import MailOutbox
 from utils.notifier import Notifier
+from utils.parts_matrix import TASK_PARTS, validate_bookings
+from utils.report_cache import ReportCache
+from utils.report_export import filter_services, stream_report_pdf, stream_report_zip
 from utils.report_generator import ReportGenerator
+from utils.report_jobs import ReportJobManager
+from utils.service_history import ServiceHistory
+from utils.service_registry import ServiceRegistry
+from utils.stage_pipeline import StagePipeline
+from utils.state_server import StateClient, StateServerManager
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'volvo_service_intelligence_2024_secret_key'
@@ -21,17 +36,68 @@ app.config['MAIL_USE_TLS'] = True
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'vsis@volvo.com')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', 'password')
 app.config['MAIL_DEFAULT_SENDER'] = 'vsis@volvo.com'
+# Emails are only handed to the SMTP server when MAIL_ENABLED=1; otherwise the outbox drains without sending
+app.config['MAIL_SUPPRESS_SEND'] = os.environ.get('MAIL_ENABLED') != '1'
+
+# VSIS_STATE_SERVER=<host:port> keeps the shared state in a state server, so several web workers
+# can serve the same sites (see utils/state_server.py). Their SocketIO emits then reach every
+# worker's clients through it, or through VSIS_SOCKETIO_QUEUE (e.g. redis://...) when that is set.
+# Workers authenticate with VSIS_STATE_AUTHKEY, which gunicorn.conf.py generates when it is unset.
+state_client = StateClient.from_env()
+socketio_options = {}
+if os.environ.get('VSIS_SOCKETIO_QUEUE'):
+    socketio_options['message_queue'] = os.environ['VSIS_SOCKETIO_QUEUE']
+elif state_client is not None:
+    socketio_options['client_manager'] = StateServerManager(state_client)
 
 # FIX: Changed from 'eventlet' to 'threading' for Python 3.13 compatibility
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', **socketio_options)
 mail = Mail(app)
 
+report_generator = ReportGenerator()
+# Rendered reports are reused until the service record changes; VSIS_REPORT_CACHE_MB bounds the disk used
+report_cache = ReportCache('reports/cache', int(os.environ.get('VSIS_REPORT_CACHE_MB', 200)) * 1024 * 1024)
+# Background renders run on a process pool of VSIS_REPORT_WORKERS (default 2) per web worker. The
+# pool starts on the first render and its workers are spawned, not forked from this threaded process.
+report_jobs = ReportJobManager(report_cache, max(1, int(os.environ.get('VSIS_REPORT_WORKERS', 2))))
+
 # Initialize managers
 predictor = ServicePredictor('volvo_service_model.pkl')
-inventory_manager = InventoryManager('data/inventory.json')
-workload_manager = WorkloadManager('data/workload.json')
-notifier = Notifier(mail, app)
-report_generator = ReportGenerator()
+# One WorkloadManager/InventoryManager shard per service center (VSIS_SITES, VSIS_SHARD_PROCESSES)
+site_router = SiteRouter.from_env('data', state_client)
+if state_client is not None:
+    service_registry = state_client.proxy('registry')
+    service_history = state_client.proxy('history')
+    change_feed = state_client.proxy('feed')
+else:
+    # Every booked service by ID, indexed by site and status, worker and number plate
+    service_registry = ServiceRegistry(site_router.default_site)
+    # Completed services go to an SQLite history; only the newest VSIS_HISTORY_HOT stay in memory
+    service_history = ServiceHistory(os.environ.get('VSIS_HISTORY_DB', 'data/service_history.db'),
+                                     int(os.environ.get('VSIS_HISTORY_HOT', 200)))
+    # Dashboards receive state as versioned patches of what changed (see publish_state)
+    change_feed = ChangeFeed()
+mail_outbox = MailOutbox(mail, app, os.environ.get('VSIS_OUTBOX_DB', 'data/outbox.db'))
+if state_client is None:
+    mail_outbox.start()
+else:
+    # Web workers share the outbox database, but only the one holding its lock file delivers
+    outbox_lock = open(os.environ.get('VSIS_OUTBOX_DB', 'data/outbox.db') + '.lock', 'w')
+    try:
+        fcntl.flock(outbox_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        mail_outbox.start()
+    except BlockingIOError:
+        print("📭 Another web worker delivers the mail outbox")
+# Repeat low-stock alerts for a part are held back for VSIS_ALERT_WINDOW seconds;
+# VSIS_ALERT_DIGEST=<seconds> instead folds all alerts in that window into one email
+notifier = Notifier(
+    mail_outbox,
+    alert_windows={'low_stock': int(os.environ.get('VSIS_ALERT_WINDOW', 3600))},
+    digest_window=int(os.environ.get('VSIS_ALERT_DIGEST', 0))
+)
+# Alerts waiting for the digest timer are queued on shutdown rather than lost; registered before
+# the pipeline drain, so it runs after the notify stage has handed over its last alerts
+atexit.register(notifier.close)
 
 # Service tasks with time estimates
 SERVICE_TASKS = {
@@ -54,22 +120,252 @@ SERVICE_TASKS = {
     ]
 }
 
-# Parts required for each task
-TASK_PARTS = {
-    'engine_oil': ['engine_oil', 'oil_filter'],
-    'air_filter': ['air_filter'],
-    'spark_plugs': ['spark_plugs'],
-    'brake_pads': ['brake_pads'],
-    'brake_fluid': ['brake_fluid'],
-    'wheel_alignment': [],
-    'tire_rotation': [],
-    'ac_service': ['ac_gas', 'ac_cleaner'],
-    'ac_filter': ['ac_filter']
-}
+# Queued services hold their parts for as long as the longest wait estimate
+QUEUE_RESERVATION_TTL = 8 * 3600
+
+# Booking fields kept in a service record's car_details
+CAR_DETAIL_FIELDS = ('car_model', 'manufacture_year', 'fuel_type', 'service_type', 'number_plate', 'total_km',
+                     'km_since_last_service', 'days_since_last_service', 'selected_tasks')
+
+def get_site_id():
+    """Resolve the service center a request is for (?site=, X-Site-ID header or JSON site_id)"""
+    site_id = request.args.get('site') or request.headers.get('X-Site-ID')
+    if not site_id and request.is_json:
+        site_id = (request.get_json(silent=True) or {}).get('site_id')
+    return site_id or site_router.default_site
+
+def admin_room(site_id):
+    """SocketIO room of a site's dashboards: state patches, alerts and new bookings"""
+    return f'admin:{site_id}'
+
+def service_room(service_id):
+    """SocketIO room of the customers following one booking"""
+    return f'service:{service_id}'
+
+def notify_service(service):
+    """Tell the customers following a booking that its status changed"""
+    broadcasts.emit('service_update', service, service_room(service['service_id']))
+
+def activate_promoted_services(shard):
+    """Move queued services that a completion just handed to a worker over to active"""
+    for promotion in shard.workload_manager.get_last_promoted():
+        assignment = promotion['worker_assignment']
+        service = service_registry.update(
+            promotion['service_data']['service_id'],
+            status='active',
+            worker_assigned=assignment,
+            completion_time=assignment.get('completion_time'),
+            start_time=datetime.now().isoformat() if assignment.get('immediate_start') else None
+        )
+        if service:
+            notify_service(service)
+
+def commit_promoted_reservations(shard):
+    """Deduct the held parts of queued services that a completion just handed to a worker
+
+    A hold that has expired meanwhile is replaced by deducting the parts now.
+    """
+    for promotion in shard.workload_manager.get_last_promoted():
+        queue_item = promotion['original_queue_item']
+        if shard.inventory_manager.commit_reservation(queue_item['service_id']):
+            continue
+        print(f"⚠️ Parts hold of {queue_item['service_id']} had expired, deducting its parts now")
+        inventory_status = shard.inventory_manager.check_and_deduct_parts(queue_item.get('selected_tasks', []))
+        service_registry.update(queue_item['service_id'], inventory_status=service_parts(inventory_status))
+
+def dispatch_stock_events(shard, site_id):
+    """Send one alert per low-stock threshold crossing (and a notice when a part recovers)"""
+    for event in shard.inventory_manager.pop_stock_events():
+        if event['type'] == 'low_stock':
+            notifier.send_low_stock_alert(event['name'], event['quantity'], site_id)
+            broadcasts.emit('low_stock_alert', {
+                'part_name': event['name'],
+                'quantity': event['quantity'],
+                'site_id': site_id,
+                'timestamp': event['timestamp']
+            }, admin_room(site_id))
+        else:
+            broadcasts.emit('stock_restored', {
+                'part_name': event['name'],
+                'quantity': event['quantity'],
+                'site_id': site_id,
+                'timestamp': event['timestamp']
+            }, admin_room(site_id))
+
+def service_parts(inventory_status):
+    """The parts part of a service record: what it uses, and the ledger reference of the movements.
+
+    Stock levels are not copied into records; clients get them from inventory_update.
+    """
+    return {
+        'available': inventory_status['available'],
+        'required_parts': inventory_status['required_parts'],
+        'unavailable_parts': inventory_status['unavailable_parts'],
+        'ledger_ref': inventory_status['reservation_id']
+    }
+
+def open_services(site_id):
+    """A site's services that are not finished yet: in progress, then waiting in the queue"""
+    return service_registry.find('active', site_id) + service_registry.find('queued', site_id)
+
+SERVICE_QUERY_ARGS = ('cursor', 'limit', 'status', 'worker', 'specialization', 'car_model')
+
+def service_query_args():
+    """service_registry.query() arguments from the request's paging and filter parameters
+
+    Raises ValueError for a cursor, limit or status the query cannot take.
+    """
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', '50')
+    statuses = (request.args.get('status') or 'active,queued').split(',')
+    if (cursor is not None and not cursor.isdigit()) or not limit.isdigit() or not 1 <= int(limit) <= 100:
+        raise ValueError('cursor must be a next_cursor value and limit between 1 and 100')
+    if any(status not in ('active', 'queued') for status in statuses):
+        raise ValueError('status must be active, queued or active,queued')
+    return {
+        'statuses': statuses,
+        'worker_id': request.args.get('worker') or None,
+        'specialization': request.args.get('specialization') or None,
+        'car_model': request.args.get('car_model') or None,
+        'cursor': int(cursor) if cursor else None,
+        'limit': int(limit)
+    }
 
-# Store active services
-active_services = []
-completed_services = []
+def recent_completed_services(site_id):
+    return service_history.page(site_id)['services']
+
+STATE_CHANNELS = ('workload', 'inventory', 'services', 'completed')
+
+# Versions restart with the process holding the state, so the snapshot ETag also names its start
+if state_client is not None:
+    SNAPSHOT_EPOCH = state_client.call('server', None, 'get_epoch')
+else:
+    SNAPSHOT_EPOCH = datetime.now().strftime('%Y%m%d%H%M%S')
+snapshot_cache = {}  # site_id -> (etag, JSON body) of the latest /api/snapshot
+
+def channel_state(site_id, channel):
+    """Current (state keyed by ID, meta) of one of a site's state channels"""
+    shard = site_router.get(site_id)
+    if channel == 'workload':
+        data = shard.workload_manager.get_workload_data()
+        return {worker['id']: worker for worker in data['workers']}, {'summary': data['summary'], 'version': data['version']}
+    if channel == 'inventory':
+        return shard.inventory_manager.get_inventory_data(), None
+    if channel == 'services':
+        return {service['service_id']: service for service in open_services(site_id)}, None
+    if channel == 'completed':
+        return {service['service_id']: service for service in recent_completed_services(site_id)}, None
+    raise ValueError(f'Unknown state channel: {channel}')
+
+def publish_state(site_id, *channels):
+    """Send the site's room a patch for each channel whose state changed; returns the patches sent"""
+    sent = 0
+    for channel in channels:
+        state, meta = channel_state(site_id, channel)
+        patch = change_feed.update(site_id, channel, state, meta)
+        if patch:
+            socketio.emit('state_patch', patch, to=admin_room(site_id))
+            sent += 1
+    return sent
+
+# Request handlers mark channels dirty; a background thread publishes them at most
+# VSIS_BROADCAST_RATE times a second, so a burst of changes goes out as one patch
+broadcasts = BroadcastScheduler(
+    publish_state,
+    lambda event, data, room: socketio.emit(event, data, to=room),
+    max_rate=float(os.environ.get('VSIS_BROADCAST_RATE', 10))
+).start()
+
+def register_persisted_services():
+    """Add the jobs and queue each site's workload manager restored from disk to the registry"""
+    for site_id in site_router.sites():
+        if service_registry.count('active', site_id) or service_registry.count('queued', site_id):
+            continue  # Another web worker sharing the registry has registered them already
+        workload_manager = site_router.get(site_id).workload_manager
+        specializations = {worker['id']: worker.get('specialization') for worker in workload_manager.get_workers()}
+        for service_id, service_info in workload_manager.get_all_active_services().items():
+            if service_info.get('booking'):
+                service_registry.add({**service_info['booking'], 'site_id': site_id, 'status': 'active'})
+                continue
+            # Jobs saved before bookings were kept with them: rebuild what the job records
+            job_data = service_info['job_data']
+            service_registry.add({
+                'service_id': service_id,
+                'site_id': site_id,
+                'car_details': {'car_model': job_data['car_model'], 'service_type': job_data['service_type']},
+                'predicted_time': job_data['original_duration'],
+                'worker_assigned': {
+                    'worker_id': service_info['worker_id'],
+                    'worker_name': service_info['worker_name'],
+                    'specialization': specializations.get(service_info['worker_id']),
+                    'completion_time': job_data['completion_time']
+                },
+                'completion_time': job_data['completion_time'],
+                'status': 'active',
+                'start_time': job_data['start_time'],
+                'timestamp': job_data['assigned_at']
+            })
+        for position, queue_item in enumerate(workload_manager.get_service_queue(), 1):
+            if queue_item.get('booking'):
+                booking = queue_item['booking']
+                service_registry.add({**booking, 'site_id': site_id, 'status': 'queued',
+                                      'worker_assigned': {**booking['worker_assigned'], 'queue_position': position}})
+                continue
+            service_registry.add({
+                'service_id': queue_item['service_id'],
+                'site_id': site_id,
+                'car_details': {'car_model': queue_item['car_model'], 'service_type': queue_item['service_type']},
+                'predicted_time': queue_item['job_duration'],
+                'worker_assigned': {
+                    'worker_id': None,
+                    'worker_name': 'Queue',
+                    'required_specialization': queue_item.get('required_specialization'),
+                    'queue_position': position,
+                    'estimated_wait_time': queue_item['estimated_wait_time']
+                },
+                'status': 'queued',
+                'timestamp': queue_item['added_to_queue']
+            })
+
+register_persisted_services()
+
+def persist_stage(job):
+    site_router.get(job['site_id']).workload_manager.flush()
+
+def broadcast_stage(job):
+    broadcasts.mark(job['site_id'], *job['channels'])
+    for event, data in job.get('events', ()):
+        broadcasts.emit(event, data, admin_room(job['site_id']))
+
+def notify_stage(job):
+    dispatch_stock_events(site_router.get(job['site_id']), job['site_id'])
+
+# Handlers respond once the workload and stock are updated; writing the workload file,
+# broadcasting and low-stock alerts follow in this order on a background thread.
+# At most VSIS_PIPELINE_PENDING jobs wait before handlers start running them themselves.
+side_effects = StagePipeline(
+    [('persist', persist_stage), ('broadcast', broadcast_stage), ('notify', notify_stage)],
+    max_pending=int(os.environ.get('VSIS_PIPELINE_PENDING', 1000))
+).start()
+for site_id in site_router.sites():
+    site_router.get(site_id).workload_manager.set_defer_saves(True)
+# Registered after the managers' flushes, so it runs before them at exit
+atexit.register(side_effects.drain)
+
+@app.context_processor
+def socket_settings():
+    # Long-polling needs every request of a client to reach the same process; with several
+    # web workers behind one port there is no such guarantee, so they use WebSocket only
+    return {'socket_transports': 'websocket' if state_client is not None else 'polling,websocket'}
+
+@app.errorhandler(UnknownSiteError)
+def handle_unknown_site(e):
+    return jsonify({'success': False, 'error': f'Unknown site: {e.args[0]}'}), 404
+
+@app.errorhandler(ShardUnavailableError)
+def handle_shard_unavailable(e):
+    print(f"❌ {e}")
+    return jsonify({'success': False, 'error': 'This site is restarting, please retry'}), 503
 
 @app.route('/')
 def index():
@@ -81,6 +377,11 @@ def admin():
 
 @app.route('/predict', methods=['POST'])
 def predict_service_time():
+    started = time.perf_counter()
+    site_id = get_site_id()
+    shard = site_router.get(site_id)
+    workload_manager = shard.workload_manager
+    inventory_manager = shard.inventory_manager
     try:
         data = request.get_json()
         print(f"📥 Received prediction request: {data}")
@@ -96,6 +397,9 @@ def predict_service_time():
         km_since_last = data.get('km_since_last_service', 5000)
         days_since_last = data.get('days_since_last_service', 90)
         selected_tasks = data.get('selected_tasks', [])
+        if not isinstance(selected_tasks, list) or not all(
+                isinstance(task, str) and task in TASK_PARTS for task in selected_tasks):
+            return jsonify({'success': False, 'error': f'selected_tasks must list known task IDs: {", ".join(TASK_PARTS)}'}), 400
         
         print(f"🔧 Selected tasks: {selected_tasks}")
 
@@ -127,22 +431,30 @@ def predict_service_time():
         worker_assignment, service_data_from_worker = workload_manager.assign_worker(
             predicted_time, 
             data['service_type'], 
-            data['car_model']
+            data['car_model'],
+            selected_tasks
         )
         
         print(f"👷 Worker assignment: {worker_assignment}")
 
-        # Check and deduct inventory
-        inventory_status = inventory_manager.check_and_deduct_parts(selected_tasks)
-        print(f"📦 Inventory status: {'Available' if inventory_status['available'] else 'Unavailable'}")
-
         # Use the service ID from the workload manager
         service_id = service_data_from_worker['service_id']
 
+        if worker_assignment['worker_id']:
+            # Check and deduct inventory
+            inventory_status = inventory_manager.check_and_deduct_parts(selected_tasks)
+        else:
+            # Queued services hold their parts until a worker picks them up
+            inventory_status = inventory_manager.reserve_parts_for_tasks(
+                selected_tasks, ttl=QUEUE_RESERVATION_TTL, reservation_id=service_id)
+        print(f"📦 Inventory status: {'Available' if inventory_status['available'] else 'Unavailable'}")
+        inventory_status = service_parts(inventory_status)
+
         # Create service record using data from workload manager
         service_data = {
             'service_id': service_id,
-            'car_details': data,
+            'site_id': site_id,
+            'car_details': {field: data[field] for field in CAR_DETAIL_FIELDS if field in data},
             'predicted_time': predicted_time,
             'worker_assigned': worker_assignment,
             'completion_time': worker_assignment.get('completion_time'),
@@ -152,37 +464,31 @@ def predict_service_time():
             'timestamp': datetime.now().isoformat()
         }
 
-        # Only add to active_services if it's actually assigned to a worker (not queued)
+        service_registry.add(service_data)
+        workload_manager.attach_booking(service_id, service_data)
         if worker_assignment['worker_id']:
-            active_services.append(service_data)
-            print(f"✅ Added to active services. Total active: {len(active_services)}")
+            print(f"✅ Added to active services. Total active: {service_registry.count('active', site_id)}")
         else:
-            print(f"⏳ Service queued. Total queued: {len(workload_manager.service_queue)}")
-
-        # Emit real-time updates
-        socketio.emit('workload_update', workload_manager.get_workload_data())
-        socketio.emit('inventory_update', inventory_manager.get_inventory_data())
-        socketio.emit('service_assigned', service_data)
-        socketio.emit('active_services_update', active_services)
-
-        # Check for low stock alerts
-        low_stock_parts = inventory_manager.check_low_stock()
-        for part in low_stock_parts:
-            notifier.send_low_stock_alert(part['name'], part['quantity'])
-            socketio.emit('low_stock_alert', {
-                'part_name': part['name'],
-                'quantity': part['quantity'],
-                'timestamp': datetime.now().isoformat()
-            })
+            print(f"⏳ Service queued. Total queued: {service_registry.count('queued', site_id)}")
+
+        # Save, emit real-time updates and alert on parts this booking took below their
+        # low-stock threshold after responding
+        side_effects.submit({
+            'site_id': site_id,
+            'channels': ('workload', 'inventory', 'services'),
+            'events': [('service_assigned', service_data)]
+        })
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'predicted_time': predicted_time,
             'service_id': service_id,
             'worker_assigned': worker_assignment,
             'inventory_status': inventory_status,
-            'queue_info': workload_manager.get_queue_info()
+            'queue_info': workload_manager.get_queue_info(data['service_type'])
         })
+        side_effects.observe('predict_response', time.perf_counter() - started)
+        return response
         
     except Exception as e:
         error_msg = f'Prediction failed: {str(e)}'
@@ -194,23 +500,113 @@ def predict_service_time():
 @app.route('/generate_report/<service_id>')
 def generate_report(service_id):
     try:
-        # Find service data
-        service_data = next((s for s in completed_services if s['service_id'] == service_id), None)
+        service_data = service_history.get(service_id)
         if not service_data:
             return jsonify({'error': 'Service not found'}), 404
             
-        pdf_path = report_generator.generate_service_report(service_data)
-        return send_file(pdf_path, as_attachment=True, download_name=f'{service_id}_report.pdf')
+        # Misses render straight into memory and are sent without a disk round trip
+        report_key, pdf_bytes = report_cache.get_bytes_or_render(
+            service_data, lambda: report_generator.render_service_report(service_data))
+        # The content hash is the ETag, so unchanged reports answer If-None-Match with 304
+        return send_file(BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                         download_name=f'{service_id}_report.pdf', etag=report_key, conditional=True, max_age=0)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/reports/<service_id>/render', methods=['POST'])
+def render_report(service_id):
+    service_data = service_history.get(service_id)
+    if not service_data:
+        return jsonify({'error': 'Service not found'}), 404
+    
+    job = report_jobs.submit(service_data)
+    return jsonify({
+        **job,
+        'status_url': f"/reports/jobs/{job['job_id']}",
+        'download_url': f"/reports/jobs/{job['job_id']}/download"
+    }), 202
+
+@app.route('/reports/jobs/<job_id>')
+def report_job_status(job_id):
+    job = report_jobs.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/reports/jobs/<job_id>/download')
+def download_report_job(job_id):
+    job = report_jobs.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': 'Report is not ready', **job}), 409
+    
+    report = report_jobs.get_report_path(job_id)
+    if not report:
+        return jsonify({'error': 'Report expired from the cache, render it again'}), 410
+    report_key, pdf_path = report
+    return send_file(pdf_path, as_attachment=True, download_name=f"{job['service_id']}_report.pdf",
+                     etag=report_key, conditional=True, max_age=0)
+
+@app.route('/reports/export')
+def export_reports():
+    """Stream the reports of every completed service matching the filters as a ZIP or one PDF"""
+    export_format = request.args.get('format', 'zip')
+    if export_format not in ('zip', 'pdf'):
+        return jsonify({'error': 'format must be zip or pdf'}), 400
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': 'from/to must be YYYY-MM-DD dates'}), 400
+    
+    # Snapshot the matching records now; the stream runs after this request handler returns
+    services = list(filter_services(
+        service_history.select(get_site_id(), date_from, date_to),
+        worker=request.args.get('worker'),
+        car_model=request.args.get('car_model')
+    ))
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    
+    if export_format == 'zip':
+        body = stream_report_zip(services, report_cache, report_generator)
+        mimetype, filename = 'application/zip', f'service_reports_{stamp}.zip'
+    else:
+        body = stream_report_pdf(services, report_generator)
+        mimetype, filename = 'application/pdf', f'service_reports_{stamp}.pdf'
+    print(f"📦 Exporting {len(services)} report(s) as {export_format}")
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Report-Count': str(len(services))
+    })
+
+@app.route('/api/reports/cache')
+def api_report_cache():
+    return jsonify({**report_cache.get_stats(), 'render_pool': report_jobs.get_stats()})
+
 @app.route('/restock/<part_name>')
 def restock_part(part_name):
+    site_id = get_site_id()
+    shard = site_router.get(site_id)
+    inventory_manager = shard.inventory_manager
     try:
-        success = inventory_manager.restock_part(part_name, 5)
+        # Restock what the forecast suggests unless the admin asks for a specific quantity
+        quantity = request.args.get('quantity') or None
+        if quantity is not None:
+            if not quantity.isdigit() or int(quantity) <= 0:
+                return jsonify({'success': False, 'error': 'quantity must be a positive whole number'}), 400
+            quantity = int(quantity)
+        else:
+            quantity = inventory_manager.suggest_restock_quantity(
+                part_name, shard.workload_manager.get_queued_tasks())
+        success = inventory_manager.restock_part(part_name, quantity)
         if success:
-            socketio.emit('inventory_update', inventory_manager.get_inventory_data())
-            return jsonify({'success': True, 'message': f'{part_name} restocked successfully'})
+            side_effects.submit({'site_id': site_id, 'channels': ('inventory',)})
+            return jsonify({'success': True, 'quantity': quantity,
+                            'message': f'{part_name} restocked successfully (+{quantity})'})
         else:
             return jsonify({'success': False, 'error': 'Part not found'})
     except Exception as e:
@@ -219,115 +615,59 @@ def restock_part(part_name):
 @app.route('/complete_service/<service_id>')
 def complete_service(service_id):
     try:
-        global active_services, completed_services
+        # The service record knows which site's workload manager owns it
+        service = service_registry.get(service_id)
+        site_id = service['site_id'] if service else get_site_id()
+        shard = site_router.get(site_id)
+        workload_manager = shard.workload_manager
+        
+        # Update worker workload - this also removes it from workload_manager.active_services
+        success = workload_manager.complete_service(service_id)
+        if not success:
+            return jsonify({'success': False, 'error': 'Service not found in active services or workload manager'})
         
-        # Find service in active_services
-        service_index = next((i for i, s in enumerate(active_services) if s['service_id'] == service_id), None)
-        if service_index is not None:
-            service = active_services.pop(service_index)
+        if service and service['status'] == 'active':
+            service_registry.remove(service_id)
             service['status'] = 'completed'
             service['completed_at'] = datetime.now().isoformat()
-            completed_services.append(service)
-            
-            # Update worker workload - this will also remove from workload_manager.active_services
-            success = workload_manager.complete_service(service_id)
-            
-            if success:
-                # Emit updates
-                socketio.emit('workload_update', workload_manager.get_workload_data())
-                socketio.emit('active_services_update', active_services)
-                socketio.emit('completed_services_update', completed_services[-10:])
-                
-                print(f"✅ Completed service {service_id}. Active services: {len(active_services)}")
-                
-                return jsonify({'success': True, 'message': 'Service completed successfully'})
-            else:
-                return jsonify({'success': False, 'error': 'Failed to complete service in workload manager'})
+            service_history.add(service)
+            notify_service(service)
         else:
-            # Service might only be in workload manager (queued or assigned but not in active_services)
-            success = workload_manager.complete_service(service_id)
-            if success:
-                socketio.emit('workload_update', workload_manager.get_workload_data())
-                return jsonify({'success': True, 'message': 'Service completed via workload manager'})
-            else:
-                return jsonify({'success': False, 'error': 'Service not found in active services or workload manager'})
+            # A queued service is cancelled and gives back its held parts
+            shard.inventory_manager.release_reservation(service_id)
+            if service_registry.remove(service_id):
+                notify_service({**service, 'status': 'cancelled'})
+        
+        # A finished service may hand queued ones to its worker
+        activate_promoted_services(shard)
+        commit_promoted_reservations(shard)
+        
+        side_effects.submit({'site_id': site_id, 'channels': STATE_CHANNELS})
+        
+        print(f"✅ Completed service {service_id}. Active services: {service_registry.count('active', site_id)}")
+        return jsonify({'success': True, 'message': 'Service completed successfully'})
+    except (UnknownSiteError, ShardUnavailableError):
+        raise
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 # NEW ENDPOINTS ADDED BELOW
 
-@app.route('/admin/sync_data')
-def sync_data():
-    """Manually sync data between workload manager and active_services"""
-    global active_services
-    
-    # Get current counts for debugging
-    workload_active_count = workload_manager.get_active_services_count()
-    app_active_count = len(active_services)
-    
-    print(f"🔄 Syncing data: Workload has {workload_active_count} services, App has {app_active_count} services")
-    
-    # Clear active_services and rebuild from workload manager
-    active_services.clear()
-    
-    # Rebuild active_services from workload manager data
-    all_workload_services = workload_manager.get_all_active_services()
-    for service_id, service_info in all_workload_services.items():
-        # Create a simplified service record for the app
-        active_services.append({
-            'service_id': service_id,
-            'car_details': {
-                'car_model': service_info['job_data']['car_model'],
-                'service_type': service_info['job_data']['service_type']
-            },
-            'predicted_time': service_info['job_data']['original_duration'],
-            'worker_assigned': {
-                'worker_id': service_info['worker_id'],
-                'worker_name': service_info['worker_name'],
-                'completion_time': service_info['job_data']['completion_time']
-            },
-            'status': 'active',
-            'start_time': service_info['job_data']['start_time'],
-            'timestamp': service_info['job_data']['assigned_at']
-        })
-    
-    # Also add queued services
-    for queue_item in workload_manager.service_queue:
-        active_services.append({
-            'service_id': queue_item['service_id'],
-            'car_details': {
-                'car_model': queue_item['car_model'],
-                'service_type': queue_item['service_type']
-            },
-            'predicted_time': queue_item['job_duration'],
-            'worker_assigned': {
-                'worker_name': 'Queue',
-                'queue_position': workload_manager.service_queue.index(queue_item) + 1,
-                'estimated_wait_time': queue_item['estimated_wait_time']
-            },
-            'status': 'queued',
-            'timestamp': queue_item['added_to_queue']
-        })
-    
-    socketio.emit('active_services_update', active_services)
-    socketio.emit('workload_update', workload_manager.get_workload_data())
-    
-    return jsonify({
-        'success': True, 
-        'message': f'Data synced. Active services: {len(active_services)}',
-        'workload_active_services': workload_active_count,
-        'app_active_services': len(active_services),
-        'queued_services': len(workload_manager.service_queue)
-    })
-
 @app.route('/admin/reset_all')
 def reset_all():
-    """Reset all data for testing"""
-    global active_services, completed_services
+    """Reset all data of a site for testing"""
+    site_id = get_site_id()
+    shard = site_router.get(site_id)
+    workload_manager = shard.workload_manager
+    inventory_manager = shard.inventory_manager
+    
+    # Clear all services of this site
+    service_registry.clear_site(site_id)
+    service_history.clear_site(site_id)
     
-    # Clear all services
-    active_services.clear()
-    completed_services.clear()
+    # Queued services are dropped with the workload, so their parts holds go too
+    for queue_item in workload_manager.get_service_queue():
+        inventory_manager.release_reservation(queue_item['service_id'])
     
     # Reset workload manager using the new method
     workload_manager.reset_all()
@@ -335,91 +675,267 @@ def reset_all():
     # Reset inventory
     inventory_manager.load_inventory()
     
-    socketio.emit('workload_update', workload_manager.get_workload_data())
-    socketio.emit('inventory_update', inventory_manager.get_inventory_data())
-    socketio.emit('active_services_update', active_services)
-    socketio.emit('completed_services_update', completed_services)
+    side_effects.submit({'site_id': site_id, 'channels': STATE_CHANNELS})
     
     return jsonify({
         'success': True, 
-        'message': 'All data reset successfully',
-        'active_services': len(active_services),
+        'message': f'All data for site {site_id} reset successfully',
+        'active_services': service_registry.count('active', site_id),
         'workload_active_services': workload_manager.get_active_services_count()
     })
 
 @app.route('/api/debug/workload')
 def debug_workload():
-    """Debug endpoint to see actual workload data"""
+    """Debug endpoint to see actual workload data
+    
+    With any of cursor, limit, status, worker, specialization or car_model it returns one page
+    of matching services and only the workers the filters name, instead of the full dump.
+    """
+    site_id = get_site_id()
+    workload_manager = site_router.get(site_id).workload_manager
+    if any(arg in request.args for arg in SERVICE_QUERY_ARGS):
+        try:
+            query = service_query_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        page = service_registry.query(site_id, **query)
+        active_jobs = workload_manager.get_all_active_services()
+        queued = {}
+        if any(service['status'] == 'queued' for service in page['services']):
+            queued = {item['service_id']: item for item in workload_manager.get_service_queue()}
+        return jsonify({
+            'site_id': site_id,
+            'active_services_count': service_registry.count('active', site_id),
+            'queued_services_count': service_registry.count('queued', site_id),
+            'workload_active_services_count': workload_manager.get_active_services_count(),
+            'services': [
+                {**debug_service_details(service),
+                 'workload_entry': active_jobs.get(service['service_id']) or queued.get(service['service_id'])}
+                for service in page['services']
+            ],
+            'next_cursor': page['next_cursor'],
+            'workers_details': [
+                debug_worker_details(worker) for worker in workload_manager.get_workers()
+                if query['worker_id'] in (None, worker['id'])
+                and query['specialization'] in (None, worker.get('specialization'))
+            ]
+        })
+
     workload_data = workload_manager.get_workload_data()
+    site_active_services = open_services(site_id)
     
     debug_info = {
+        'site_id': site_id,
         'raw_workload_data': workload_data,
-        'active_services_count': len(active_services),
+        'active_services_count': service_registry.count('active', site_id),
         'workload_active_services_count': workload_manager.get_active_services_count(),
-        'active_services_details': [
-            {
-                'service_id': service['service_id'],
-                'worker': service['worker_assigned']['worker_name'] if service['worker_assigned'] else 'Queued',
-                'status': service['status']
-            }
-            for service in active_services
-        ],
-        'workers_details': [
-            {
-                'id': worker['id'],
-                'name': worker['name'],
-                'current_jobs_count': len(worker['current_jobs']),
-                'current_jobs': [job['service_id'] for job in worker['current_jobs']],
-                'current_workload': worker['current_workload']
-            }
-            for worker in workload_manager.workers
-        ],
+        'active_services_details': [debug_service_details(service) for service in site_active_services],
+        'workers_details': [debug_worker_details(worker) for worker in workload_manager.get_workers()],
         'workload_active_services': workload_manager.get_all_active_services(),
-        'queued_services': workload_manager.service_queue
+        'queued_services': workload_manager.get_service_queue()
     }
     
     return jsonify(debug_info)
 
-@app.route('/api/debug/sync_check')
-def debug_sync_check():
-    """Check if data is synchronized"""
-    workload_count = workload_manager.get_active_services_count()
-    app_count = len(active_services)
-    
-    is_synced = workload_count == app_count
-    
-    return jsonify({
-        'workload_active_services': workload_count,
-        'app_active_services': app_count,
-        'is_synchronized': is_synced,
-        'difference': abs(workload_count - app_count),
-        'message': 'SYNCED' if is_synced else 'OUT OF SYNC'
-    })
+def debug_service_details(service):
+    return {
+        'service_id': service['service_id'],
+        'worker': service['worker_assigned']['worker_name'] if service['worker_assigned'] else 'Queued',
+        'status': service['status']
+    }
+
+def debug_worker_details(worker):
+    return {
+        'id': worker['id'],
+        'name': worker['name'],
+        'current_jobs_count': len(worker['current_jobs']),
+        'current_jobs': [job['service_id'] for job in worker['current_jobs']],
+        'current_workload': worker['current_workload']
+    }
 
 # EXISTING ENDPOINTS
 
+@app.route('/api/capacity_plan', methods=['POST'])
+def api_capacity_plan():
+    """Answer whether current stock covers a batch of prospective bookings, and the shortfall"""
+    data = request.get_json(silent=True) or {}
+    bookings = data.get('bookings', [])
+    if not isinstance(bookings, list):
+        return jsonify({'success': False, 'error': 'bookings must be a list'}), 400
+    try:
+        validate_bookings(bookings, list(TASK_PARTS))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    inventory_manager = site_router.get(get_site_id()).inventory_manager
+    plan = inventory_manager.plan_capacity(bookings)
+    return jsonify({'success': True, **plan})
+
+@app.route('/api/sites')
+def api_sites():
+    return jsonify({'sites': site_router.sites(), 'default_site': site_router.default_site})
+
+@app.route('/api/mail_outbox')
+def api_mail_outbox():
+    return jsonify({'stats': mail_outbox.get_stats(), 'dead_letters': mail_outbox.get_dead_letters(),
+                    'recent_alerts': notifier.get_recent_alerts()})
+
+@app.route('/api/broadcasts')
+def api_broadcasts():
+    return jsonify({**broadcasts.get_stats(), 'change_feed': change_feed.get_stats()})
+
+@app.route('/api/pipeline')
+def api_pipeline():
+    return jsonify(side_effects.get_stats())
+
+@app.route('/api/snapshot')
+def api_snapshot():
+    """Workload, inventory, open and recent completed services of a site in one response.
+    
+    The ETag combines the version of each view, so polling with If-None-Match answers 304
+    without building anything while nothing has changed.
+    """
+    site_id = get_site_id()
+    shard = site_router.get(site_id)
+    etag = '-'.join(str(part) for part in (
+        SNAPSHOT_EPOCH, site_id, shard.workload_manager.get_version(), shard.inventory_manager.get_version(),
+        service_registry.get_version(), service_history.get_version()))
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        cached = snapshot_cache.get(site_id)
+        if cached and cached[0] == etag:
+            body = cached[1]
+        else:
+            # Versions are read first, so a change during the build only costs one extra rebuild
+            body = json.dumps({
+                'version': etag,
+                'workload': shard.workload_manager.get_workload_data(),
+                'inventory': shard.inventory_manager.get_inventory_data(),
+                'active_services': open_services(site_id),
+                'completed_services': recent_completed_services(site_id)
+            })
+            snapshot_cache[site_id] = (etag, body)
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/workload')
 def api_workload():
-    return jsonify(workload_manager.get_workload_data())
+    # Clients can pass ?since=<version> to skip the payload when nothing changed
+    since_version = request.args.get('since', type=int)
+    workload_manager = site_router.get(get_site_id()).workload_manager
+    return jsonify(workload_manager.get_workload_changes(since_version))
 
 @app.route('/api/inventory')
 def api_inventory():
-    return jsonify(inventory_manager.get_inventory_data())
+    return jsonify(site_router.get(get_site_id()).inventory_manager.get_inventory_data())
+
+@app.route('/api/inventory/forecast')
+def api_inventory_forecast():
+    shard = site_router.get(get_site_id())
+    horizons = [h.strip() for h in request.args.get('horizons', '7,14,30').split(',') if h.strip()]
+    if not horizons or not all(h.isdigit() and int(h) > 0 for h in horizons):
+        return jsonify({'error': 'horizons must be a comma separated list of positive day counts'}), 400
+    days = {}
+    for name, default in (('lead_time_days', '2'), ('cover_days', '14')):
+        try:
+            days[name] = float(request.args.get(name, default))
+        except ValueError:
+            days[name] = math.nan
+        if not math.isfinite(days[name]) or days[name] < 0:
+            return jsonify({'error': f'{name} must be a number of days, zero or more'}), 400
+    return jsonify(shard.inventory_manager.forecast_parts(
+        shard.workload_manager.get_queued_tasks(),
+        horizons=[int(h) for h in horizons],
+        **days
+    ))
+
+@app.route('/api/inventory/history')
+def api_inventory_history():
+    ops = request.args.get('op')
+    limit = request.args.get('limit', '100')
+    if not limit.isdigit() or not 1 <= int(limit) <= 1000:
+        return jsonify({'error': 'limit must be between 1 and 1000'}), 400
+    return jsonify(site_router.get(get_site_id()).inventory_manager.get_movement_history(
+        part=request.args.get('part'),
+        ops=ops.split(',') if ops else None,
+        limit=int(limit),
+        ref=request.args.get('ref')
+    ))
 
 @app.route('/api/active_services')
 def api_active_services():
-    return jsonify(active_services)
+    site_id = get_site_id()
+    if not any(arg in request.args for arg in SERVICE_QUERY_ARGS):
+        return jsonify(open_services(site_id))
+    
+    # Paged: ?cursor=<next_cursor of the previous page>&limit=<n>, plus any filters, in booking order
+    try:
+        query = service_query_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(service_registry.query(site_id, **query))
 
 @app.route('/api/completed_services')
 def api_completed_services():
-    return jsonify(completed_services[-10:])  # Return last 10
+    site_id = get_site_id()
+    if 'cursor' not in request.args and 'limit' not in request.args:
+        return jsonify(recent_completed_services(site_id))  # Return last 10
+    
+    # Paged: ?cursor=<next_cursor of the previous page>&limit=<n>, newest page first
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', '10')
+    if (cursor is not None and not cursor.isdigit()) or not limit.isdigit() or not 1 <= int(limit) <= 100:
+        return jsonify({'error': 'cursor must be a next_cursor value and limit between 1 and 100'}), 400
+    return jsonify(service_history.page(site_id, int(cursor) if cursor else None, int(limit)))
 
 @socketio.on('connect')
 def handle_connect():
-    emit('workload_update', workload_manager.get_workload_data())
-    emit('inventory_update', inventory_manager.get_inventory_data())
-    emit('active_services_update', active_services)
-    emit('completed_services_update', completed_services[-10:])
+    # Clients pick their service center with io({query: {site: ...}}) and then subscribe to topics
+    site_id = request.args.get('site') or site_router.default_site
+    if site_id not in site_router.sites():
+        return False
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join a topic: {'topic': 'admin'} for the site's dashboard streams, or
+    {'topic': 'service', 'service_id': ...} to follow one booking"""
+    site_id = request.args.get('site') or site_router.default_site
+    data = data or {}
+    if data.get('topic') == 'admin':
+        # Bring the feed up to date before joining, so the snapshots below are the first thing we get
+        publish_state(site_id, *STATE_CHANNELS)
+        join_room(admin_room(site_id))
+        # A full snapshot of every channel; patches with higher sequence numbers follow
+        for channel in STATE_CHANNELS:
+            emit('state_snapshot', change_feed.snapshot(site_id, channel))
+    elif data.get('topic') == 'service' and data.get('service_id'):
+        service_id = str(data['service_id'])
+        join_room(service_room(service_id))
+        service = service_registry.get(service_id) or service_history.get(service_id)
+        if service:
+            emit('service_update', service)
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    site_id = request.args.get('site') or site_router.default_site
+    data = data or {}
+    if data.get('topic') == 'admin':
+        leave_room(admin_room(site_id))
+    elif data.get('topic') == 'service' and data.get('service_id'):
+        leave_room(service_room(str(data['service_id'])))
+
+@socketio.on('resync')
+def handle_resync(data):
+    """A dashboard missed a patch and asks for the channel's full state"""
+    site_id = request.args.get('site') or site_router.default_site
+    channel = (data or {}).get('channel')
+    if admin_room(site_id) not in rooms() or channel not in STATE_CHANNELS:
+        return
+    publish_state(site_id, channel)
+    emit('state_snapshot', change_feed.snapshot(site_id, channel))
 
 def ensure_directories():
     """Ensure all required directories exist"""
@@ -454,9 +970,7 @@ if __name__ == '__main__':
     
     # NEW: Debug URLs
     print("🔧 Debug Endpoints:")
-    print("   - Sync Data: http://localhost:5001/admin/sync_data")
     print("   - Reset All: http://localhost:5001/admin/reset_all")
     print("   - Debug Workload: http://localhost:5001/api/debug/workload")
-    print("   - Sync Check: http://localhost:5001/api/debug/sync_check")
     
     socketio.run(app, debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
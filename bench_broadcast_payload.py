@@ -0,0 +1,87 @@
+"""Size of the service records that active_services_update broadcasts.
+
+    python bench_broadcast_payload.py --services 50 200 1000
+
+- full: the previous record - the raw booking request as car_details and the
+  whole inventory inside inventory_status
+- slim: the current record - known booking fields, the parts the service uses
+  and a ledger reference
+
+Sizes are the JSON bytes of one active_services_update, and the memory held by
+the records once they are stored apart from the live inventory (as the service
+history and process shards store them).
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from utils.inventory_manager import InventoryManager
+
+TASKS = [['engine_oil', 'air_filter'], ['brake_pads', 'brake_fluid'], ['ac_service'], ['tire_rotation']]
+BOOKING = {'car_model': 'XC60', 'manufacture_year': 2022, 'fuel_type': 'Petrol', 'service_type': 'Brake',
+           'number_plate': 'MH12AB1234', 'total_km': 30000, 'km_since_last_service': 5000,
+           'days_since_last_service': 90}
+CAR_DETAIL_FIELDS = ('car_model', 'manufacture_year', 'fuel_type', 'service_type', 'number_plate', 'total_km',
+                     'km_since_last_service', 'days_since_last_service', 'selected_tasks')
+
+
+def build_records(inventory_manager, count, slim):
+    records = []
+    for i in range(count):
+        tasks = TASKS[i % len(TASKS)]
+        data = {**BOOKING, 'selected_tasks': tasks, 'site_id': 'main'}
+        status = inventory_manager.check_and_deduct_parts(tasks)
+        if slim:
+            car_details = {field: data[field] for field in CAR_DETAIL_FIELDS if field in data}
+            parts = {'available': status['available'], 'required_parts': status['required_parts'],
+                     'unavailable_parts': status['unavailable_parts'], 'ledger_ref': status['reservation_id']}
+        else:
+            car_details = data
+            parts = {'required_parts': status['required_parts'], 'available': status['available'],
+                     'unavailable_parts': status['unavailable_parts'],
+                     'inventory_status': copy.deepcopy(inventory_manager.get_inventory_data())}
+        records.append({
+            'service_id': f'VOL_{i:06d}', 'site_id': 'main', 'car_details': car_details,
+            'predicted_time': 1.5, 'worker_assigned': {'worker_id': 'W01', 'worker_name': 'Sarah Johnson'},
+            'completion_time': '2025-01-06T10:30:00', 'inventory_status': parts, 'status': 'active',
+            'start_time': None, 'timestamp': '2025-01-06T09:00:00'
+        })
+        inventory_manager.restock_part(tasks[0], 1000)  # Keep every booking in stock
+    return records
+
+
+def measure(count, slim, inventory_file):
+    manager = InventoryManager(inventory_file, save_interval=3600)
+    tracemalloc.start()
+    records = build_records(manager, count, slim)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(json.dumps(records).encode()), memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure service record broadcast payloads')
+    parser.add_argument('--services', type=int, nargs='+', default=[50, 200, 1000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'inventory.json')
+    print("📡 active_services_update payload and record memory")
+    for count in args.services:
+        results = {}
+        for slim in (False, True):
+            inventory_file = os.path.join(workdir, f'inventory_{count}_{slim}.json')
+            shutil.copy(source, inventory_file)
+            results[slim] = measure(count, slim, inventory_file)
+        (full_bytes, full_memory), (slim_bytes, slim_memory) = results[False], results[True]
+        print(f"   {count:>5} services   payload {full_bytes / 1024:9.1f} KB -> {slim_bytes / 1024:7.1f} KB "
+              f"({full_bytes / slim_bytes:4.1f}x)   memory {full_memory / 1024:9.1f} KB -> "
+              f"{slim_memory / 1024:7.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Booking throughput with 1, 2, 4 ... gunicorn web workers sharing one state server.
+
+    python bench_multiprocess.py --workers 1 2 4 --clients 16 --seconds 10
+
+Each run starts gunicorn with gunicorn.conf.py in a scratch copy of data/ and keeps
+--clients keep-alive connections posting /predict for --seconds. It reports requests
+per second and latency percentiles. Throughput can only grow with workers while there
+are free cores, so compare runs on a machine with at least as many cores as workers.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BOOKING = {'car_model': 'XC60', 'manufacture_year': 2022, 'fuel_type': 'Petrol', 'service_type': 'General',
+           'number_plate': 'MH12AB1234', 'total_km': 30000, 'selected_tasks': ['tire_rotation']}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, workdir, port):
+    env = {**os.environ, 'WEB_CONCURRENCY': str(workers), 'PORT': str(port), 'PYTHONPATH': ROOT,
+           'VSIS_STATE_ADDRESS': os.path.join(workdir, 'state.sock'), 'VSIS_REPORT_WORKERS': '1'}
+    env.pop('VSIS_STATE_SERVER', None)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), '--chdir', workdir,
+         'app:app'], env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(600):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/sites')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not come up')
+
+
+def client(port, deadline, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = json.dumps(BOOKING)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+            ok = json.loads(conn.getresponse().read()).get('success')
+        except (OSError, http.client.HTTPException, ValueError):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+def run(workers, clients, seconds):
+    workdir = tempfile.mkdtemp()
+    shutil.copytree(os.path.join(ROOT, 'data'), os.path.join(workdir, 'data'),
+                    ignore=shutil.ignore_patterns('sites', '*.db', '*.ledger*', '*.lock'))
+    port = free_port()
+    process = start_gunicorn(workers, workdir, port)
+    try:
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        threads = [threading.Thread(target=client, args=(port, deadline, latencies, errors))
+                   for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+    return len(latencies) / seconds, percentile(0.5), percentile(0.99), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure /predict throughput against web worker count')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"🚦 /predict load test: {args.clients} clients for {args.seconds:g}s per run ({os.cpu_count()} cores)")
+    baseline = None
+    for workers in args.workers:
+        rate, p50, p99, errors = run(workers, args.clients, args.seconds)
+        baseline = baseline or rate
+        print(f"   {workers:>2} worker(s)   {rate:8.1f} req/s ({rate / baseline:4.2f}x)   "
+              f"p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   errors {errors}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""/predict response latency with its side effects inline versus in background stages.
+
+    python bench_predict_pipeline.py --bookings 300
+
+- inline: the workload file is written inside assignment, and the broadcasts and
+  low-stock alerts run before the handler responds
+- staged: the handler responds after predict, assign and reserve; the persist,
+  broadcast and notify stages follow on the pipeline thread
+
+Each mode runs in a fresh process on a scratch copy of data/, posting bookings
+through the Flask test client. Bookings use parts, so low-stock alerts fire too.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TASKS = [['engine_oil', 'air_filter'], ['brake_pads', 'brake_fluid'], ['ac_service', 'ac_filter'], ['tire_rotation']]
+
+
+def run_child(mode, bookings):
+    import app as vsis
+
+    if mode == 'inline':
+        vsis.side_effects.submit = lambda job: vsis.side_effects.process(vsis.side_effects.clock(), job)
+        for site_id in vsis.site_router.sites():
+            vsis.site_router.get(site_id).workload_manager.set_defer_saves(False)
+
+    client = vsis.app.test_client()
+    for i in range(bookings):
+        response = client.post('/predict', json={
+            'car_model': 'XC60', 'manufacture_year': 2022, 'fuel_type': 'Petrol', 'service_type': 'General',
+            'number_plate': f'MH12AB{i:04d}', 'total_km': 30000, 'selected_tasks': TASKS[i % len(TASKS)]})
+        assert response.get_json()['success']
+    vsis.side_effects.drain()
+    time.sleep(0.2)  # Let the last coalesced broadcast go out
+    print('RESULT ' + json.dumps(vsis.side_effects.get_stats()['latency_ms']))
+
+
+def run_mode(mode, bookings):
+    workdir = tempfile.mkdtemp()
+    shutil.copytree(os.path.join(ROOT, 'data'), os.path.join(workdir, 'data'),
+                    ignore=shutil.ignore_patterns('sites', '*.db', '*.ledger*', '*.lock'))
+    try:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode, '--bookings', str(bookings)],
+            cwd=workdir, env={**os.environ, 'PYTHONPATH': ROOT, 'VSIS_REPORT_WORKERS': '1'},
+            capture_output=True, text=True, check=True).stdout
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    line = next(line for line in output.splitlines() if line.startswith('RESULT '))
+    return json.loads(line[len('RESULT '):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare /predict latency with inline and staged side effects')
+    parser.add_argument('--bookings', type=int, default=300)
+    parser.add_argument('--child', choices=['inline', 'staged'])
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args.child, args.bookings)
+
+    print(f"🧵 /predict response latency over {args.bookings} bookings")
+    for mode in ('inline', 'staged'):
+        latency = run_mode(mode, args.bookings)
+        response = latency['predict_response']
+        print(f"   {mode:<7} response p50 {response['p50']:7.2f} ms   p99 {response['p99']:7.2f} ms   "
+              f"max {response['max']:7.2f} ms")
+        for stage in ('queue_wait', 'persist', 'broadcast', 'notify'):
+            if stage in latency:
+                print(f"           {stage:<10} p50 {latency[stage]['p50']:7.2f} ms   p99 {latency[stage]['p99']:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Per-report latency of the PDF rendering paths.
+
+    python bench_report_rendering.py --reports 200
+
+- disk, fresh styles: the previous path - styles rebuilt per report, PDF written to
+  reports/ and read back for the response
+- disk, shared styles: styles built once, still round-tripping through a file
+- memory, shared styles: the /generate_report fast path, rendered into a BytesIO
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from utils import report_generator as rg
+
+SERVICE = {
+    'service_id': 'VOL_20250106090000W01',
+    'car_details': {'car_model': 'XC60', 'number_plate': 'MH12AB1234', 'manufacture_year': 2022,
+                    'fuel_type': 'Petrol', 'service_type': 'Brake',
+                    'selected_tasks': ['brake_pads', 'brake_fluid', 'engine_oil']},
+    'predicted_time': 1.5,
+    'completion_time': '2025-01-06T10:30:00',
+    'worker_assigned': {'worker_name': 'Sarah Johnson', 'specialization': 'Brake Expert',
+                        'workload_percentage': 37.5},
+    'inventory_status': {'available': True,
+                         'required_parts': {'brake_pads': 1, 'brake_fluid': 2, 'engine_oil': 1, 'oil_filter': 1}}
+}
+
+
+def time_path(render, reports):
+    render()  # Warm up imports and font metrics
+    samples = []
+    for _ in range(reports):
+        start = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark report rendering paths')
+    parser.add_argument('--reports', type=int, default=100)
+    args = parser.parse_args()
+
+    generator = rg.ReportGenerator()
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'report.pdf')
+
+    def disk_fresh_styles():
+        generator.styles = rg.build_styles()
+        generator.generate_service_report(SERVICE, path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def disk_shared_styles():
+        generator.styles = rg.shared_styles()
+        generator.generate_service_report(SERVICE, path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def memory_shared_styles():
+        generator.styles = rg.shared_styles()
+        return generator.render_service_report(SERVICE)
+
+    # generate_service_report logs every file it writes
+    rg.print = lambda *a, **k: None
+
+    print(f"📄 Rendering {args.reports} reports per path")
+    baseline = None
+    for name, render in [('disk, fresh styles', disk_fresh_styles),
+                         ('disk, shared styles', disk_shared_styles),
+                         ('memory, shared styles', memory_shared_styles)]:
+        samples = time_path(render, args.reports)
+        mean = statistics.mean(samples)
+        baseline = baseline or mean
+        p95 = sorted(samples)[int(len(samples) * 0.95) - 1]
+        print(f"   {name:<24} mean {mean:6.2f} ms   p50 {statistics.median(samples):6.2f} ms   "
+              f"p95 {p95:6.2f} ms   speedup {baseline / mean:4.2f}x")
+
+
+if __name__ == '__main__':
+    main()
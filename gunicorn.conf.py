@@ -0,0 +1,50 @@
+"""Gunicorn settings for the container.
+
+WEB_CONCURRENCY sets the number of web worker processes. With more than one, the
+master starts a state server (utils/state_server.py) before forking them and points
+every worker at it through VSIS_STATE_SERVER. Unless VSIS_STATE_AUTHKEY is set, the
+master generates a random key for them to authenticate with.
+"""
+import os
+import secrets
+import subprocess
+import sys
+import time
+from multiprocessing.connection import Client
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# SocketIO runs in threading mode, so each worker serves requests and WebSockets on threads
+worker_class = 'gthread'
+threads = int(os.environ.get('VSIS_WORKER_THREADS', 50))
+timeout = 120
+
+state_server = None
+
+
+def on_starting(server):
+    global state_server
+    if server.cfg.workers < 2 or os.environ.get('VSIS_STATE_SERVER'):
+        return  # One worker keeps its state in-process; an external state server is already set
+    os.environ['VSIS_STATE_SERVER'] = os.environ.get('VSIS_STATE_ADDRESS', '127.0.0.1:10001')
+    # Inherited by the state server and by the workers forked after this hook
+    os.environ.setdefault('VSIS_STATE_AUTHKEY', secrets.token_hex(32))
+    state_server = subprocess.Popen([sys.executable, '-m', 'utils.state_server'])
+
+    from utils.state_server import parse_address, state_authkey
+    address = parse_address(os.environ['VSIS_STATE_SERVER'])
+    for _ in range(300):
+        try:
+            Client(address, authkey=state_authkey()).close()
+            break
+        except OSError:
+            if state_server.poll() is not None:
+                raise RuntimeError('State server exited during startup')
+            time.sleep(0.1)
+    server.log.info(f"State server running (pid {state_server.pid}) for {server.cfg.workers} workers")
+
+
+def on_exit(server):
+    if state_server is not None:
+        state_server.terminate()
+        state_server.wait(timeout=10)
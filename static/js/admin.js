@@ -1,6 +1,8 @@
 class AdminDashboard {
     constructor() {
-        this.socket = io();
+        // Service center shown by this dashboard, e.g. /admin?site=north
+        this.siteId = new URLSearchParams(window.location.search).get('site') || 'main';
+        this.socket = connectSocket(this.siteId);
         this.charts = {};
         this.initializeCharts();
         this.initializeSocketListeners();
@@ -148,29 +150,33 @@ class AdminDashboard {
     }
 
     initializeSocketListeners() {
-        this.socket.on('workload_update', (data) => {
-            console.log("🔄 Received real-time workload update");
-            this.updateWorkloadDisplay(data);
-            this.updateStats(data);
-            this.updateUtilizationChart(data);
-        });
-
-        this.socket.on('inventory_update', (data) => {
-            this.updateInventoryDisplay(data);
+        // Dashboard streams are opt-in; subscribe again after every reconnect
+        this.socket.on('connect', () => this.socket.emit('subscribe', { topic: 'admin' }));
+
+        this.feed = new StateFeed(this.socket, (channel, { state, meta }) => {
+            if (channel === 'workload') {
+                const data = { ...meta, workers: Object.values(state) };
+                this.updateWorkloadDisplay(data);
+                this.updateStats(data);
+                this.updateUtilizationChart(data);
+            } else if (channel === 'inventory') {
+                this.updateInventoryDisplay(state);
+            } else if (channel === 'services') {
+                // In progress first, then the queue, each in booking order
+                const services = Object.values(state).sort((a, b) =>
+                    (a.status === 'active' ? 0 : 1) - (b.status === 'active' ? 0 : 1) ||
+                    a.timestamp.localeCompare(b.timestamp));
+                console.log("📋 Active services updated:", services.length, "services");
+                this.updateActiveServices(services);
+            } else if (channel === 'completed') {
+                const services = Object.values(state).sort((a, b) =>
+                    (a.completed_at || '').localeCompare(b.completed_at || ''));
+                this.updateCompletedServices(services);
+            }
         });
 
         this.socket.on('service_assigned', (data) => {
             console.log("➕ New service assigned:", data.service_id);
-            this.addActiveService(data);
-        });
-
-        this.socket.on('active_services_update', (data) => {
-            console.log("📋 Active services updated:", data.length, "services");
-            this.updateActiveServices(data);
-        });
-
-        this.socket.on('completed_services_update', (data) => {
-            this.updateCompletedServices(data);
         });
 
         this.socket.on('low_stock_alert', (data) => {
@@ -179,26 +185,20 @@ class AdminDashboard {
         });
     }
 
-    async loadInitialData() {
+    async loadInitialData(force = false) {
         try {
-            console.log("📥 Loading initial data...");
-            const [workloadRes, inventoryRes, activeRes, completedRes] = await Promise.all([
-                fetch('/api/workload'),
-                fetch('/api/inventory'),
-                fetch('/api/active_services'),
-                fetch('/api/completed_services')
-            ]);
-
-            const workloadData = await workloadRes.json();
-            const inventoryData = await inventoryRes.json();
-            const activeServices = await activeRes.json();
-            const completedServices = await completedRes.json();
-
-            console.log("✅ Data loaded successfully");
-            this.updateWorkloadDisplay(workloadData);
-            this.updateInventoryDisplay(inventoryData);
-            this.updateActiveServices(activeServices);
-            this.updateCompletedServices(completedServices);
+            // One request for every view; while nothing changed the server answers 304
+            const headers = this.snapshotVersion && !force ? { 'If-None-Match': `"${this.snapshotVersion}"` } : {};
+            const response = await fetch(`/api/snapshot?site=${this.siteId}`, { headers, cache: 'no-store' });
+            if (response.status === 304) return;
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+            const snapshot = await response.json();
+            this.snapshotVersion = snapshot.version;
+            this.updateWorkloadDisplay(snapshot.workload);
+            this.updateInventoryDisplay(snapshot.inventory);
+            this.updateActiveServices(snapshot.active_services);
+            this.updateCompletedServices(snapshot.completed_services);
 
         } catch (error) {
             console.error('❌ Error loading initial data:', error);
@@ -364,7 +364,7 @@ class AdminDashboard {
                     <td>${item.min_stock}</td>
                     <td>
                         <button class="btn btn-warning btn-sm" onclick="restockPart('${id}')">
-                            📦 Restock (+5)
+                            📦 Restock
                         </button>
                     </td>
                 </tr>
@@ -528,7 +528,7 @@ class AdminDashboard {
 
     forceRefresh() {
         console.log("🔄 Force refreshing all data...");
-        this.loadInitialData();
+        this.loadInitialData(true);
         this.showToast('Data refreshed manually', 'info');
     }
 
@@ -554,11 +554,11 @@ class AdminDashboard {
 // Global admin functions
 async function restockPart(partName) {
     try {
-        const response = await fetch(`/restock/${partName}`);
+        const response = await fetch(`/restock/${partName}?site=${adminDashboard.siteId}`);
         const result = await response.json();
         
         if (result.success) {
-            showAdminToast(`✅ ${partName} restocked successfully`, 'success');
+            showAdminToast(`✅ ${result.message}`, 'success');
             // Reload inventory data
             adminDashboard.loadInitialData();
         } else {
@@ -571,7 +571,7 @@ async function restockPart(partName) {
 
 async function completeService(serviceId) {
     try {
-        const response = await fetch(`/complete_service/${serviceId}`);
+        const response = await fetch(`/complete_service/${serviceId}?site=${adminDashboard.siteId}`);
         const result = await response.json();
         
         if (result.success) {
@@ -588,7 +588,16 @@ async function completeService(serviceId) {
 
 async function generateReport(serviceId) {
     try {
-        const response = await fetch(`/generate_report/${serviceId}`);
+        // Reports render in the background; poll the job until the PDF is ready
+        let job = await (await fetch(`/reports/${serviceId}/render`, { method: 'POST' })).json();
+        if (job.error) throw new Error(job.error);
+        while (job.status === 'queued' || job.status === 'rendering') {
+            await new Promise(resolve => setTimeout(resolve, 500));
+            job = await (await fetch(`/reports/jobs/${job.job_id}`)).json();
+        }
+        if (job.status !== 'done') throw new Error(job.error || 'Failed to generate report');
+        
+        const response = await fetch(`/reports/jobs/${job.job_id}/download`);
         if (response.ok) {
             const blob = await response.blob();
             const url = window.URL.createObjectURL(blob);
@@ -1,6 +1,57 @@
+// Mirrors the server's state channels (workload, inventory, services, completed).
+// The server sends a 'state_snapshot' per channel on connect and then 'state_patch'
+// messages with the changed and removed keys; a skipped sequence number means a
+// patch was missed, so the channel is re-fetched with 'resync'.
+class StateFeed {
+    constructor(socket, onChange) {
+        this.socket = socket;
+        this.onChange = onChange;
+        this.channels = {};
+        this.resyncing = new Set();
+        socket.on('state_snapshot', (snapshot) => this.applySnapshot(snapshot));
+        socket.on('state_patch', (patch) => this.applyPatch(patch));
+    }
+
+    applySnapshot(snapshot) {
+        this.resyncing.delete(snapshot.channel);
+        const current = this.channels[snapshot.channel];
+        if (current && current.seq > snapshot.seq) return;
+        this.channels[snapshot.channel] = { seq: snapshot.seq, state: snapshot.state, meta: snapshot.meta };
+        this.onChange(snapshot.channel, this.channels[snapshot.channel]);
+    }
+
+    applyPatch(patch) {
+        const current = this.channels[patch.channel];
+        if (current && patch.seq <= current.seq) return;
+        if (!current || patch.seq !== current.seq + 1) {
+            this.resync(patch.channel);
+            return;
+        }
+        patch.removed.forEach(key => delete current.state[key]);
+        Object.assign(current.state, patch.changed);
+        if ('meta' in patch) current.meta = patch.meta;
+        current.seq = patch.seq;
+        this.onChange(patch.channel, current);
+    }
+
+    resync(channel) {
+        if (this.resyncing.has(channel)) return;
+        this.resyncing.add(channel);
+        this.socket.emit('resync', { channel });
+    }
+}
+
+// Connect to a site's SocketIO endpoint over the transports the server allows
+function connectSocket(siteId) {
+    const transports = (document.body.dataset.socketTransports || 'polling,websocket').split(',');
+    return io({ query: { site: siteId }, transports });
+}
+
 class VSISApp {
     constructor() {
-        this.socket = io();
+        // Service center this booking page belongs to, e.g. /?site=north
+        this.siteId = new URLSearchParams(window.location.search).get('site') || 'main';
+        this.socket = connectSocket(this.siteId);
         this.selectedTasks = new Set();
         this.currentService = null;
         this.initializeEventListeners();
@@ -50,24 +101,15 @@ class VSISApp {
     }
 
     initializeSocketListeners() {
-        this.socket.on('workload_update', (data) => {
-            this.updateWorkloadDisplay(data);
-        });
-
-        this.socket.on('inventory_update', (data) => {
-            this.updateInventoryDisplay(data);
-        });
-
-        this.socket.on('low_stock_alert', (data) => {
-            this.showLowStockAlert(data);
-        });
-
-        this.socket.on('service_assigned', (data) => {
-            console.log('New service assigned:', data);
+        // Customers only follow their own booking, see watchService()
+        this.socket.on('connect', () => {
+            if (this.watchedServiceId) {
+                this.socket.emit('subscribe', { topic: 'service', service_id: this.watchedServiceId });
+            }
         });
 
-        this.socket.on('active_services_update', (data) => {
-            this.updateActiveServices(data);
+        this.socket.on('service_update', (service) => {
+            if (service.service_id === this.watchedServiceId) this.updateServiceStatus(service);
         });
     }
 
@@ -204,7 +246,8 @@ class VSISApp {
             total_km: document.getElementById('total_km').value,
             km_since_last_service: document.getElementById('km_since_last_service').value,
             days_since_last_service: document.getElementById('days_since_last_service').value,
-            selected_tasks: Array.from(this.selectedTasks)
+            selected_tasks: Array.from(this.selectedTasks),
+            site_id: this.siteId
         };
 
         if (!this.validateForm(formData)) {
@@ -231,6 +274,7 @@ class VSISApp {
             if (result.success) {
                 this.currentService = result;
                 this.displayPredictionResult(result);
+                this.watchService(result.service_id);
                 this.showToast('✅ Prediction Complete! Service assigned successfully.', 'success');
             } else {
                 throw new Error(result.error || 'Prediction failed');
@@ -326,35 +370,48 @@ class VSISApp {
         }
     }
 
-    updateWorkloadDisplay(workloadData) {
-        // Update stats if on admin page
-        this.updateWorkloadStats(workloadData);
-    }
-
-    updateWorkloadStats(workloadData) {
-        const totalJobs = workloadData.reduce((sum, worker) => sum + worker.current_jobs, 0);
-        const availableWorkers = workloadData.filter(worker => worker.workload_percentage < 70).length;
-        
-        const totalJobsElem = document.getElementById('total-jobs');
-        const availableWorkersElem = document.getElementById('available-workers');
-        
-        if (totalJobsElem) totalJobsElem.textContent = totalJobs;
-        if (availableWorkersElem) availableWorkersElem.textContent = availableWorkers;
-    }
-
-    updateInventoryDisplay(inventoryData) {
-        // This would be used in admin dashboard
-        console.log('Inventory updated:', inventoryData);
+    watchService(serviceId) {
+        // Follow this booking only: promotion from the queue, completion or cancellation
+        if (this.watchedServiceId) {
+            this.socket.emit('unsubscribe', { topic: 'service', service_id: this.watchedServiceId });
+        }
+        this.watchedServiceId = serviceId;
+        this.watchedStatus = null;
+        this.socket.emit('subscribe', { topic: 'service', service_id: serviceId });
     }
 
-    updateActiveServices(services) {
-        // This would be used in admin dashboard
-        console.log('Active services updated:', services);
+    updateServiceStatus(service) {
+        const worker = service.worker_assigned || {};
+        document.getElementById('worker-name').textContent = worker.worker_name || '-';
+        document.getElementById('worker-specialization').textContent = worker.specialization || '-';
+        if (service.completion_time) {
+            document.getElementById('completion-time').textContent = new Date(service.completion_time).toLocaleString();
+        }
+        // The first update only confirms the booking as it was when we subscribed
+        const changed = this.watchedStatus !== null && this.watchedStatus !== service.status;
+        this.watchedStatus = service.status;
+        if (!changed) return;
+        if (service.status === 'active') {
+            this.showToast(`👷 ${worker.worker_name} is now working on your service`, 'info');
+        } else if (service.status === 'completed') {
+            this.showToast('✅ Your service is complete, the report is ready to download', 'success');
+        } else if (service.status === 'cancelled') {
+            this.showToast('Your booking was cancelled', 'warning');
+        }
     }
 
     async downloadReport(serviceId) {
         try {
-            const response = await fetch(`/generate_report/${serviceId}`);
+            // Reports render in the background; poll the job until the PDF is ready
+            let job = await (await fetch(`/reports/${serviceId}/render`, { method: 'POST' })).json();
+            if (job.error) throw new Error(job.error);
+            while (job.status === 'queued' || job.status === 'rendering') {
+                await new Promise(resolve => setTimeout(resolve, 500));
+                job = await (await fetch(`/reports/jobs/${job.job_id}`)).json();
+            }
+            if (job.status !== 'done') throw new Error(job.error || 'Failed to download report');
+            
+            const response = await fetch(`/reports/jobs/${job.job_id}/download`);
             if (response.ok) {
                 const blob = await response.blob();
                 const url = window.URL.createObjectURL(blob);
@@ -374,10 +431,6 @@ class VSISApp {
         }
     }
 
-    showLowStockAlert(alertData) {
-        this.showToast(`⚠️ Low stock alert: ${alertData.part_name} (${alertData.quantity} left)`, 'warning');
-    }
-
     showToast(message, type = 'info') {
         // Remove existing toasts
         document.querySelectorAll('.toast').forEach(toast => toast.remove());
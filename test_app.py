@@ -0,0 +1,44 @@
+import importlib
+import sys
+
+from utils.workload_manager import WorkloadManager
+
+
+def test_restored_services_complete_and_render_reports(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    monkeypatch.setenv('VSIS_REPORT_WORKERS', '1')
+
+    # Workload saved by an earlier run: one job from before bookings were kept with it, one after
+    manager = WorkloadManager('data/workload.json')
+    _, legacy = manager.assign_worker(1.0, 'General', 'XC40', ['engine_oil'])
+    assignment, booked = manager.assign_worker(2.0, 'Brake', 'XC90', ['brake_pads'])
+    manager.attach_booking(booked['service_id'], {
+        'service_id': booked['service_id'],
+        'site_id': 'main',
+        'car_details': {'car_model': 'XC90', 'manufacture_year': 2022, 'fuel_type': 'Diesel',
+                        'service_type': 'Brake', 'number_plate': 'MH12AB4321', 'total_km': 40000,
+                        'selected_tasks': ['brake_pads']},
+        'predicted_time': 2.0,
+        'worker_assigned': assignment,
+        'completion_time': assignment['completion_time'],
+        'inventory_status': {'available': True, 'required_parts': {'brake_pads': 1, 'brake_fluid': 1}},
+        'status': 'active',
+        'start_time': None,
+        'timestamp': assignment['completion_time']
+    })
+
+    sys.modules.pop('app', None)
+    vsis = importlib.import_module('app')
+    try:
+        client = vsis.app.test_client()
+        restored = vsis.service_registry.get(booked['service_id'])
+        assert restored['car_details']['number_plate'] == 'MH12AB4321'
+
+        for service_id in (legacy['service_id'], booked['service_id']):
+            assert client.get(f'/complete_service/{service_id}').get_json()['success']
+            report = client.get(f'/generate_report/{service_id}')
+            assert report.status_code == 200 and report.data.startswith(b'%PDF')
+    finally:
+        vsis.side_effects.drain()
+        sys.modules.pop('app', None)
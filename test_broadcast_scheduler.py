@@ -0,0 +1,52 @@
+import time
+
+from utils.broadcast_scheduler import BroadcastScheduler
+
+
+def test_burst_of_marks_is_one_update_per_channel():
+    flushed, events = [], []
+    scheduler = BroadcastScheduler(lambda site, channel: flushed.append((site, channel)) or 1,
+                                   lambda event, data, room: events.append((event, room)))
+    for _ in range(20):
+        scheduler.mark('main', 'workload', 'services')
+    scheduler.mark('north', 'inventory')
+    scheduler.emit('service_assigned', {'service_id': 'S1'}, 'site:main')
+
+    assert scheduler.flush() == 4
+    assert flushed == [('main', 'workload'), ('main', 'services'), ('north', 'inventory')]
+    assert events == [('service_assigned', 'site:main')]
+    assert scheduler.flush() == 0
+
+    stats = scheduler.get_stats()
+    assert stats['marks'] == 41 and stats['channel_flushes'] == 3 and stats['coalesced'] == 38
+    assert stats['emits'] == 4 and stats['flushes'] == 1
+
+
+def test_failing_channel_does_not_block_the_rest():
+    def flush_channel(site, channel):
+        if channel == 'inventory':
+            raise RuntimeError('boom')
+        return 1
+
+    scheduler = BroadcastScheduler(flush_channel, lambda *args: None)
+    scheduler.mark('main', 'inventory', 'workload')
+    assert scheduler.flush() == 1
+    assert scheduler.get_stats()['errors'] == 1
+
+
+def test_background_thread_respects_max_rate():
+    flushes = []
+    scheduler = BroadcastScheduler(lambda site, channel: flushes.append(time.monotonic()) or 1,
+                                   lambda *args: None, max_rate=20).start()
+    try:
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            scheduler.mark('main', 'workload')
+            time.sleep(0.001)
+        time.sleep(0.1)
+    finally:
+        scheduler.stop()
+
+    gaps = [later - earlier for earlier, later in zip(flushes, flushes[1:])]
+    assert 2 <= len(flushes) <= 13
+    assert min(gaps) >= 0.045
@@ -0,0 +1,39 @@
+from utils.change_feed import ChangeFeed
+
+
+def test_patches_carry_only_changed_keys():
+    feed = ChangeFeed()
+    inventory = {'engine_oil': {'quantity': 10}, 'air_filter': {'quantity': 4}}
+
+    first = feed.update('main', 'inventory', inventory)
+    assert first['seq'] == 1 and set(first['changed']) == {'engine_oil', 'air_filter'}
+    assert feed.update('main', 'inventory', inventory) is None
+
+    # In-place changes to the live state are detected against the published copy
+    inventory['engine_oil']['quantity'] -= 1
+    patch = feed.update('main', 'inventory', inventory)
+    assert patch == {'site_id': 'main', 'channel': 'inventory', 'seq': 2,
+                     'changed': {'engine_oil': {'quantity': 9}}, 'removed': []}
+
+    del inventory['air_filter']
+    assert feed.update('main', 'inventory', inventory)['removed'] == ['air_filter']
+
+    # Sites and channels are sequenced independently
+    assert feed.update('north', 'inventory', {}) is None
+    assert feed.seq('north', 'inventory') == 0
+
+
+def test_snapshot_matches_applied_patches():
+    feed = ChangeFeed()
+    client = {}
+    for step in range(5):
+        state = {f'S{i}': {'step': step if i == step else 0} for i in range(step, step + 3)}
+        patch = feed.update('main', 'services', state, meta={'count': len(state)})
+        for key in patch['removed']:
+            del client[key]
+        client.update(patch['changed'])
+
+    snapshot = feed.snapshot('main', 'services')
+    assert snapshot['seq'] == 5
+    assert snapshot['state'] == client
+    assert snapshot['meta'] == {'count': 3}
@@ -0,0 +1,246 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.inventory_ledger import InventoryLedger
+from utils.inventory_manager import InventoryManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.current = datetime(2025, 1, 6, 9, 0)
+
+    def now(self):
+        return self.current
+
+
+def make_manager(clock=None):
+    return InventoryManager(None, clock=clock.now if clock else None)
+
+
+def test_reserve_then_commit_deducts_once():
+    manager = make_manager()
+    before = manager.inventory['ac_gas']['quantity']
+
+    reservation = manager.reserve_parts_for_tasks(['ac_service'])
+    assert reservation['available']
+    assert manager.get_available_quantity('ac_gas') == before - 1
+    assert manager.inventory['ac_gas']['quantity'] == before
+
+    version = manager.get_version()
+    assert manager.commit_reservation(reservation['reservation_id'])
+    assert manager.inventory['ac_gas']['quantity'] == before - 1
+    assert manager.get_version() > version
+    assert manager.reserved['ac_gas'] == 0
+    assert not manager.commit_reservation(reservation['reservation_id'])
+
+
+def test_reservations_prevent_overselling():
+    manager = make_manager()
+    manager.inventory['brake_pads']['quantity'] = 2
+
+    results = manager.reserve_batch([{'required_parts': {'brake_pads': 1}}] * 3)
+    assert [r['available'] for r in results] == [True, True, False]
+    assert results[2]['unavailable_parts'][0]['available'] == 0
+
+    # Released holds become available again
+    manager.release_reservation(results[0]['reservation_id'])
+    assert manager.reserve_parts({'brake_pads': 1})['available']
+
+
+def test_reservations_expire_automatically():
+    clock = FakeClock()
+    manager = make_manager(clock)
+    reservation = manager.reserve_parts({'coolant': 3}, ttl=60)
+    assert manager.reserved['coolant'] == 3
+
+    clock.current += timedelta(seconds=61)
+    assert manager.expire_reservations() == [reservation['reservation_id']]
+    assert manager.reserved['coolant'] == 0
+    assert not manager.commit_reservation(reservation['reservation_id'])
+
+
+def test_saves_are_batched(tmp_path):
+    path = tmp_path / 'inventory.json'
+    manager = InventoryManager(str(path), save_interval=60)
+    saved = path.read_text()
+
+    manager.check_and_deduct_parts(['engine_oil'])
+    manager.restock_part('engine_oil', 5)
+    assert path.read_text() == saved
+
+    manager.flush()
+    assert path.read_text() != saved
+
+
+def test_low_stock_fires_once_per_crossing_with_hysteresis():
+    manager = make_manager()
+    manager.pop_stock_events()
+    part = manager.inventory['ac_filter']
+    part['quantity'] = part['min_stock'] + 2
+
+    alerts = []
+    for _ in range(4):
+        manager.check_and_deduct_parts(['ac_filter'])
+        alerts += manager.pop_stock_events()
+    assert [e['type'] for e in alerts] == ['low_stock']
+    assert 'ac_filter' in {p['id'] for p in manager.check_low_stock()}
+
+    # Climbing back to the threshold does not clear the alert, passing the margin does
+    manager.restock_part('ac_filter', part['min_stock'] - part['quantity'] + 1)
+    assert manager.pop_stock_events() == []
+    manager.restock_part('ac_filter', 5)
+    assert [e['type'] for e in manager.pop_stock_events()] == ['restocked']
+    assert manager.check_low_stock() == []
+
+
+def test_capacity_plan_matches_per_booking_requirements():
+    manager = make_manager()
+    manager.inventory['brake_pads']['quantity'] = 3
+    matrix = manager.requirement_matrix
+    brake_mask = 1 << matrix.task_index['brake_pads']
+
+    bookings = [['brake_pads', 'engine_oil'], {'selected_tasks': ['brake_pads']}, brake_mask, ['brake_pads']]
+    plan = manager.plan_capacity(bookings)
+
+    assert plan['total_demand']['brake_pads'] == 4
+    assert plan['total_demand']['brake_fluid'] == 4
+    assert plan['shortfall'] == {'brake_pads': 1}
+    assert plan['fulfillable_in_order'] == 3
+    assert plan['fulfillable_alone'] == [True, True, True, True]
+    assert manager.calculate_required_parts(['brake_pads', 'brake_fluid']) == {'brake_pads': 1, 'brake_fluid': 2}
+
+
+def test_ledger_replays_unsnapshotted_movements_and_compacts(tmp_path):
+    path = tmp_path / 'inventory.json'
+    manager = InventoryManager(str(path), save_interval=60)
+    before = manager.inventory['engine_oil']['quantity']
+
+    status = manager.check_and_deduct_parts(['engine_oil'])
+    assert 'inventory_status' not in status
+    manager.restock_part('engine_oil', 5)
+    # Simulate a crash before the batched snapshot is written
+    manager._dirty = False
+    manager.ledger.close()
+
+    reloaded = InventoryManager(str(path), save_interval=60)
+    assert reloaded.inventory['engine_oil']['quantity'] == before + 4
+    assert reloaded.inventory['oil_filter']['last_used']
+
+    reloaded.mark_dirty()
+    reloaded.flush()
+    assert list(reloaded.ledger.read_records(reloaded.ledger.ledger_file)) == []
+    history = reloaded.get_movement_history(part='engine_oil')
+    assert [record['op'] for record in history] == ['reserve', 'deduct', 'restock']
+    # The reservation ID leads from a service record to its stock movements
+    used = reloaded.get_movement_history(ref=status['reservation_id'], ops=['deduct'])
+    assert {record['part'] for record in used} == set(status['required_parts'])
+
+    # Compacted movements are not applied twice
+    again = InventoryManager(str(path), save_interval=60)
+    assert again.inventory['engine_oil']['quantity'] == before + 4
+
+
+def test_forecast_tracks_usage_and_queued_demand():
+    clock = FakeClock()
+    manager = make_manager(clock)
+    start = clock.current
+    for day in range(10):
+        clock.current = start + timedelta(days=day)
+        manager.check_and_deduct_parts(['brake_pads'])
+
+    forecast = manager.forecast_parts(queued_tasks=[['brake_pads'], ['brake_pads']])
+    brake_pads = forecast['brake_pads']
+    assert 0.8 < brake_pads['usage_per_day'] < 1.3
+    assert brake_pads['pipeline_demand'] == 2
+    assert brake_pads['on_hand'] == 5
+    assert brake_pads['days_until_stock_out'] < 4
+    assert brake_pads['needs_reorder'] and brake_pads['suggested_reorder_quantity'] > 0
+    assert forecast['coolant']['usage_per_day'] == 0 and forecast['coolant']['days_until_stock_out'] is None
+
+    assert manager.suggest_restock_quantity('coolant') == 5
+    assert manager.suggest_restock_quantity('brake_pads') < brake_pads['suggested_reorder_quantity']
+
+    # Queue items stored before bookings were validated count only their known tasks
+    stored = manager.forecast_parts(queued_tasks=[['brake_pads', 'no_such_task'], [{}], ['brake_pads']])
+    assert stored['brake_pads']['pipeline_demand'] == 2
+    assert manager.suggest_restock_quantity('brake_pads', [['no_such_task']]) > 0
+
+
+def test_forecast_stays_sane_with_short_history():
+    clock = FakeClock()
+    manager = make_manager(clock)
+    manager.check_and_deduct_parts(['brake_pads'])
+    clock.current += timedelta(minutes=5)
+
+    brake_pads = manager.forecast_parts(lead_time_days=365)['brake_pads']
+    # One deduction five minutes ago is not a rate of hundreds a day
+    assert brake_pads['usage_per_day'] < 1
+    assert brake_pads['suggested_reorder_quantity'] <= 10 * manager.inventory['brake_pads']['min_stock']
+
+
+def test_open_holds_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'inventory.json')
+    manager = InventoryManager(path, save_interval=60)
+    manager.reserve_parts_for_tasks(['brake_pads'], ttl=3600, reservation_id='QUEUE_1')
+    manager.reserve_parts_for_tasks(['ac_service'], ttl=3600, reservation_id='QUEUE_2')
+    manager.save_inventory()  # QUEUE_1 and QUEUE_2 now live in the snapshot, not the ledger
+    manager.release_reservation('QUEUE_2')
+    manager.reserve_parts_for_tasks(['engine_oil'], ttl=3600, reservation_id='QUEUE_3')  # Only in the ledger
+    held = manager.get_reservation_summary()
+    manager._dirty = False
+    manager.ledger.close()
+
+    reloaded = InventoryManager(path, save_interval=60)
+    assert set(reloaded.reservations) == {'QUEUE_1', 'QUEUE_3'}
+    assert reloaded.get_reservation_summary() == held
+    assert reloaded.commit_reservation('QUEUE_3')
+    assert reloaded.inventory['engine_oil']['quantity'] == held['engine_oil']['quantity'] - 1
+
+
+def test_recent_movements_read_back_from_the_tail(tmp_path):
+    ledger = InventoryLedger(str(tmp_path / 'inventory.ledger'), clock=lambda: 1_700_000_000.0)
+    for i in range(200):
+        ledger.append('restock' if i % 2 else 'deduct', f'part_{i % 3}', 1, ref=f'R{i}')
+    ledger.compact(150)
+    # An interrupted compaction can leave records in both files
+    with open(ledger.history_file, 'a', encoding='utf-8') as f:
+        f.write('{"s":151,"t":1700000000.0,"o":"restock","p":"part_1","q":1}\n')
+
+    recent = list(ledger.read_records_reversed(ledger.history_file, block_size=64))
+    assert [record['s'] for record in recent[:3]] == [151, 150, 149] and len(recent) == 151
+    assert [record['s'] for record in ledger.iter_recent()] == list(range(200, 0, -1))
+    assert [record['s'] for record in ledger.iter_recent(ops=['deduct'], part='part_0')][:3] == [199, 193, 187]
+
+
+def test_capacity_plan_rejects_malformed_bookings():
+    manager = make_manager()
+    task_count = len(manager.requirement_matrix.task_ids)
+    for bookings in ([2 ** 70], [1 << task_count], [-1], [[{}]], ['brake_pads'], [['no_such_task']], [True]):
+        with pytest.raises(ValueError):
+            manager.plan_capacity(bookings)
+    assert manager.plan_capacity([(1 << task_count) - 1])['bookings'] == 1
+
+
+def test_lost_snapshot_keeps_numbering_and_replay_errors_surface(tmp_path):
+    path = tmp_path / 'inventory.json'
+    manager = InventoryManager(str(path), save_interval=60)
+    manager.restock_part('engine_oil', 5)
+    manager.flush()  # The restock is compacted into the .history file
+    last_seq = manager.ledger.seq
+    manager.ledger.close()
+
+    path.unlink()
+    fresh = InventoryManager(str(path), save_interval=60)
+    assert fresh.ledger.seq >= last_seq
+    fresh.restock_part('engine_oil', 1)
+    seqs = [record['s'] for record in fresh.ledger.iter_history()]
+    assert seqs == sorted(set(seqs)) and [r['s'] for r in fresh.ledger.iter_recent()] == seqs[::-1]
+    fresh._dirty = False
+    fresh.ledger.close()
+
+    # A record replay cannot apply stops the load instead of resetting stock to the defaults
+    with open(fresh.ledger.ledger_file, 'a', encoding='utf-8') as f:
+        f.write('{"s":%d,"t":1700000000.0,"o":"restock","p":"engine_oil"}\n' % (fresh.ledger.seq + 1))
+    with pytest.raises(KeyError):
+        InventoryManager(str(path), save_interval=60)
@@ -0,0 +1,95 @@
+import socketserver
+import threading
+
+from flask import Flask
+from flask_mail import Mail
+
+from utils.mail_outbox import MailOutbox
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 stub ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stub')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                self.server.messages += 1
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class FakeClock:
+    def __init__(self):
+        self.current = 1000.0
+
+    def __call__(self):
+        return self.current
+
+
+def make_outbox(tmp_path, port, clock):
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False,
+                      MAIL_SUPPRESS_SEND=False, MAIL_DEFAULT_SENDER='vsis@volvo.com')
+    return MailOutbox(Mail(app), app, str(tmp_path / 'outbox.db'), max_attempts=3,
+                      base_delay=10, clock=clock)
+
+
+def test_batch_is_sent_over_one_connection(tmp_path):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStubHandler)
+    server.connections = server.messages = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        outbox = make_outbox(tmp_path, server.server_address[1], FakeClock())
+        for i in range(3):
+            outbox.enqueue(f'Alert {i}', ['admin@volvodealer.com'], 'body')
+
+        assert outbox.drain_once() == {'sent': 3, 'retried': 0, 'dead': 0}
+        assert server.messages == 3
+        assert server.connections == 1
+        assert outbox.get_stats()['pending'] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failures_back_off_then_dead_letter(tmp_path):
+    # Nothing listens on this port, so every connection attempt fails
+    probe = socketserver.TCPServer(('127.0.0.1', 0), SMTPStubHandler)
+    port = probe.server_address[1]
+    probe.server_close()
+
+    clock = FakeClock()
+    outbox = make_outbox(tmp_path, port, clock)
+    outbox.enqueue('Alert', ['admin@volvodealer.com'], 'body', kind='low_stock')
+
+    assert outbox.drain_once()['retried'] == 1
+    assert outbox.drain_once()['retried'] == 0  # Not due until the backoff has passed
+
+    clock.current += 10
+    assert outbox.drain_once()['retried'] == 1
+    clock.current += 19
+    assert outbox.drain_once()['retried'] == 0  # Second retry waits twice as long
+    clock.current += 1
+    assert outbox.drain_once()['dead'] == 1
+
+    assert outbox.get_stats()['pending'] == 0
+    dead = outbox.get_dead_letters()
+    assert dead[0]['subject'] == 'Alert' and dead[0]['attempts'] == 3
@@ -0,0 +1,87 @@
+from utils.notifier import Notifier
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.messages = []
+
+    def enqueue(self, subject, recipients, body, sender=None, html=None, kind=None):
+        self.messages.append({'subject': subject, 'body': body, 'kind': kind})
+        return len(self.messages)
+
+
+class FakeClock:
+    def __init__(self):
+        self.current = 1_700_000_000.0
+
+    def __call__(self):
+        return self.current
+
+
+def test_repeat_alerts_are_rate_limited_per_part():
+    outbox, clock = RecordingOutbox(), FakeClock()
+    notifier = Notifier(outbox, alert_windows={'low_stock': 600}, clock=clock)
+
+    for quantity in (3, 2, 1):
+        notifier.send_low_stock_alert('Brake Pads', quantity)
+    notifier.send_low_stock_alert('Engine Oil', 4)
+    assert [m['subject'] for m in outbox.messages] == ['⚠️ Low Stock Alert for Brake Pads',
+                                                      '⚠️ Low Stock Alert for Engine Oil']
+
+    clock.current += 600
+    notifier.send_low_stock_alert('Brake Pads', 0)
+    assert len(outbox.messages) == 3
+    assert '2 further alert(s)' in outbox.messages[-1]['body']
+
+    statuses = [alert['status'] for alert in notifier.get_recent_alerts()]
+    assert statuses == ['sent', 'suppressed', 'suppressed', 'sent', 'sent']
+
+
+def test_digest_mode_folds_alerts_into_one_email():
+    outbox = RecordingOutbox()
+    notifier = Notifier(outbox, digest_window=3600, clock=FakeClock())
+    for _ in range(20):
+        notifier.send_low_stock_alert('Brake Pads', 1)
+    notifier.send_low_stock_alert('AC Refrigerant', 2)
+    assert outbox.messages == []
+
+    notifier.flush_digest()
+    assert len(outbox.messages) == 1
+    digest = outbox.messages[0]
+    assert digest['kind'] == 'low_stock_digest'
+    assert 'Brake Pads: 1 left (20 alert(s)' in digest['body']
+    assert 'AC Refrigerant: 2 left (1 alert(s)' in digest['body']
+
+
+def test_alert_history_is_bounded():
+    notifier = Notifier(RecordingOutbox(), alert_windows={'low_stock': 0}, clock=FakeClock())
+    for i in range(60):
+        notifier.send_low_stock_alert(f'Part {i}', 1)
+    alerts = notifier.get_recent_alerts(limit=100)
+    assert len(alerts) == 50 and alerts[0]['part_name'] == 'Part 10'
+
+
+def test_alerts_are_rate_limited_per_site():
+    outbox = RecordingOutbox()
+    notifier = Notifier(outbox, alert_windows={'low_stock': 600}, clock=FakeClock())
+    notifier.send_low_stock_alert('Brake Pads', 2, 'pune')
+    notifier.send_low_stock_alert('Brake Pads', 1, 'mumbai')
+    notifier.send_low_stock_alert('Brake Pads', 0, 'pune')
+
+    assert [m['subject'] for m in outbox.messages] == ['⚠️ Low Stock Alert for Brake Pads at pune',
+                                                      '⚠️ Low Stock Alert for Brake Pads at mumbai']
+    assert 'Site: mumbai' in outbox.messages[1]['body']
+    assert [alert['status'] for alert in notifier.get_recent_alerts()] == ['sent', 'sent', 'suppressed']
+
+
+def test_close_queues_the_pending_digest():
+    outbox = RecordingOutbox()
+    notifier = Notifier(outbox, digest_window=3600, clock=FakeClock())
+    notifier.close()
+    assert outbox.messages == []
+
+    notifier.send_low_stock_alert('Brake Pads', 1, 'pune')
+    notifier.close()
+    assert [m['kind'] for m in outbox.messages] == ['low_stock_digest']
+    assert 'Brake Pads (pune): 1 left' in outbox.messages[0]['body']
+    assert notifier._digest_timer is None
@@ -0,0 +1,58 @@
+from utils.report_cache import ReportCache
+
+
+def render_bytes(size):
+    def render(path):
+        render.calls += 1
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+    render.calls = 0
+    return render
+
+
+def test_unchanged_records_render_once(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=10_000)
+    render = render_bytes(100)
+    record = {'service_id': 'VOL_1', 'predicted_time': 1.5}
+
+    key, path = cache.get_or_render(record, render)
+    again_key, again_path = cache.get_or_render(dict(record), render)
+    assert (again_key, again_path) == (key, path)
+    assert render.calls == 1
+
+    changed_key, _ = cache.get_or_render({**record, 'predicted_time': 2.0}, render)
+    assert changed_key != key and render.calls == 2
+
+
+def test_least_recently_used_reports_are_evicted(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=250)
+    keys = [cache.get_or_render({'service_id': i}, render_bytes(100))[0] for i in range(2)]
+    cache.get(keys[0])  # Touch the oldest so the second becomes least recently used
+
+    cache.get_or_render({'service_id': 2}, render_bytes(100))
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get_stats()['total_bytes'] == 200
+
+    # A restarted cache picks up the files already on disk
+    assert ReportCache(str(tmp_path), max_bytes=250).get_stats()['reports'] == 2
+
+
+def test_unwritable_cache_still_serves_in_memory_renders(tmp_path):
+    blocker = tmp_path / 'not_a_dir'
+    blocker.write_text('')
+    cache = ReportCache(str(blocker / 'cache'))
+    assert not cache.writable
+
+    key, data = cache.get_bytes_or_render({'service_id': 'VOL_1'}, lambda: b'%PDF-1.4 test')
+    assert data == b'%PDF-1.4 test' and key == cache.content_key({'service_id': 'VOL_1'})
+    assert cache.get_stats()['reports'] == 0
+
+
+def test_in_memory_render_is_cached_for_the_next_request(tmp_path):
+    cache = ReportCache(str(tmp_path))
+    renders = []
+    render = lambda: renders.append(1) or b'%PDF-1.4 test'
+    first = cache.get_bytes_or_render({'service_id': 'VOL_1'}, render)
+    assert cache.get_bytes_or_render({'service_id': 'VOL_1'}, render) == first
+    assert len(renders) == 1
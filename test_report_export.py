@@ -0,0 +1,85 @@
+import io
+import zipfile
+
+from utils.report_cache import ReportCache
+from utils.report_export import filter_services, stream_report_pdf, stream_report_zip
+from utils.report_generator import ReportGenerator
+
+
+def make_service(i, day, car_model='XC60', worker='W01'):
+    return {
+        'service_id': f'VOL_{i:04d}',
+        'completed_at': f'{day}T12:00:00',
+        'car_details': {'car_model': car_model, 'number_plate': f'MH12AB{i:04d}', 'manufacture_year': 2022,
+                        'fuel_type': 'Petrol', 'service_type': 'General', 'selected_tasks': ['engine_oil']},
+        'predicted_time': 1.0,
+        'completion_time': f'{day}T12:00:00',
+        'worker_assigned': {'worker_id': worker, 'worker_name': 'John Smith',
+                            'specialization': 'General Maintenance', 'workload_percentage': 12.5},
+        'inventory_status': {'available': True, 'required_parts': {'engine_oil': 1, 'oil_filter': 1}}
+    }
+
+
+SERVICES = [make_service(0, '2025-01-05'), make_service(1, '2025-01-06'),
+            make_service(2, '2025-01-07', car_model='XC90'), make_service(3, '2025-01-08', worker='W02')]
+
+
+def test_filters_by_date_range_worker_and_model():
+    selected = filter_services(SERVICES, date_from='2025-01-06', date_to='2025-01-08', worker='W01')
+    assert [s['service_id'] for s in selected] == ['VOL_0001', 'VOL_0002']
+    assert [s['service_id'] for s in filter_services(SERVICES, car_model='XC90')] == ['VOL_0002']
+
+
+def test_zip_export_streams_one_entry_per_service(tmp_path):
+    # Missing fields render as N/A, but a malformed completion time cannot be laid out
+    broken = {'service_id': 'VOL_BROKEN', 'completed_at': '2025-01-06T12:00:00', 'completion_time': 'soon'}
+    chunks = list(stream_report_zip(SERVICES + [broken], ReportCache(str(tmp_path)), ReportGenerator()))
+    assert len(chunks) > len(SERVICES)  # Emitted incrementally, not as one blob
+
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    names = archive.namelist()
+    assert names[:4] == [f'VOL_{i:04d}_report.pdf' for i in range(4)]
+    assert archive.read('VOL_0000_report.pdf').startswith(b'%PDF')
+    assert 'VOL_BROKEN' in archive.read('errors.txt').decode()
+
+
+def test_combined_pdf_has_a_section_per_service():
+    single = b''.join(stream_report_pdf(SERVICES[:1], ReportGenerator()))
+    pdf = b''.join(stream_report_pdf(SERVICES, ReportGenerator()))
+    assert pdf.startswith(b'%PDF')
+    # Every section starts on a new page, so pages scale with the number of services
+    assert pdf.count(b'/Type /Page\n') == len(SERVICES) * single.count(b'/Type /Page\n')
+
+
+def test_combined_pdf_lays_out_sections_one_at_a_time():
+    from reportlab.platypus import Flowable
+
+    events = []
+
+    class Marker(Flowable):
+        def __init__(self, service_id):
+            super().__init__()
+            self.service_id = service_id
+
+        def wrap(self, available_width, available_height):
+            return 10, 10
+
+        def draw(self):
+            events.append(('drawn', self.service_id))
+
+    class RecordingGenerator:
+        def build_service_story(self, service):
+            events.append(('built', service['service_id']))
+            return [Marker(service['service_id'])]
+
+    pdf = b''.join(stream_report_pdf(SERVICES, RecordingGenerator()))
+    assert pdf.startswith(b'%PDF')
+    assert [service_id for event, service_id in events if event == 'drawn'] == [s['service_id'] for s in SERVICES]
+    # When a service is drawn, at most the next one has had its flowables built
+    built = drawn = 0
+    for event, _ in events:
+        if event == 'built':
+            built += 1
+        else:
+            drawn += 1
+            assert built <= drawn + 1
@@ -0,0 +1,80 @@
+import time
+
+from utils.report_cache import ReportCache
+from utils.report_jobs import ReportJobManager
+
+SERVICE = {
+    'service_id': 'VOL_20250106090000W01',
+    'car_details': {'car_model': 'XC60', 'number_plate': 'MH12AB1234', 'manufacture_year': 2022,
+                    'fuel_type': 'Petrol', 'service_type': 'Brake', 'selected_tasks': ['brake_pads']},
+    'predicted_time': 1.5,
+    'completion_time': '2025-01-06T10:30:00',
+    'worker_assigned': {'worker_name': 'Sarah Johnson', 'specialization': 'Brake Expert',
+                        'workload_percentage': 37.5},
+    'inventory_status': {'available': True, 'required_parts': {'brake_pads': 1, 'brake_fluid': 1}}
+}
+
+
+def wait_for(manager, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get_job(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('render did not finish')
+
+
+def test_render_runs_in_pool_and_lands_in_cache(tmp_path):
+    manager = ReportJobManager(ReportCache(str(tmp_path)), max_workers=1)
+    try:
+        job = manager.submit(SERVICE)
+        assert job['status'] in ('queued', 'rendering', 'done')
+        # A second request for the same report joins the render in flight
+        assert manager.submit(SERVICE)['job_id'] == job['job_id']
+
+        finished = wait_for(manager, job['job_id'])
+        assert finished['status'] == 'done', finished['error']
+        key, path = manager.get_report_path(job['job_id'])
+        with open(path, 'rb') as f:
+            assert f.read(4) == b'%PDF'
+
+        # Once cached, new jobs finish without rendering again
+        cached = manager.submit(SERVICE)
+        assert cached['job_id'] != job['job_id'] and cached['status'] == 'done'
+    finally:
+        manager.shutdown()
+
+
+def test_failed_render_reports_error(tmp_path):
+    manager = ReportJobManager(ReportCache(str(tmp_path)), max_workers=1)
+    try:
+        job = manager.submit({'service_id': 'broken', 'completion_time': 'soon'})
+        finished = wait_for(manager, job['job_id'])
+        assert finished['status'] == 'failed' and finished['error']
+        assert manager.get_report_path(job['job_id']) is None
+    finally:
+        manager.shutdown()
+
+
+def test_pool_starts_on_first_render_without_rerunning_a_script_main(tmp_path, monkeypatch):
+    import sys
+    import types
+
+    # Stand in for `python app.py`: a script main whose top level must not run in the workers
+    script = tmp_path / 'script_main.py'
+    script.write_text(f"open({str(tmp_path / 'ran')!r}, 'w').close()\n")
+    main = types.ModuleType('__main__')
+    main.__file__ = str(script)
+    main.__spec__ = None
+    monkeypatch.setitem(sys.modules, '__main__', main)
+
+    manager = ReportJobManager(ReportCache(str(tmp_path / 'cache')), max_workers=1)
+    assert manager._executor is None
+    try:
+        job = manager.submit(SERVICE)
+        assert wait_for(manager, job['job_id'])['status'] == 'done'
+        assert main.__file__ == str(script)
+        assert not (tmp_path / 'ran').exists()
+    finally:
+        manager.shutdown()
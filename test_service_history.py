@@ -0,0 +1,48 @@
+from utils.service_history import ServiceHistory
+
+
+def completed(service_id, site_id='main', day='2025-01-06'):
+    return {'service_id': service_id, 'site_id': site_id, 'status': 'completed',
+            'completed_at': f'{day}T10:00:00'}
+
+
+def test_newest_page_comes_from_memory_and_older_pages_from_disk(tmp_path):
+    history = ServiceHistory(str(tmp_path / 'history.db'), hot_size=5)
+    for i in range(12):
+        history.add(completed(f'S{i:02d}'))
+    history.add(completed('N1', site_id='north'))
+    assert history.get_stats() == {'in_memory': 5, 'hot_size': 5, 'stored': 13}
+
+    first = history.page('main', limit=4)
+    assert [s['service_id'] for s in first['services']] == ['S08', 'S09', 'S10', 'S11']
+
+    ids = []
+    cursor = first['next_cursor']
+    while cursor is not None:
+        page = history.page('main', cursor, limit=4)
+        ids = [s['service_id'] for s in page['services']] + ids
+        cursor = page['next_cursor']
+    assert ids == [f'S{i:02d}' for i in range(8)]
+
+    # Spilled records are still found by ID, also after a restart
+    assert history.get('S00')['completed_at'] == '2025-01-06T10:00:00'
+    history.close()
+    reopened = ServiceHistory(str(tmp_path / 'history.db'), hot_size=5)
+    assert [s['service_id'] for s in reopened.page('north')['services']] == ['N1']
+    assert reopened.get('S03')['service_id'] == 'S03'
+
+
+def test_select_by_date_and_clear_site(tmp_path):
+    history = ServiceHistory(str(tmp_path / 'history.db'), hot_size=2)
+    history.add(completed('A', day='2025-01-05'))
+    history.add(completed('B', day='2025-01-06'))
+    history.add(completed('C', day='2025-01-07'))
+    history.add(completed('N', site_id='north'))
+
+    assert [s['service_id'] for s in history.select('main', '2025-01-06', '2025-01-07')] == ['B', 'C']
+
+    history.clear_site('main')
+    assert history.count('main') == 0
+    assert history.get('C') is None
+    assert history.page('main') == {'services': [], 'next_cursor': None}
+    assert history.count('north') == 1
@@ -0,0 +1,70 @@
+from utils.service_registry import ServiceRegistry
+
+
+def make_service(service_id, status='active', site_id='main', worker_id='W01', plate='MH12AB1234'):
+    return {
+        'service_id': service_id,
+        'site_id': site_id,
+        'status': status,
+        'car_details': {'number_plate': plate},
+        'worker_assigned': {'worker_id': worker_id if status != 'queued' else None}
+    }
+
+
+def test_indexes_follow_status_transitions():
+    registry = ServiceRegistry()
+    registry.add(make_service('S1'))
+    registry.add(make_service('Q1', status='queued'))
+    registry.add(make_service('S2', site_id='north', worker_id='W02'))
+
+    assert [s['service_id'] for s in registry.find('active')] == ['S1']
+    assert [s['service_id'] for s in registry.find('queued')] == ['Q1']
+    assert registry.count('active', 'north') == 1
+
+    version = registry.version
+    registry.update('Q1', status='active', worker_assigned={'worker_id': 'W01'})
+    assert registry.version > version
+    assert registry.count('queued') == 0
+    assert [s['service_id'] for s in registry.for_worker('W01')] == ['S1', 'Q1']
+
+    registry.update('S1', status='completed')
+    assert [s['service_id'] for s in registry.find('active')] == ['Q1']
+    assert registry.get('S1')['status'] == 'completed'
+    assert len(registry.for_plate('MH12AB1234')) == 3
+
+
+def test_recent_and_clear_site():
+    registry = ServiceRegistry()
+    for i in range(15):
+        registry.add(make_service(f'S{i}', status='completed'))
+    registry.add(make_service('N1', status='completed', site_id='north'))
+
+    assert [s['service_id'] for s in registry.recent('completed', limit=3)] == ['S12', 'S13', 'S14']
+
+    registry.clear_site('main')
+    assert registry.count('completed') == 0
+    assert registry.get('S0') is None
+    assert registry.for_worker('W01') == [registry.get('N1')]
+
+
+def test_query_pages_filtered_services_in_booking_order():
+    registry = ServiceRegistry()
+    for i in range(6):
+        service = make_service(f'S{i}', worker_id='W01' if i % 2 else 'W02')
+        service['car_details']['car_model'] = 'XC60' if i < 4 else 'XC90'
+        service['worker_assigned']['specialization'] = 'Brake Expert'
+        registry.add(service)
+    queued = make_service('Q1', status='queued')
+    queued['worker_assigned']['required_specialization'] = 'Brake Expert'
+    registry.add(queued)
+
+    first = registry.query(specialization='Brake Expert', limit=4)
+    assert [s['service_id'] for s in first['services']] == ['S0', 'S1', 'S2', 'S3']
+    second = registry.query(specialization='Brake Expert', cursor=first['next_cursor'], limit=4)
+    assert [s['service_id'] for s in second['services']] == ['S4', 'S5', 'Q1']
+    assert second['next_cursor'] is None
+
+    page = registry.query(worker_id='W01', car_model='XC60')
+    assert [s['service_id'] for s in page['services']] == ['S1', 'S3']
+    assert registry.query(statuses=['queued'])['services'] == [queued]
+    assert registry.query(car_model='Unknown')['services'] == []
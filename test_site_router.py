@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from utils.site_router import ProcessShard, ShardUnavailableError, SiteRouter, UnknownSiteError
+
+
+def test_sites_keep_separate_state(tmp_path):
+    router = SiteRouter(['north'], data_dir=str(tmp_path))
+    try:
+        assert router.sites() == ['main', 'north']
+        assert router.get() is router.get('main')
+
+        router.get('north').workload_manager.assign_worker(2.0, 'General', 'XC60')
+        router.get('north').inventory_manager.restock_part('engine_oil', 5)
+        assert router.get('north').workload_manager.get_active_services_count() == 1
+        assert router.get('main').workload_manager.get_active_services_count() == 0
+        assert (router.get('north').inventory_manager.inventory['engine_oil']['quantity']
+                == router.get('main').inventory_manager.inventory['engine_oil']['quantity'] + 5)
+        assert os.path.exists(tmp_path / 'sites' / 'north' / 'workload.json')
+    finally:
+        router.close()
+
+
+def test_unknown_site_raises(tmp_path):
+    router = SiteRouter(data_dir=str(tmp_path))
+    with pytest.raises(UnknownSiteError):
+        router.get('nowhere')
+
+
+def test_from_env_reads_sites_and_shard_mode(tmp_path, monkeypatch):
+    monkeypatch.setenv('VSIS_SITES', 'north, south')
+    monkeypatch.setenv('VSIS_SHARD_PROCESSES', '1')
+    router = SiteRouter.from_env(data_dir=str(tmp_path))
+    try:
+        assert router.sites() == ['main', 'north', 'south']
+        assert all(isinstance(router.get(site_id), ProcessShard) for site_id in router.sites())
+    finally:
+        router.close()
+
+
+def test_process_shard_round_trip_and_restart(tmp_path):
+    router = SiteRouter(['north'], data_dir=str(tmp_path), use_processes=True)
+    shard = router.get('north')
+    try:
+        _, service = shard.workload_manager.assign_worker(2.0, 'General', 'XC60')
+        assert service['service_id'] in shard.workload_manager.get_all_active_services()
+        with pytest.raises(RuntimeError, match='no_such_method'):
+            shard.workload_manager.no_such_method()
+
+        # A shard process that dies is reported clearly, then restarted from its saved state
+        shard.process.kill()
+        shard.process.join(timeout=5)
+        with pytest.raises(ShardUnavailableError):
+            shard.workload_manager.get_active_services_count()
+        shard.workload_manager.flush()
+        assert shard.workload_manager.get_active_services_count() == 1
+    finally:
+        router.close()
@@ -0,0 +1,55 @@
+import threading
+
+from utils.stage_pipeline import StagePipeline
+
+
+def test_stages_run_in_order_and_survive_failures():
+    calls = []
+
+    def persist(job):
+        calls.append(('persist', job['id']))
+
+    def broadcast(job):
+        if job['id'] == 2:
+            raise RuntimeError('socket gone')
+        calls.append(('broadcast', job['id']))
+
+    def notify(job):
+        calls.append(('notify', job['id']))
+
+    pipeline = StagePipeline([('persist', persist), ('broadcast', broadcast), ('notify', notify)]).start()
+    for job_id in (1, 2, 3):
+        pipeline.submit({'id': job_id})
+    pipeline.drain()
+    pipeline.stop()
+
+    assert calls == [('persist', 1), ('broadcast', 1), ('notify', 1), ('persist', 2), ('notify', 2),
+                     ('persist', 3), ('broadcast', 3), ('notify', 3)]
+    stats = pipeline.get_stats()
+    assert stats['completed'] == 3 and stats['errors'] == 1
+    assert stats['latency_ms']['broadcast']['errors'] == 1
+    assert stats['latency_ms']['persist']['count'] == 3
+
+
+def test_full_queue_runs_jobs_on_the_caller():
+    release = threading.Event()
+    ran_on = []
+
+    def stage(job):
+        ran_on.append(threading.current_thread().name)
+        if job.get('block'):
+            release.wait(5)
+
+    pipeline = StagePipeline([('stage', stage)], max_pending=1, block_timeout=0.01).start()
+    pipeline.submit({'block': True})  # Taken by the worker, which then waits
+    while not ran_on:
+        threading.Event().wait(0.01)
+    pipeline.submit({})  # Fills the queue
+    pipeline.submit({})  # No room: runs here
+    assert ran_on == ['stage-pipeline', threading.current_thread().name]
+
+    release.set()
+    pipeline.drain()
+    pipeline.stop()
+    stats = pipeline.get_stats()
+    assert stats['completed'] == 3 and stats['ran_inline'] == 1
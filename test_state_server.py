@@ -0,0 +1,76 @@
+import os
+import threading
+
+import pytest
+
+from utils.state_server import StateClient, StateServer, state_authkey
+
+
+def start_server(tmp_path):
+    address = os.path.join(str(tmp_path), 'state.sock')
+    server = StateServer(address, b'test', ['main', 'north'], data_dir=str(tmp_path),
+                         history_db=os.path.join(str(tmp_path), 'history.db'))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, StateClient(address, b'test')
+
+
+def test_workers_share_managers_and_registry(tmp_path):
+    server, client = start_server(tmp_path)
+    other = StateClient(client.address, b'test')  # A second web worker
+    try:
+        registry = client.proxy('registry')
+        registry.add({'service_id': 'S1', 'site_id': 'north', 'status': 'active'})
+        assert other.proxy('registry').count('active', 'north') == 1
+        assert other.proxy('registry').get_version() == registry.get_version()
+
+        workload = client.proxy('workload', 'north')
+        assignment, service = workload.assign_worker(2.0, 'General', 'XC60', [])
+        assert service['service_id'] in other.proxy('workload', 'north').get_all_active_services()
+        assert other.proxy('workload', 'main').get_active_services_count() == 0
+    finally:
+        server.close()
+
+
+def test_published_messages_reach_every_subscriber(tmp_path):
+    server, client = start_server(tmp_path)
+    try:
+        first, second = client.subscribe(), StateClient(client.address, b'test').subscribe()
+        # Subscribing happens on the first next(); wait for both before publishing
+        received = []
+
+        def receive(feed):
+            received.append(next(feed))
+
+        threads = [threading.Thread(target=receive, args=(feed,)) for feed in (first, second)]
+        for thread in threads:
+            thread.start()
+        while len(server.subscribers) < 2:
+            threading.Event().wait(0.01)
+        client.publish({'method': 'emit', 'event': 'state_patch'})
+        for thread in threads:
+            thread.join(timeout=5)
+        assert received == [{'method': 'emit', 'event': 'state_patch'}] * 2
+    finally:
+        server.close()
+
+
+def test_only_allow_listed_methods_can_be_called(tmp_path):
+    server, client = start_server(tmp_path)
+    try:
+        assert client.call('server', None, 'get_epoch') == server.epoch
+        for target, site_id, method in [('workload', 'north', 'write_workload'), ('workload', 'north', '__init__'),
+                                        ('history', None, 'close'), ('server', None, 'close')]:
+            with pytest.raises(RuntimeError, match='PermissionError'):
+                client.call(target, site_id, method)
+        # The connection stays usable after a refused call
+        assert client.proxy('workload', 'north').get_active_services_count() == 0
+    finally:
+        server.close()
+
+
+def test_state_authkey_has_no_default(monkeypatch):
+    monkeypatch.delenv('VSIS_STATE_AUTHKEY', raising=False)
+    with pytest.raises(RuntimeError, match='VSIS_STATE_AUTHKEY'):
+        state_authkey()
+    monkeypatch.setenv('VSIS_STATE_AUTHKEY', 'not-the-default')
+    assert state_authkey() == b'not-the-default'
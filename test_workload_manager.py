@@ -0,0 +1,171 @@
+import threading
+from datetime import datetime, timedelta
+
+from utils.workload_manager import WorkloadManager
+
+
+def make_manager(tmp_path):
+    return WorkloadManager(str(tmp_path / 'workload.json'))
+
+
+def test_snapshot_is_cached_until_mutation(tmp_path):
+    manager = make_manager(tmp_path)
+
+    first = manager.get_workload_data()
+    assert manager.get_workload_data() is first
+
+    version = manager.version
+    manager.assign_worker(2.0, 'General', 'XC60')
+    assert manager.version > version
+
+    second = manager.get_workload_data()
+    assert second is not first
+    assert second['version'] == manager.version
+    assert second['summary']['total_active_jobs'] == 1
+
+
+def test_patched_snapshot_matches_full_rebuild(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.get_workload_data()
+
+    _, service = manager.assign_worker(3.0, 'Brake', 'XC90')
+    manager.assign_worker(1.5, 'AC', 'S60')
+    manager.get_workload_data()
+    manager.complete_service(service['service_id'])
+
+    patched = manager.get_workload_data()
+    rebuilt = manager.build_workload_snapshot()
+    assert patched['workers'] == rebuilt['workers']
+    for key, value in rebuilt['summary'].items():
+        assert abs(patched['summary'][key] - value) < 1e-9
+
+
+def test_workload_changes_since_version(tmp_path):
+    manager = make_manager(tmp_path)
+    version = manager.get_workload_data()['version']
+
+    assert manager.get_workload_changes(version) == {'changed': False, 'version': version}
+
+    manager.assign_worker(2.0, 'Major', 'V90')
+    assert 'workers' in manager.get_workload_changes(version)
+
+
+def test_wait_estimate_uses_running_aggregates(tmp_path):
+    manager = make_manager(tmp_path)
+    assert manager.estimate_wait_time('Brake Expert') == 1.0
+
+    # Fill every worker so the next request is queued
+    while manager.get_workload_data()['summary']['available_workers']:
+        manager.assign_worker(4.0, 'General', 'XC40')
+    info, _ = manager.assign_worker(2.0, 'Brake', 'XC90')
+    assert info['queue_position'] == 1
+
+    brake_estimate = manager.estimate_wait_time('Brake Expert')
+    assert 0 < brake_estimate <= 8.0
+    assert manager.get_queue_info('Brake')['queued_for_specialization'] == 1
+    assert manager.get_queue_info('AC')['queued_for_specialization'] == 0
+
+    # The incremental aggregates must agree with a full recomputation
+    counts = dict(manager._spec_job_count)
+    sums = dict(manager._spec_completion_sum)
+    manager.rebuild_aggregates()
+    assert counts == manager._spec_job_count
+    for spec, total in sums.items():
+        assert abs(manager._spec_completion_sum[spec] - total) < 1e-3
+
+
+def test_promoted_service_keeps_its_queue_id(tmp_path):
+    manager = make_manager(tmp_path)
+    while manager.get_workload_data()['summary']['available_workers']:
+        _, running = manager.assign_worker(4.0, 'General', 'XC40')
+    _, queued = manager.assign_worker(2.0, 'Brake', 'XC90')
+
+    manager.complete_service(running['service_id'])
+    promotion = manager.get_last_promoted()[0]
+    assert promotion['service_data']['service_id'] == queued['service_id']
+    assert queued['service_id'] in manager.get_all_active_services()
+
+
+def test_wait_estimate_drops_overdue_jobs():
+    clock = {'now': datetime(2025, 1, 6, 9, 0)}
+    manager = WorkloadManager(None, clock=lambda: clock['now'])
+    _, short = manager.assign_worker(1.0, 'General', 'XC40')
+    _, long = manager.assign_worker(4.0, 'General', 'XC60')
+    completion = {service_id: datetime.fromisoformat(service['job_data']['completion_time'])
+                  for service_id, service in manager.active_services.items()}
+
+    # Once the short job is overdue, only the long one's remaining time counts
+    clock['now'] = completion[short['service_id']] + timedelta(hours=1)
+    remaining = (completion[long['service_id']] - clock['now']).total_seconds() / 3600
+    assert manager.estimate_wait_time('General Maintenance') == round(remaining, 2)
+    assert manager._spec_due_count['General Maintenance'] == 1
+    assert manager.get_queue_info('General')['total_active_jobs'] == 2
+
+    # Completing an overdue job, or one still due, keeps the sums consistent
+    manager.complete_service(short['service_id'])
+    manager.complete_service(long['service_id'])
+    assert manager._spec_due_count['General Maintenance'] == 0
+    assert manager._spec_completion_sum['General Maintenance'] == 0
+    assert manager.estimate_wait_time('General Maintenance') == 1.0
+
+
+def test_wait_estimate_keeps_a_minimum_when_every_job_is_overdue():
+    clock = {'now': datetime(2025, 1, 6, 9, 0)}
+    manager = WorkloadManager(None, clock=lambda: clock['now'])
+    manager.assign_worker(1.0, 'General', 'XC40')
+    manager.assign_worker(2.0, 'General', 'XC60')
+
+    clock['now'] += timedelta(hours=12)
+    assert manager._spec_job_count['General Maintenance'] == 2
+    assert manager.estimate_wait_time('General Maintenance') == 1.0
+    assert manager._spec_due_count['General Maintenance'] == 0
+
+
+def test_booking_is_kept_across_reload_and_promotion(tmp_path):
+    manager = make_manager(tmp_path)
+    while manager.get_workload_data()['summary']['available_workers']:
+        _, running = manager.assign_worker(4.0, 'General', 'XC40')
+    info, queued = manager.assign_worker(2.0, 'Brake', 'XC90')
+    booking = {'service_id': queued['service_id'], 'car_details': {'number_plate': 'MH12AB4321'},
+               'worker_assigned': info, 'status': 'queued'}
+    assert manager.attach_booking(queued['service_id'], booking)
+    assert not manager.attach_booking('NO_SUCH_SERVICE', booking)
+
+    reloaded = make_manager(tmp_path)
+    assert reloaded.get_service_queue()[0]['booking'] == booking
+
+    reloaded.complete_service(running['service_id'])
+    promoted = reloaded.get_all_active_services()[queued['service_id']]['booking']
+    assert promoted['car_details'] == booking['car_details'] and promoted['status'] == 'active'
+    assert promoted['worker_assigned']['worker_id'] and promoted['completion_time']
+
+
+def test_background_flush_and_snapshots_race_safely_with_mutations(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.set_defer_saves(True)
+    stop = threading.Event()
+    errors = []
+
+    def background():
+        # What the persist stage and the broadcast scheduler do off the request thread
+        while not stop.is_set():
+            try:
+                manager.flush()
+                manager.get_workload_data()
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    try:
+        for _ in range(200):
+            _, service = manager.assign_worker(1.0, 'General', 'XC40')
+            manager.complete_service(service['service_id'])
+    finally:
+        stop.set()
+        thread.join()
+
+    assert errors == []
+    manager.set_defer_saves(False)
+    assert make_manager(tmp_path).get_active_services_count() == manager.get_active_services_count() == 0
+    assert manager.get_workload_data()['summary']['total_active_jobs'] == 0
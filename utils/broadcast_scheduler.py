@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+
+RATE_WINDOW = 60.0  # Seconds of history behind the reported emit rate
+
+
+class BroadcastScheduler:
+    """Coalesces SocketIO broadcasts and sends them from a background thread.
+
+    Request handlers only mark (site, channel) pairs dirty and queue one-off events. The
+    worker flushes at most max_rate times a second: every dirty channel is published once
+    however many times it was marked since the last flush, then the queued events follow.
+    """
+
+    def __init__(self, flush_channel, send_event, max_rate=10.0, clock=time.monotonic):
+        self.flush_channel = flush_channel  # (site_id, channel) -> number of messages emitted
+        self.send_event = send_event  # (event, data, room)
+        self.max_rate = max_rate
+        self.min_interval = 1.0 / max_rate
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.dirty = {}  # (site_id, channel) -> None, in the order they were first marked
+        self.events = deque()
+        self.stats = {'marks': 0, 'flushes': 0, 'channel_flushes': 0, 'emits': 0, 'events': 0, 'errors': 0}
+        self._recent = deque()  # (flushed_at, messages emitted) within RATE_WINDOW
+        self.last_flush = None
+        self.started_at = clock()
+
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def mark(self, site_id, *channels):
+        """Schedule one update of each channel of a site"""
+        with self.lock:
+            for channel in channels:
+                self.dirty[(site_id, channel)] = None
+            self.stats['marks'] += len(channels)
+        self._wake.set()
+
+    def emit(self, event, data, room):
+        """Schedule a one-off event; these are never merged"""
+        with self.lock:
+            self.events.append((event, data, room))
+        self._wake.set()
+
+    def flush(self):
+        """Publish every dirty channel and send the queued events; returns the messages emitted"""
+        with self.lock:
+            dirty = list(self.dirty)
+            self.dirty = {}
+            events = list(self.events)
+            self.events.clear()
+        if not dirty and not events:
+            return 0
+
+        emitted = errors = 0
+        for site_id, channel in dirty:
+            try:
+                emitted += self.flush_channel(site_id, channel)
+            except Exception as e:
+                errors += 1
+                print(f"❌ Broadcast of {channel} for site {site_id} failed: {e}")
+        for event, data, room in events:
+            try:
+                self.send_event(event, data, room)
+                emitted += 1
+            except Exception as e:
+                errors += 1
+                print(f"❌ Broadcast of {event} failed: {e}")
+
+        now = self.clock()
+        with self.lock:
+            self.stats['flushes'] += 1
+            self.stats['channel_flushes'] += len(dirty)
+            self.stats['events'] += len(events)
+            self.stats['emits'] += emitted
+            self.stats['errors'] += errors
+            self._recent.append((now, emitted))
+            self._trim_recent(now)
+        return emitted
+
+    def _trim_recent(self, now):
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW:
+            self._recent.popleft()
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            # Whatever is marked while we wait goes out with this flush
+            if self.last_flush is not None:
+                delay = self.last_flush + self.min_interval - self.clock()
+                if delay > 0:
+                    self._stopping.wait(delay)
+            self.last_flush = self.clock()
+            self.flush()
+
+    def start(self):
+        """Start the background sender and return self"""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self.run, name='broadcast-scheduler', daemon=True)
+            self._worker.start()
+            print(f"📡 Broadcast scheduler started (at most {self.max_rate:g} flushes/s)")
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def get_stats(self):
+        now = self.clock()
+        with self.lock:
+            self._trim_recent(now)
+            stats = dict(self.stats)
+            stats['pending_channels'] = len(self.dirty)
+            stats['pending_events'] = len(self.events)
+            window = min(RATE_WINDOW, now - self.started_at)
+            recent_emits = sum(count for _, count in self._recent)
+        stats['max_rate'] = self.max_rate
+        # Channel updates that were folded into another update of the same channel
+        stats['coalesced'] = stats['marks'] - stats['channel_flushes'] - stats['pending_channels']
+        stats['emit_rate'] = round(recent_emits / window, 2) if window > 0 else 0.0  # Messages per second
+        return stats
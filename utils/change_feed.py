@@ -0,0 +1,66 @@
+import copy
+import threading
+
+_MISSING = object()
+
+
+class ChangeFeed:
+    """Versioned state channels that publish only what changed.
+
+    Each (site, channel) keeps a copy of the state it last published: a dict keyed by
+    item ID (worker, part, service) plus an optional small 'meta' dict. update() compares
+    the current state with that copy and returns a patch of the added, changed and
+    removed keys with the next sequence number. A client that sees a gap in the sequence
+    asks for snapshot() and continues from there.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}  # (site_id, channel) -> {'seq', 'state', 'meta'}
+        self.stats = {'patches': 0, 'snapshots': 0, 'unchanged': 0}
+
+    def _channel(self, site_id, channel):
+        return self.channels.setdefault((site_id, channel), {'seq': 0, 'state': {}, 'meta': None})
+
+    def update(self, site_id, channel, state, meta=None):
+        """Record the current state of a channel and return the patch to publish, or None"""
+        with self.lock:
+            current = self._channel(site_id, channel)
+            published = current['state']
+            changed = {key: value for key, value in state.items() if published.get(key, _MISSING) != value}
+            removed = [key for key in published if key not in state]
+            meta_changed = meta != current['meta']
+            if not changed and not removed and not meta_changed:
+                self.stats['unchanged'] += 1
+                return None
+
+            # Copies, so later in-place changes to the live objects show up in the next diff
+            changed = copy.deepcopy(changed)
+            for key in removed:
+                del published[key]
+            published.update(changed)
+            current['seq'] += 1
+            self.stats['patches'] += 1
+
+            patch = {'site_id': site_id, 'channel': channel, 'seq': current['seq'],
+                     'changed': changed, 'removed': removed}
+            if meta_changed:
+                current['meta'] = copy.deepcopy(meta)
+                patch['meta'] = current['meta']
+            return patch
+
+    def snapshot(self, site_id, channel):
+        """The full published state of a channel and the sequence number it is at"""
+        with self.lock:
+            current = self._channel(site_id, channel)
+            self.stats['snapshots'] += 1
+            return {'site_id': site_id, 'channel': channel, 'seq': current['seq'],
+                    'state': dict(current['state']), 'meta': current['meta']}
+
+    def seq(self, site_id, channel):
+        with self.lock:
+            return self._channel(site_id, channel)['seq']
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
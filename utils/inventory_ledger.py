@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+
+# Operations that change the on-hand quantity, and the sign they apply
+QUANTITY_OPS = {'deduct': -1, 'restock': 1}
+
+
+class InventoryLedger:
+    """Append-only log of stock movements (deduct, restock, reserve, release).
+
+    Each movement is one compact JSON line with a sequence number. compact() folds the
+    records already covered by an inventory snapshot into a history file, so the hot
+    ledger stays short while the full consumption history is kept.
+    """
+
+    def __init__(self, ledger_file, history_file=None, clock=time.time):
+        self.ledger_file = ledger_file
+        self.history_file = history_file or f"{ledger_file}.history"
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.seq = 0
+        for record in self.read_records(self.ledger_file):
+            self.seq = max(self.seq, record['s'])
+        # Compaction may have emptied the live ledger; numbering must still continue past history,
+        # even when no snapshot is left to say where it stopped
+        for record in self.read_records_reversed(self.history_file):
+            self.seq = max(self.seq, record['s'])
+            break
+        self._fh = open(self.ledger_file, 'a', encoding='utf-8')
+
+    @staticmethod
+    def read_records(path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = InventoryLedger.parse_line(line)
+                if record is not None:
+                    yield record
+
+    def append(self, op, part, quantity, ref=None, timestamp=None, expires_at=None):
+        """Record one movement and return its sequence number"""
+        with self.lock:
+            self.seq += 1
+            record = {'s': self.seq, 't': round(timestamp if timestamp is not None else self.clock(), 3),
+                      'o': op, 'p': part, 'q': quantity}
+            if ref is not None:
+                record['r'] = ref
+            if expires_at is not None:
+                record['x'] = round(expires_at, 3)  # When a reserve hold runs out
+            self._fh.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._fh.flush()
+            return self.seq
+
+    def ensure_seq(self, seq):
+        """Never hand out sequence numbers at or below one a snapshot already covers"""
+        with self.lock:
+            self.seq = max(self.seq, seq)
+
+    def tail(self, after_seq):
+        """Records not yet folded into the snapshot taken at after_seq"""
+        with self.lock:
+            self._fh.flush()
+            return [record for record in self.read_records(self.ledger_file) if record['s'] > after_seq]
+
+    def compact(self, snapshot_seq):
+        """Move records covered by the snapshot at snapshot_seq into the history file"""
+        with self.lock:
+            self._fh.flush()
+            folded = []
+            remaining = []
+            for record in self.read_records(self.ledger_file):
+                (folded if record['s'] <= snapshot_seq else remaining).append(record)
+            if not folded:
+                return 0
+
+            with open(self.history_file, 'a', encoding='utf-8') as history:
+                for record in folded:
+                    history.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+            tmp_file = f"{self.ledger_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for record in remaining:
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._fh.close()
+            os.replace(tmp_file, self.ledger_file)
+            self._fh = open(self.ledger_file, 'a', encoding='utf-8')
+            return len(folded)
+
+    def iter_history(self, ops=None, part=None, since=None, ref=None):
+        """Every recorded movement, oldest first, optionally filtered"""
+        with self.lock:
+            self._fh.flush()
+        last_seq = 0
+        for path in (self.history_file, self.ledger_file):
+            for record in self.read_records(path):
+                # A compaction interrupted after writing history can leave duplicates behind
+                if record['s'] <= last_seq:
+                    continue
+                last_seq = record['s']
+                if ops and record['o'] not in ops:
+                    continue
+                if part and record['p'] != part:
+                    continue
+                if since is not None and record['t'] < since:
+                    continue
+                if ref and record.get('r') != ref:
+                    continue
+                yield record
+
+    @staticmethod
+    def read_records_reversed(path, block_size=65536):
+        """Records of a log file, newest first, reading blocks back from the end"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            partial = b''
+            while position > 0:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                lines = (f.read(step) + partial).split(b'\n')
+                partial = lines.pop(0)  # May continue in the block before this one
+                for line in reversed(lines):
+                    record = InventoryLedger.parse_line(line)
+                    if record is not None:
+                        yield record
+            record = InventoryLedger.parse_line(partial)
+            if record is not None:
+                yield record
+
+    @staticmethod
+    def parse_line(line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None  # A torn final line from a crash mid-append carries no committed movement
+
+    def iter_recent(self, ops=None, part=None, ref=None):
+        """Recorded movements, newest first, reading only as far back as the caller takes"""
+        with self.lock:
+            self._fh.flush()
+        last_seq = None
+        for path in (self.ledger_file, self.history_file):
+            for record in self.read_records_reversed(path):
+                # Skip duplicates a compaction interrupted after writing history left behind
+                if last_seq is not None and record['s'] >= last_seq:
+                    continue
+                last_seq = record['s']
+                if ops and record['o'] not in ops:
+                    continue
+                if part and record['p'] != part:
+                    continue
+                if ref and record.get('r') != ref:
+                    continue
+                yield record
+
+    def close(self):
+        with self.lock:
+            self._fh.close()
@@ -1,17 +1,58 @@
+import atexit
+import heapq
+import itertools
 import json
+import math
+import os
+import threading
 from datetime import datetime
 
+from utils.inventory_ledger import InventoryLedger, QUANTITY_OPS
+from utils.parts_forecaster import PartsForecaster
+from utils.parts_matrix import PartsRequirementMatrix
+
 class InventoryManager:
-    def __init__(self, inventory_file):
-        self.inventory_file = inventory_file
+    def __init__(self, inventory_file, clock=None, reservation_ttl=900, save_interval=30.0,
+                 restock_hysteresis=0.25, ledger_file=None, forecast_half_life_days=7.0):
+        self.inventory_file = inventory_file  # None keeps the inventory in memory only
+        self.now = clock or datetime.now  # Swapped for a virtual clock by the simulator
+        self.reservation_ttl = reservation_ttl  # Seconds before an uncommitted hold is released
+        self.save_interval = save_interval  # Seconds between snapshots; the ledger covers the gap (0 snapshots every change)
+        self.forecast_half_life_days = forecast_half_life_days  # How quickly usage rates forget old consumption
+        self.restock_hysteresis = restock_hysteresis  # Fraction of min_stock a part must climb above to clear
+        self.lock = threading.RLock()
+        self._flush_timer = None
+        self._dirty = False
+        self._reservation_ids = itertools.count(1)
+        self.version = 0  # Bumped whenever stock levels change, so readers can detect changes
+        
+        # Every stock movement is appended to the ledger; snapshots fold it in periodically
+        self.ledger = None
+        if inventory_file is not None:
+            ledger_file = ledger_file or f"{os.path.splitext(inventory_file)[0]}.ledger"
+            self.ledger = InventoryLedger(ledger_file)
         self.load_inventory()
+        if inventory_file is not None:
+            atexit.register(self.flush)
     
     def load_inventory(self):
+        if self._dirty:
+            self.flush()
+        # Open holds are rebuilt from the snapshot and the reserve/release records after it
+        self.reserved = {}  # part -> units held by open reservations
+        self.reservations = {}  # reservation_id -> {'parts', 'expires_at', 'created_at'}
+        self._expiry_heap = []  # (expires_at, reservation_id)
+        self.low_stock_parts = set()  # Parts currently in the low-stock alert state
+        self._stock_events = []  # Threshold crossings not yet picked up by pop_stock_events()
+        self.version += 1
         try:
+            if self.inventory_file is None:
+                raise FileNotFoundError('in-memory inventory')
             with open(self.inventory_file, 'r') as f:
                 self.inventory = json.load(f)
-            print("✅ Inventory loaded successfully")
-        except:
+        except (OSError, json.JSONDecodeError) as e:
+            if self.inventory_file is not None:
+                print(f"⚠️ Could not load inventory snapshot, starting from the default stock: {e}")
             # Default inventory
             self.inventory = {
                 'engine_oil': {'name': 'Engine Oil', 'quantity': 25, 'min_stock': 5, 'unit': 'liters'},
@@ -28,65 +69,338 @@ class InventoryManager:
                 'power_steering_fluid': {'name': 'Power Steering Fluid', 'quantity': 15, 'min_stock': 4, 'unit': 'liters'}
             }
             self.save_inventory()
+        else:
+            # A failed replay must not fall back to the defaults: saving those would compact them
+            # over the real ledger, so errors here propagate
+            snapshot_seq = self.inventory.pop('_ledger_seq', 0)
+            for reservation_id, reservation in self.inventory.pop('_reservations', {}).items():
+                for part, quantity in reservation['parts'].items():
+                    self.hold_part(reservation_id, part, quantity, reservation['expires_at'], reservation['created_at'])
+            replayed = self.replay_ledger(snapshot_seq)
+            print(f"✅ Inventory loaded successfully ({replayed} ledger movements replayed)")
+        
+        for reservation_id, reservation in self.reservations.items():
+            heapq.heappush(self._expiry_heap, (reservation['expires_at'], reservation_id))
+        # New reservation IDs continue past every movement on record, so none repeats an older one
+        self._reservation_ids = itertools.count((self.ledger.seq if self.ledger else 0) + 1)
+        
+        # Compile the task -> parts requirements once per inventory layout
+        self.requirement_matrix = PartsRequirementMatrix(part_ids=list(self.inventory))
+        
+        # Usage rates start from the recorded deductions and are then updated one at a time
+        self.forecaster = PartsForecaster(self.requirement_matrix.part_ids, self.forecast_half_life_days)
+        if self.ledger is not None:
+            for record in self.ledger.iter_history(ops=['deduct']):
+                self.forecaster.record_usage(record['p'], record['q'], record['t'])
+        
+        # Parts that are already low raise one alert after a (re)load
+        for part in self.inventory:
+            self.update_stock_state(part)
+    
+    def replay_ledger(self, snapshot_seq):
+        """Apply the ledger movements recorded after the snapshot was taken"""
+        if self.ledger is None:
+            return 0
+        self.ledger.ensure_seq(snapshot_seq)
+        
+        replayed = 0
+        for record in self.ledger.tail(snapshot_seq):
+            part, op, ref = record['p'], record['o'], record.get('r')
+            if part not in self.inventory:
+                continue
+            if op == 'reserve':
+                self.hold_part(ref, part, record['q'], record.get('x', record['t'] + self.reservation_ttl), record['t'])
+            elif op in ('release', 'deduct'):
+                # A deduct that carries a reservation ID is the commit of that hold
+                self.unhold_part(ref, part)
+            if op in QUANTITY_OPS:
+                self.inventory[part]['quantity'] += QUANTITY_OPS[op] * record['q']
+                stamp_field = 'last_used' if op == 'deduct' else 'last_restocked'
+                self.inventory[part][stamp_field] = datetime.fromtimestamp(record['t']).isoformat()
+            replayed += 1
+        return replayed
+    
+    def hold_part(self, reservation_id, part, quantity, expires_at, created_at):
+        """Restore one part of an open hold while loading"""
+        reservation = self.reservations.setdefault(
+            reservation_id, {'parts': {}, 'expires_at': expires_at, 'created_at': created_at})
+        reservation['parts'][part] = reservation['parts'].get(part, 0) + quantity
+        self.reserved[part] = self.reserved.get(part, 0) + quantity
+    
+    def unhold_part(self, reservation_id, part):
+        """Drop one part of a restored hold that a later record released or committed"""
+        reservation = self.reservations.get(reservation_id)
+        if reservation is None or part not in reservation['parts']:
+            return
+        self.reserved[part] -= reservation['parts'].pop(part)
+        if not reservation['parts']:
+            del self.reservations[reservation_id]
+    
+    def record_movement(self, op, part, quantity, ref=None, expires_at=None):
+        """Append one stock movement to the ledger"""
+        if self.ledger is not None:
+            self.ledger.append(op, part, quantity, ref, self.now().timestamp(), expires_at)
     
     def save_inventory(self):
-        with open(self.inventory_file, 'w') as f:
-            json.dump(self.inventory, f, indent=2)
+        """Write a snapshot of the inventory and fold the ledger records it covers"""
+        if self.inventory_file is None:
+            return
+        with self.lock:
+            snapshot = dict(self.inventory)
+            snapshot_seq = self.ledger.seq if self.ledger else 0
+            # Open holds go with the snapshot, since their reserve records are compacted away
+            reservations = {
+                reservation_id: {**reservation, 'parts': dict(reservation['parts'])}
+                for reservation_id, reservation in self.reservations.items() if reservation['parts']
+            }
+        snapshot['_ledger_seq'] = snapshot_seq
+        snapshot['_reservations'] = reservations
+        
+        tmp_file = f"{self.inventory_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_file, self.inventory_file)
+        
+        if self.ledger is not None:
+            self.ledger.compact(snapshot_seq)
     
-    def check_and_deduct_parts(self, selected_tasks):
-        required_parts = {}
-        parts_availability = True
+    def get_movement_history(self, part=None, ops=None, limit=100, ref=None):
+        """Most recent stock movements from the ledger and its compacted history"""
+        if self.ledger is None or limit <= 0:
+            return []
+        # Read back from the newest record, so a short page never scans the whole history
+        records = list(itertools.islice(self.ledger.iter_recent(ops=ops, part=part, ref=ref), limit))
+        records.reverse()
+        return [
+            {
+                'seq': record['s'],
+                'timestamp': datetime.fromtimestamp(record['t']).isoformat(),
+                'op': record['o'],
+                'part': record['p'],
+                'quantity': record['q'],
+                'ref': record.get('r')
+            }
+            for record in records
+        ]
+    
+    def mark_dirty(self):
+        """Record a stock change and schedule one background snapshot for the current interval"""
+        self._dirty = True
+        self.version += 1
+        if self.inventory_file is None:
+            return
+        if self.save_interval <= 0:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.save_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        """Snapshot pending stock changes to disk"""
+        with self.lock:
+            self._flush_timer = None
+            if self._dirty:
+                self._dirty = False
+                self.save_inventory()
+    
+    def calculate_required_parts(self, selected_tasks):
+        """Count the parts needed for a list of tasks"""
+        return self.requirement_matrix.required_parts(selected_tasks)
+    
+    def plan_capacity(self, bookings):
+        """Check whether many prospective bookings can be fulfilled from unreserved stock"""
+        self.expire_reservations()
+        with self.lock:
+            available = {part: self.get_available_quantity(part) for part in self.inventory}
+        return self.requirement_matrix.plan_capacity(bookings, available)
+    
+    def update_stock_state(self, part):
+        """Track low-stock threshold crossings for a part whose quantity just changed"""
+        part_data = self.inventory[part]
+        quantity = part_data['quantity']
+        
+        if part not in self.low_stock_parts:
+            if quantity <= part_data['min_stock']:
+                self.low_stock_parts.add(part)
+                self.record_stock_event('low_stock', part)
+        else:
+            # Only clear after climbing a margin above the threshold, so stock hovering
+            # around min_stock does not flap between alert and clear
+            margin = max(1, math.ceil(part_data['min_stock'] * self.restock_hysteresis))
+            if quantity > part_data['min_stock'] + margin:
+                self.low_stock_parts.discard(part)
+                self.record_stock_event('restocked', part)
+    
+    def record_stock_event(self, event_type, part):
+        part_data = self.inventory[part]
+        self._stock_events.append({
+            'type': event_type,
+            'id': part,
+            'name': part_data['name'],
+            'quantity': part_data['quantity'],
+            'min_stock': part_data['min_stock'],
+            'unit': part_data.get('unit', 'pieces'),
+            'timestamp': self.now().isoformat()
+        })
+    
+    def pop_stock_events(self):
+        """Return and clear the low-stock/restocked crossings since the last call"""
+        with self.lock:
+            events, self._stock_events = self._stock_events, []
+            return events
+    
+    def get_available_quantity(self, part):
+        """Stock on hand that is not held by a reservation"""
+        return self.inventory[part]['quantity'] - self.reserved.get(part, 0)
+    
+    def expire_reservations(self):
+        """Release every reservation whose hold has run out"""
+        now = self.now().timestamp()
+        expired = []
+        with self.lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, reservation_id = heapq.heappop(self._expiry_heap)
+                reservation = self.reservations.get(reservation_id)
+                # Skip entries for holds that were committed, released or extended
+                if reservation and reservation['expires_at'] == expires_at:
+                    self.release_reservation(reservation_id)
+                    expired.append(reservation_id)
+        if expired:
+            print(f"⌛ Released {len(expired)} expired part reservation(s)")
+        return expired
+    
+    def reserve_parts(self, required_parts, ttl=None, reservation_id=None):
+        """Hold parts for a booking (phase one); all parts are held or none are"""
+        self.expire_reservations()
+        with self.lock:
+            return self._reserve(required_parts, ttl, reservation_id)
+    
+    def reserve_parts_for_tasks(self, selected_tasks, ttl=None, reservation_id=None):
+        """Hold the parts needed for a list of tasks"""
+        return self.reserve_parts(self.calculate_required_parts(selected_tasks), ttl, reservation_id)
+    
+    def reserve_batch(self, bookings, ttl=None):
+        """Reserve parts for many bookings in order under one lock; each booking succeeds or fails on its own.
+        
+        bookings is a list of {'selected_tasks': [...]} or {'required_parts': {...}} dicts,
+        each optionally carrying its own 'reservation_id'.
+        """
+        self.expire_reservations()
+        results = []
+        with self.lock:
+            for booking in bookings:
+                required_parts = booking.get('required_parts')
+                if required_parts is None:
+                    required_parts = self.calculate_required_parts(booking.get('selected_tasks', []))
+                results.append(self._reserve(required_parts, ttl, booking.get('reservation_id')))
+        return results
+    
+    def _reserve(self, required_parts, ttl, reservation_id):
         unavailable_parts = []
+        for part, quantity in required_parts.items():
+            if part in self.inventory and self.get_available_quantity(part) < quantity:
+                unavailable_parts.append({
+                    'part': part,
+                    'required': quantity,
+                    'available': self.get_available_quantity(part)
+                })
         
-        # Parts required for each task
-        task_parts_map = {
-            'engine_oil': ['engine_oil', 'oil_filter'],
-            'air_filter': ['air_filter'],
-            'spark_plugs': ['spark_plugs'],
-            'brake_pads': ['brake_pads', 'brake_fluid'],
-            'brake_fluid': ['brake_fluid'],
-            'ac_service': ['ac_gas', 'ac_cleaner'],
-            'ac_filter': ['ac_filter'],
-            'wheel_alignment': [],  # No parts needed
-            'tire_rotation': []     # No parts needed
+        result = {
+            'reservation_id': None,
+            'required_parts': required_parts,
+            'available': not unavailable_parts,
+            'unavailable_parts': unavailable_parts,
+            'expires_at': None
         }
+        if unavailable_parts:
+            return result
         
-        # Calculate required parts
-        for task in selected_tasks:
-            if task in task_parts_map:
-                for part in task_parts_map[task]:
-                    required_parts[part] = required_parts.get(part, 0) + 1
+        reservation_id = reservation_id or f"RES_{next(self._reservation_ids)}"
+        if reservation_id in self.reservations:
+            self.release_reservation(reservation_id)
         
-        # Check availability
-        for part, quantity in required_parts.items():
-            if part in self.inventory:
-                if self.inventory[part]['quantity'] < quantity:
-                    parts_availability = False
-                    unavailable_parts.append({
-                        'part': part,
-                        'required': quantity,
-                        'available': self.inventory[part]['quantity']
-                    })
-        
-        # Deduct parts if available
-        if parts_availability:
-            for part, quantity in required_parts.items():
-                if part in self.inventory:
-                    self.inventory[part]['quantity'] -= quantity
-                    self.inventory[part]['last_used'] = datetime.now().isoformat()
-            self.save_inventory()
+        now = self.now().timestamp()
+        expires_at = now + (ttl if ttl is not None else self.reservation_ttl)
+        held_parts = {part: quantity for part, quantity in required_parts.items() if part in self.inventory}
+        for part, quantity in held_parts.items():
+            self.reserved[part] = self.reserved.get(part, 0) + quantity
+            self.record_movement('reserve', part, quantity, reservation_id, expires_at)
+        
+        self.reservations[reservation_id] = {'parts': held_parts, 'expires_at': expires_at, 'created_at': now}
+        heapq.heappush(self._expiry_heap, (expires_at, reservation_id))
+        
+        result['reservation_id'] = reservation_id
+        result['expires_at'] = datetime.fromtimestamp(expires_at).isoformat()
+        return result
+    
+    def commit_reservation(self, reservation_id):
+        """Deduct held parts from stock (phase two); False if the hold expired or never existed"""
+        self.expire_reservations()
+        with self.lock:
+            reservation = self.reservations.pop(reservation_id, None)
+            if reservation is None:
+                return False
+            
+            used_at = self.now().isoformat()
+            for part, quantity in reservation['parts'].items():
+                self.reserved[part] -= quantity
+                self.inventory[part]['quantity'] -= quantity
+                self.inventory[part]['last_used'] = used_at
+                self.record_movement('deduct', part, quantity, reservation_id)
+                self.forecaster.record_usage(part, quantity, self.now().timestamp())
+                self.update_stock_state(part)
+            self.mark_dirty()
+            return True
+    
+    def release_reservation(self, reservation_id):
+        """Return held parts to available stock without using them"""
+        with self.lock:
+            reservation = self.reservations.pop(reservation_id, None)
+            if reservation is None:
+                return False
+            
+            for part, quantity in reservation['parts'].items():
+                self.reserved[part] -= quantity
+                self.record_movement('release', part, quantity, reservation_id)
+            return True
+    
+    def get_reservation_summary(self):
+        """Reserved and available counts for every part"""
+        with self.lock:
+            return {
+                part: {
+                    'quantity': data['quantity'],
+                    'reserved': self.reserved.get(part, 0),
+                    'available': self.get_available_quantity(part)
+                }
+                for part, data in self.inventory.items()
+            }
+    
+    def check_and_deduct_parts(self, selected_tasks):
+        """Reserve and immediately commit the parts for a service
+        
+        The reservation ID tags the ledger records of the deduction; the stock levels
+        themselves are read with get_inventory_data().
+        """
+        with self.lock:
+            reservation = self.reserve_parts_for_tasks(selected_tasks)
+            if reservation['available']:
+                self.commit_reservation(reservation['reservation_id'])
         
         return {
-            'required_parts': required_parts,
-            'available': parts_availability,
-            'unavailable_parts': unavailable_parts,
-            'inventory_status': self.get_inventory_data()
+            'reservation_id': reservation['reservation_id'],
+            'required_parts': reservation['required_parts'],
+            'available': reservation['available'],
+            'unavailable_parts': reservation['unavailable_parts']
         }
     
     def check_low_stock(self):
+        """List the parts currently in the low-stock alert state"""
         low_stock = []
-        for part_id, part_data in self.inventory.items():
-            if part_data['quantity'] <= part_data['min_stock']:
+        with self.lock:
+            for part_id in self.low_stock_parts:
+                part_data = self.inventory[part_id]
                 low_stock.append({
                     'id': part_id,
                     'name': part_data['name'],
@@ -97,19 +411,55 @@ class InventoryManager:
         return low_stock
     
     def restock_part(self, part_name, quantity):
-        if part_name in self.inventory:
-            self.inventory[part_name]['quantity'] += quantity
-            self.inventory[part_name]['last_restocked'] = datetime.now().isoformat()
-            self.save_inventory()
-            return True
-        return False
+        with self.lock:
+            if part_name in self.inventory:
+                self.inventory[part_name]['quantity'] += quantity
+                self.inventory[part_name]['last_restocked'] = self.now().isoformat()
+                self.record_movement('restock', part_name, quantity)
+                self.update_stock_state(part_name)
+                self.mark_dirty()
+                return True
+            return False
+    
+    def forecast_parts(self, queued_tasks=(), horizons=(7, 14, 30), lead_time_days=2.0, cover_days=14.0):
+        """Usage rates, stock-out projections and reorder suggestions for every part.
+        
+        queued_tasks lists the selected tasks of each queued service; their parts count as
+        already promised stock.
+        """
+        matrix = self.requirement_matrix
+        with self.lock:
+            on_hand = matrix.stock_vector({part: info['quantity'] for part, info in self.inventory.items()})
+            min_stock = matrix.stock_vector({part: info.get('min_stock', 0) for part, info in self.inventory.items()})
+        
+        if queued_tasks:
+            # Stored queue items predate booking validation; tasks no part list knows need nothing
+            queued_tasks = [[task for task in tasks if isinstance(task, str) and task in matrix.task_index]
+                            if isinstance(tasks, list) else [] for tasks in queued_tasks]
+            pipeline_demand = (matrix.selection_matrix(queued_tasks) @ matrix.matrix).sum(axis=0)
+        else:
+            pipeline_demand = matrix.stock_vector({})
+        
+        forecast = self.forecaster.forecast(on_hand, min_stock, pipeline_demand, self.now().timestamp(),
+                                            horizons, lead_time_days, cover_days)
+        return {part: forecast[part] for part in self.inventory}
+    
+    def suggest_restock_quantity(self, part_name, queued_tasks=(), default=5):
+        """Forecast reorder quantity for one part, or the default when usage does not call for more"""
+        if part_name not in self.inventory:
+            return default
+        suggested = self.forecast_parts(queued_tasks)[part_name]['suggested_reorder_quantity']
+        return suggested or default
+    
+    def get_version(self):
+        return self.version
     
     def get_inventory_data(self):
         return self.inventory
     
     def get_inventory_summary(self):
         total_items = len(self.inventory)
-        low_stock_count = len(self.check_low_stock())
+        low_stock_count = len(self.low_stock_parts)
         return {
             'total_items': total_items,
             'low_stock_count': low_stock_count
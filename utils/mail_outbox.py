@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import threading
+import time
+
+from flask_mail import Message
+
+
+class MailOutbox:
+    """Persistent queue of outgoing emails, delivered by a background worker.
+
+    Callers only insert a row, so request latency never depends on the mail server. The
+    worker sends due messages in batches over one SMTP connection, retries failures with
+    exponential backoff and moves messages that keep failing to a dead-letter table.
+    """
+
+    def __init__(self, mail, app, db_file='data/outbox.db', batch_size=20, max_attempts=5,
+                 base_delay=30.0, max_delay=3600.0, poll_interval=5.0, clock=time.time):
+        self.mail = mail
+        self.app = app
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay  # Seconds before the first retry, doubled on each further failure
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.sent_count = 0
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT,
+                message TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_attempt_at);
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id INTEGER PRIMARY KEY,
+                kind TEXT,
+                message TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                failed_at REAL NOT NULL,
+                last_error TEXT
+            );
+        """)
+        self.db.commit()
+
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def enqueue(self, subject, recipients, body, sender=None, html=None, kind=None):
+        """Store one email for delivery and return its outbox ID"""
+        message = {'subject': subject, 'recipients': list(recipients), 'body': body,
+                   'sender': sender, 'html': html}
+        now = self.clock()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO outbox (kind, message, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(message), now, now))
+            self.db.commit()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def retry_delay(self, attempts):
+        return min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+
+    def drain_once(self):
+        """Send one batch of due messages over a single connection"""
+        now = self.clock()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, kind, message, attempts, created_at FROM outbox "
+                "WHERE next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+                (now, self.batch_size)).fetchall()
+        if not rows:
+            return {'sent': 0, 'retried': 0, 'dead': 0}
+
+        sent, failed = [], []
+        try:
+            with self.app.app_context():
+                with self.mail.connect() as connection:
+                    for row in rows:
+                        message = json.loads(row[2])
+                        try:
+                            connection.send(Message(**message))
+                            sent.append(row)
+                        except Exception as e:
+                            failed.append((row, e))
+        except Exception as e:
+            # The server could not be reached, or dropped us; everything not yet sent is retried
+            sent_ids = {row[0] for row in sent}
+            failed_ids = {row[0] for row, _ in failed}
+            failed.extend((row, e) for row in rows if row[0] not in sent_ids and row[0] not in failed_ids)
+
+        retried = dead = 0
+        with self.lock:
+            self.db.executemany("DELETE FROM outbox WHERE id = ?", [(row[0],) for row in sent])
+            for (row_id, kind, message, attempts, created_at), error in failed:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self.db.execute(
+                        "INSERT INTO dead_letters (id, kind, message, attempts, created_at, failed_at, last_error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (row_id, kind, message, attempts, created_at, now, str(error)))
+                    self.db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+                    dead += 1
+                else:
+                    self.db.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (attempts, now + self.retry_delay(attempts), str(error), row_id))
+                    retried += 1
+            self.db.commit()
+            self.sent_count += len(sent)
+
+        if sent:
+            print(f"📧 Sent {len(sent)} queued email(s)")
+        if failed:
+            print(f"⚠️ {len(failed)} email(s) failed: {retried} will be retried, {dead} moved to dead letters")
+        return {'sent': len(sent), 'retried': retried, 'dead': dead}
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                result = self.drain_once()
+            except Exception as e:
+                print(f"❌ Mail outbox worker error: {e}")
+                result = {'sent': 0}
+            # A full batch probably means more is due; otherwise sleep until woken or polled
+            if result['sent'] < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self):
+        """Start the background delivery worker"""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self.run, name='mail-outbox', daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def get_stats(self):
+        with self.lock:
+            pending = self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            retrying = self.db.execute("SELECT COUNT(*) FROM outbox WHERE attempts > 0").fetchone()[0]
+            dead = self.db.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return {'pending': pending, 'retrying': retrying, 'dead_letters': dead, 'sent': self.sent_count}
+
+    def get_dead_letters(self, limit=20):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, kind, message, attempts, failed_at, last_error FROM dead_letters "
+                "ORDER BY failed_at DESC LIMIT ?", (limit,)).fetchall()
+        return [
+            {'id': row[0], 'kind': row[1], 'subject': json.loads(row[2])['subject'], 'attempts': row[3],
+             'failed_at': row[4], 'last_error': row[5]}
+            for row in rows
+        ]
@@ -1,44 +1,110 @@
-from flask_mail import Message
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
+ADMIN_RECIPIENTS = ['admin@volvodealer.com', 'manager@volvodealer.com']  # Replace with actual emails
+
 class Notifier:
-    def __init__(self, mail, app):
-        self.mail = mail
-        self.app = app
-        self.sent_alerts = []
-    
-    def send_low_stock_alert(self, part_name, quantity):
-        """Send email alert for low stock"""
+    def __init__(self, outbox, alert_windows=None, digest_window=0, clock=time.time):
+        self.outbox = outbox  # Emails are queued here and delivered by the outbox's background worker
+        self.clock = clock
+        # Seconds during which a repeat of the same (site, part, alert type) is suppressed
+        self.alert_windows = {'low_stock': 3600, **(alert_windows or {})}
+        self.digest_window = digest_window  # When set, alerts are folded into one email per window
+        self.sent_alerts = deque(maxlen=50)  # Alert history, oldest dropped first
+        self.lock = threading.Lock()
+        self._last_sent = {}  # (site, part, alert type) -> time of the last email
+        self._suppressed = {}  # (site, part, alert type) -> repeats not emailed since then
+        self._digest = {}  # (site, part, alert type) -> pending digest entry
+        self._digest_timer = None
+
+    def should_send(self, key, now):
+        """Rate-limit one alert key, counting what is suppressed"""
+        last_sent = self._last_sent.get(key)
+        if last_sent is not None and now - last_sent < self.alert_windows.get(key[-1], 0):
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        self._last_sent[key] = now
+        return True
+
+    def send_low_stock_alert(self, part_name, quantity, site_id=None):
+        """Queue email alert for low stock, subject to rate limiting and digest mode"""
+        now = self.clock()
+        key = (site_id, part_name, 'low_stock')  # Each site's stock is alerted on separately
+        label = f"{part_name} at {site_id}" if site_id else part_name
+        alert_record = {
+            'part_name': part_name,
+            'site_id': site_id,
+            'quantity': quantity,
+            'timestamp': datetime.fromtimestamp(now).isoformat(),
+            'type': 'low_stock'
+        }
+        with self.lock:
+            if self.digest_window:
+                entry = self._digest.setdefault(key, {'part_name': part_name, 'site_id': site_id,
+                                                      'type': 'low_stock', 'first_seen': alert_record['timestamp'], 'count': 0})
+                entry['quantity'] = quantity
+                entry['last_seen'] = alert_record['timestamp']
+                entry['count'] += 1
+                if self._digest_timer is None:
+                    self._digest_timer = threading.Timer(self.digest_window, self.flush_digest)
+                    self._digest_timer.daemon = True
+                    self._digest_timer.start()
+                alert_record['status'] = 'digest'
+                self.sent_alerts.append(alert_record)
+                print(f"📧 Low stock alert for {label} added to the next digest")
+                return True
+
+            if not self.should_send(key, now):
+                alert_record['status'] = 'suppressed'
+                self.sent_alerts.append(alert_record)
+                print(f"🔕 Low stock alert for {label} suppressed (already alerted recently)")
+                return True
+            repeats = self._suppressed.pop(key, 0)
+
         try:
-            with self.app.app_context():
-                msg = Message(
-                    subject=f"⚠️ Low Stock Alert for {part_name}",
-                    recipients=['admin@volvodealer.com', 'manager@volvodealer.com'],  # Replace with actual emails
-                    sender='vsis@volvodealer.com',
-                    body=f"""Dear Volvo Service Team,
+            outbox_id = self.queue_low_stock_email(part_name, quantity, repeats, site_id)
+            alert_record.update({'status': 'sent', 'outbox_id': outbox_id, 'repeats_suppressed': repeats})
+            with self.lock:
+                self.sent_alerts.append(alert_record)
+            print(f"📧 Low stock alert queued for {label} (Quantity: {quantity})")
+            return True
+
+        except Exception as e:
+            print(f"❌ Failed to queue email alert: {e}")
+            return False
+
+    def queue_low_stock_email(self, part_name, quantity, repeats=0, site_id=None):
+        label = f"{part_name} at {site_id}" if site_id else part_name
+        site_line = f"Site: {site_id}\n" if site_id else ''
+        site_row = f"<p><strong>Site:</strong> {site_id}</p>" if site_id else ''
+        repeat_note = ''
+        if repeats:
+            repeat_note = f"\n{repeats} further alert(s) for this part were suppressed since the last email.\n"
+        body = f"""Dear Volvo Service Team,
 
 CRITICAL INVENTORY ALERT
 
-Part Name: {part_name}
+{site_line}Part Name: {part_name}
 Current Quantity: {quantity}
 Alert Level: CRITICAL
 
-The inventory for {part_name} is critically low. Please restock immediately to ensure uninterrupted service operations.
+The inventory for {label} is critically low. Please restock immediately to ensure uninterrupted service operations.
 
 Recommended Action:
 1. Order new stock immediately
 2. Check with suppliers for quick delivery
 3. Update inventory once restocked
-
+{repeat_note}
 This is an automated alert from the Volvo Service Intelligence System.
 
 Best regards,
 Volvo Service Intelligence System (VSIS)
                 """
-                )
-                
-                # Add HTML version
-                msg.html = f"""
+
+        # Add HTML version
+        html = f"""
                 <!DOCTYPE html>
                 <html>
                 <head>
@@ -52,6 +118,7 @@ Volvo Service Intelligence System (VSIS)
                 <body>
                     <div class="alert">
                         <h2 class="critical">⚠️ Low Stock Alert</h2>
+                        {site_row}
                         <p><strong>Part Name:</strong> {part_name}</p>
                         <p><strong>Current Quantity:</strong> {quantity}</p>
                         <p><strong>Status:</strong> <span class="critical">CRITICAL</span></p>
@@ -63,40 +130,75 @@ Volvo Service Intelligence System (VSIS)
                 </body>
                 </html>
                 """
-                
-                # In production, uncomment the line below to actually send emails
-                # self.mail.send(msg)
-                
-                # Store alert record
-                alert_record = {
-                    'part_name': part_name,
-                    'quantity': quantity,
-                    'timestamp': datetime.now().isoformat(),
-                    'type': 'low_stock',
-                    'sent': True  # In demo, mark as sent but don't actually send
-                }
-                self.sent_alerts.append(alert_record)
-                
-                # Keep only last 50 alerts
-                if len(self.sent_alerts) > 50:
-                    self.sent_alerts = self.sent_alerts[-50:]
-                
-                print(f"📧 Low stock alert prepared for {part_name} (Quantity: {quantity})")
-                return True
-                
+
+        # Delivery happens on the outbox worker, never on the request thread
+        return self.outbox.enqueue(
+            subject=f"⚠️ Low Stock Alert for {label}",
+            recipients=ADMIN_RECIPIENTS,
+            sender='vsis@volvodealer.com',
+            body=body,
+            html=html,
+            kind='low_stock'
+        )
+
+    def flush_digest(self):
+        """Send every alert collected during the digest window as one email"""
+        with self.lock:
+            if self._digest_timer is not None:
+                self._digest_timer.cancel()  # No-op when the timer itself is flushing
+                self._digest_timer = None
+            entries = list(self._digest.values())
+            self._digest = {}
+        if not entries:
+            return None
+
+        lines = [
+            f"- {entry['part_name']}{' (' + entry['site_id'] + ')' if entry['site_id'] else ''}: {entry['quantity']} left "
+            f"({entry['count']} alert(s) between {entry['first_seen'][11:19]} and {entry['last_seen'][11:19]})"
+            for entry in entries
+        ]
+        rows = ''.join(
+            f"<tr><td>{entry['site_id'] or ''}</td><td>{entry['part_name']}</td><td>{entry['quantity']}</td><td>{entry['count']}</td></tr>"
+            for entry in entries
+        )
+        try:
+            outbox_id = self.outbox.enqueue(
+                subject=f"⚠️ Low Stock Digest - {len(entries)} part(s) need restocking",
+                recipients=ADMIN_RECIPIENTS,
+                sender='vsis@volvodealer.com',
+                kind='low_stock_digest',
+                body="Dear Volvo Service Team,\n\nThe following parts reported low stock:\n\n"
+                     + "\n".join(lines)
+                     + "\n\nThis is an automated digest from the Volvo Service Intelligence System.\n",
+                html=f"""
+                <h2>⚠️ Low Stock Digest</h2>
+                <table border="1" cellpadding="6" style="border-collapse: collapse; font-family: Arial, sans-serif;">
+                    <tr><th>Site</th><th>Part</th><th>Current Quantity</th><th>Alerts</th></tr>
+                    {rows}
+                </table>
+                <p><small>Generated on: {datetime.fromtimestamp(self.clock()).strftime('%Y-%m-%d %H:%M:%S')}</small></p>
+                """
+            )
+            print(f"📧 Low stock digest queued for {len(entries)} part(s)")
+            return outbox_id
         except Exception as e:
-            print(f"❌ Failed to send email alert: {e}")
-            return False
-    
+            print(f"❌ Failed to queue low stock digest: {e}")
+            return None
+
+    def close(self):
+        """Hand the pending digest to the outbox, which keeps it across a restart"""
+        if self.flush_digest() is not None:
+            print("📧 Pending low stock digest queued before shutdown")
+
     def send_service_completion_alert(self, service_data):
-        """Send email notification when service is completed"""
+        """Queue email notification when service is completed"""
         try:
-            with self.app.app_context():
-                msg = Message(
-                    subject=f"✅ Service Completed - {service_data['service_id']}",
-                    recipients=['customer@example.com'],  # Would be actual customer email
-                    sender='vsis@volvodealer.com',
-                    body=f"""Dear Customer,
+            self.outbox.enqueue(
+                subject=f"✅ Service Completed - {service_data['service_id']}",
+                recipients=['customer@example.com'],  # Would be actual customer email
+                sender='vsis@volvodealer.com',
+                kind='service_completion',
+                body=f"""Dear Customer,
 
 Your Volvo service has been completed successfully!
 
@@ -111,18 +213,16 @@ Your vehicle is ready for pickup. Thank you for choosing Volvo Service!
 Best regards,
 Volvo Service Center
                 """
-                )
-                
-                # In production, uncomment below
-                # self.mail.send(msg)
-                
-                print(f"📧 Service completion alert prepared for {service_data['service_id']}")
-                return True
-                
+            )
+
+            print(f"📧 Service completion alert queued for {service_data['service_id']}")
+            return True
+
         except Exception as e:
-            print(f"❌ Failed to send completion alert: {e}")
+            print(f"❌ Failed to queue completion alert: {e}")
             return False
-    
+
     def get_recent_alerts(self, limit=10):
         """Get recent email alerts"""
-        return self.sent_alerts[-limit:] if self.sent_alerts else []
+        with self.lock:
+            return list(self.sent_alerts)[-limit:]
@@ -0,0 +1,102 @@
+import math
+from datetime import datetime
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+REORDER_CAP_MULTIPLE = 10  # No suggestion exceeds this many times a part's min_stock (units when it has none)
+
+
+class PartsForecaster:
+    """Exponentially weighted usage rates for every part, updated one deduction at a time.
+
+    Rates are kept as one vector in the requirement matrix's part order, so a forecast for
+    all parts over several horizons is a handful of array operations. Each deduction decays
+    the whole vector to its timestamp and adds its units, so new consumption never requires
+    a pass over older history.
+    """
+
+    def __init__(self, part_ids, half_life_days=7.0):
+        self.part_ids = list(part_ids)
+        self.part_index = {part: i for i, part in enumerate(self.part_ids)}
+        self.tau = half_life_days * SECONDS_PER_DAY / math.log(2)  # Decay time constant in seconds
+        # Shorter histories are left uncorrected: dividing by a tiny observed fraction of the
+        # window would turn a single deduction into an enormous daily rate
+        self.min_correction_span = min(SECONDS_PER_DAY, self.tau)
+        self.weighted_usage = np.zeros(len(self.part_ids))  # Decayed units, divided by tau gives units/second
+        self.last_update = None
+        self.first_usage = None
+
+    def record_usage(self, part, quantity, timestamp):
+        """Fold one deduction (epoch seconds) into the usage rates"""
+        index = self.part_index.get(part)
+        if index is None:
+            return
+        if self.last_update is None:
+            self.last_update = self.first_usage = timestamp
+
+        if timestamp >= self.last_update:
+            self.weighted_usage *= math.exp(-(timestamp - self.last_update) / self.tau)
+            self.last_update = timestamp
+            self.weighted_usage[index] += quantity
+        else:
+            # Late arrivals count with the weight they would have had by now
+            self.weighted_usage[index] += quantity * math.exp(-(self.last_update - timestamp) / self.tau)
+        self.first_usage = min(self.first_usage, timestamp)
+
+    def usage_rates(self, now):
+        """Units per day for every part as of now (epoch seconds)"""
+        if self.last_update is None:
+            return np.zeros(len(self.part_ids))
+        rates = self.weighted_usage * math.exp(-max(0.0, now - self.last_update) / self.tau) / self.tau
+        # Correct the start-up bias while history is shorter than the averaging window
+        observed = max(now, self.last_update) - self.first_usage
+        if observed >= self.min_correction_span:
+            rates /= -math.expm1(-observed / self.tau)
+        return rates * SECONDS_PER_DAY
+
+    def forecast(self, on_hand, min_stock, pipeline_demand, now, horizons=(7, 14, 30),
+                 lead_time_days=2.0, cover_days=14.0):
+        """Project stock-outs and reorder quantities for all parts.
+
+        on_hand, min_stock and pipeline_demand (units already promised to queued services)
+        are vectors in part order. A part should be reordered when its free stock drops
+        below the usage expected over the supplier lead time plus min_stock; the suggestion
+        tops it up to cover_days of usage beyond the lead time.
+        """
+        on_hand = np.asarray(on_hand, dtype=float)
+        min_stock = np.asarray(min_stock, dtype=float)
+        pipeline_demand = np.asarray(pipeline_demand, dtype=float)
+        rates = self.usage_rates(now)
+
+        free_stock = on_hand - pipeline_demand
+        with np.errstate(divide='ignore', invalid='ignore'):
+            days_left = np.where(rates > 0, np.maximum(free_stock, 0) / rates, np.inf)
+        days_left = np.where(free_stock <= 0, 0.0, days_left)
+
+        horizon_days = np.asarray(horizons, dtype=float)
+        projected = free_stock[:, None] - rates[:, None] * horizon_days[None, :]
+
+        reorder_point = rates * lead_time_days + min_stock
+        order_up_to = rates * (lead_time_days + cover_days) + min_stock
+        needs_reorder = free_stock <= reorder_point
+        suggested = np.where(needs_reorder, np.ceil(np.maximum(order_up_to - free_stock, 0)), 0)
+        suggested = np.minimum(suggested, np.maximum(min_stock, 1) * REORDER_CAP_MULTIPLE)
+
+        parts = {}
+        for i, part in enumerate(self.part_ids):
+            stock_out = None
+            if np.isfinite(days_left[i]):
+                stock_out = datetime.fromtimestamp(now + days_left[i] * SECONDS_PER_DAY).isoformat()
+            parts[part] = {
+                'usage_per_day': round(float(rates[i]), 3),
+                'on_hand': int(on_hand[i]),
+                'pipeline_demand': int(pipeline_demand[i]),
+                'days_until_stock_out': round(float(days_left[i]), 1) if np.isfinite(days_left[i]) else None,
+                'stock_out_at': stock_out,
+                'projected_stock': {f"{int(h)}d": round(float(projected[i, j]), 1) for j, h in enumerate(horizons)},
+                'reorder_point': round(float(reorder_point[i]), 1),
+                'needs_reorder': bool(needs_reorder[i]),
+                'suggested_reorder_quantity': int(suggested[i])
+            }
+        return parts
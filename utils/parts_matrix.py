@@ -0,0 +1,125 @@
+import numpy as np
+
+# Parts required for each task - the single source used by app.py and InventoryManager.
+# Brake pad jobs also use brake fluid, as the inventory has always deducted.
+TASK_PARTS = {
+    'engine_oil': ['engine_oil', 'oil_filter'],
+    'air_filter': ['air_filter'],
+    'spark_plugs': ['spark_plugs'],
+    'brake_pads': ['brake_pads', 'brake_fluid'],
+    'brake_fluid': ['brake_fluid'],
+    'wheel_alignment': [],  # No parts needed
+    'tire_rotation': [],    # No parts needed
+    'ac_service': ['ac_gas', 'ac_cleaner'],
+    'ac_filter': ['ac_filter']
+}
+
+
+def validate_bookings(bookings, task_ids):
+    """Raise ValueError unless every booking is a list of known task IDs, a dict holding one
+    under 'selected_tasks' (or a bitmask under 'bitmask'), or a bitmask over task_ids"""
+    known = set(task_ids)
+    mask_limit = 1 << len(task_ids)
+    for i, booking in enumerate(bookings):
+        if isinstance(booking, dict):
+            booking = booking.get('bitmask', booking.get('selected_tasks', []))
+        if isinstance(booking, int) and not isinstance(booking, bool):
+            if not 0 <= booking < mask_limit:
+                raise ValueError(f"booking {i}: bitmask must be between 0 and {mask_limit - 1}")
+        elif not isinstance(booking, list):
+            raise ValueError(f"booking {i}: expected a list of task IDs or a bitmask")
+        else:
+            unknown = [task for task in booking if not isinstance(task, str) or task not in known]
+            if unknown:
+                raise ValueError(f"booking {i}: unknown task(s) {unknown}")
+
+
+class PartsRequirementMatrix:
+    """Task x part requirement matrix compiled once, for per-booking lookups and bulk capacity checks"""
+
+    def __init__(self, task_parts=TASK_PARTS, part_ids=None):
+        self.task_ids = list(task_parts)
+        self.task_index = {task: i for i, task in enumerate(self.task_ids)}
+
+        # Keep the caller's part order (the inventory's) and append any part only tasks mention
+        self.part_ids = list(part_ids or [])
+        for parts in task_parts.values():
+            for part in parts:
+                if part not in self.part_ids:
+                    self.part_ids.append(part)
+        self.part_index = {part: i for i, part in enumerate(self.part_ids)}
+
+        self.matrix = np.zeros((len(self.task_ids), len(self.part_ids)), dtype=np.int64)
+        self.task_requirements = {}
+        for task, parts in task_parts.items():
+            requirements = {}
+            for part in parts:
+                self.matrix[self.task_index[task], self.part_index[part]] += 1
+                requirements[part] = requirements.get(part, 0) + 1
+            self.task_requirements[task] = requirements
+
+    def required_parts(self, selected_tasks):
+        """Count the parts needed for one booking's tasks (unknown tasks need nothing)"""
+        required_parts = {}
+        for task in selected_tasks:
+            for part, quantity in self.task_requirements.get(task, {}).items():
+                required_parts[part] = required_parts.get(part, 0) + quantity
+        return required_parts
+
+    def selection_matrix(self, bookings):
+        """Encode bookings as an N x T task-count matrix.
+
+        Each booking is a list of task IDs, a {'selected_tasks': [...]} dict, or an integer
+        bitmask where bit i selects self.task_ids[i]. Anything else raises ValueError.
+        """
+        validate_bookings(bookings, self.task_ids)
+        task_count = len(self.task_ids)
+        masks = []
+        task_lists = []
+        for booking in bookings:
+            if isinstance(booking, dict):
+                booking = booking.get('bitmask', booking.get('selected_tasks', []))
+            if isinstance(booking, int):
+                masks.append(booking)
+                task_lists.append(None)
+            else:
+                masks.append(0)
+                task_lists.append(booking)
+
+        # Bitmasks unpack into rows in one vectorized step
+        bits = (np.asarray(masks, dtype=np.int64)[:, None] >> np.arange(task_count, dtype=np.int64)) & 1
+        selection = bits.reshape(len(bookings), task_count)
+
+        for row, tasks in enumerate(task_lists):
+            for task in tasks or []:
+                selection[row, self.task_index[task]] += 1
+        return selection
+
+    def stock_vector(self, quantities):
+        """Stock per part in matrix order from a {part: quantity} dict"""
+        return np.array([quantities.get(part, 0) for part in self.part_ids], dtype=np.int64)
+
+    def plan_capacity(self, bookings, quantities):
+        """Check how many prospective bookings current stock can fulfil, and the shortfall"""
+        stock = self.stock_vector(quantities)
+        if not bookings:
+            demand = np.zeros((0, len(self.part_ids)), dtype=np.int64)
+        else:
+            demand = self.selection_matrix(bookings) @ self.matrix
+
+        total_demand = demand.sum(axis=0)
+        shortfall = np.maximum(total_demand - stock, 0)
+        fulfillable_alone = (demand <= stock).all(axis=1)
+
+        # Serving bookings first-come, first-served stops at the first one stock cannot cover
+        within_stock = (np.cumsum(demand, axis=0) <= stock).all(axis=1)
+        fulfillable_in_order = int(np.argmin(within_stock)) if not within_stock.all() else len(bookings)
+
+        return {
+            'bookings': len(bookings),
+            'all_fulfillable': bool(not shortfall.any()),
+            'fulfillable_in_order': fulfillable_in_order,
+            'fulfillable_alone': fulfillable_alone.tolist(),
+            'total_demand': {part: int(total_demand[i]) for i, part in enumerate(self.part_ids) if total_demand[i]},
+            'shortfall': {part: int(shortfall[i]) for i, part in enumerate(self.part_ids) if shortfall[i]}
+        }
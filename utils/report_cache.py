@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class ReportCache:
+    """PDF reports stored under a hash of the service record they were rendered from.
+
+    A record that has not changed maps to the same file, so it is rendered once and its
+    key doubles as the HTTP ETag. Files are evicted least-recently-used first whenever
+    the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir='reports/cache', max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.writable = os.access(self.cache_dir, os.W_OK)
+        except OSError:
+            self.writable = False
+        if not self.writable:
+            # Read-only filesystems still serve reports, rendered in memory on every request
+            print(f"⚠️ Report cache {self.cache_dir} is not writable; caching disabled")
+
+        # Rebuild the LRU order from access times left by a previous run
+        self.entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self.total_bytes = 0
+        existing = []
+        for name in (os.listdir(self.cache_dir) if os.path.isdir(self.cache_dir) else []):
+            if name.endswith('.pdf'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                existing.append((stat.st_atime, name[:-4], stat.st_size))
+        for _, key, size in sorted(existing):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def content_key(service_data):
+        """Stable hash of a service record"""
+        payload = json.dumps(service_data, sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def get(self, key):
+        """Path of a cached report, marking it recently used; None on a miss"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        path = self.path_for(key)
+        try:
+            os.utime(path)  # Persist the LRU order across restarts
+        except FileNotFoundError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+            return None
+        return path
+
+    def tmp_path_for(self, key):
+        """Scratch path a renderer writes to before the report is added under its key"""
+        return f"{self.path_for(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def put(self, key, render):
+        """Render a report into the cache with render(path) and return its final path"""
+        tmp_path = self.tmp_path_for(key)
+        render(tmp_path)
+        return self.add(key, tmp_path)
+
+    def add(self, key, tmp_path):
+        """Move a finished render into the cache and return its final path"""
+        path = self.path_for(key)
+        os.replace(tmp_path, path)  # Readers never see a half-written report
+
+        size = os.path.getsize(path)
+        with self.lock:
+            self.total_bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.evict()
+        return path
+
+    def get_or_render(self, service_data, render):
+        """Return (key, path) for a service record, rendering it only on a cache miss"""
+        key = self.content_key(service_data)
+        return key, self.get(key) or self.put(key, render)
+
+    def get_bytes_or_render(self, service_data, render_bytes):
+        """Return (key, PDF bytes), rendering in memory on a miss and caching the result when possible"""
+        key = self.content_key(service_data)
+        path = self.get(key)
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    return key, f.read()
+            except FileNotFoundError:
+                pass  # Evicted between lookup and read
+
+        data = render_bytes()
+        if self.writable:
+            def write(tmp_path):
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+            try:
+                self.put(key, write)
+            except OSError as e:
+                print(f"⚠️ Could not cache report {key}: {e}")
+        return key, data
+
+    def evict(self):
+        # Always keep the newest report, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'reports': len(self.entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'writable': self.writable
+            }
@@ -0,0 +1,124 @@
+import tempfile
+import zipfile
+from datetime import datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, SimpleDocTemplate
+
+CHUNK_SIZE = 64 * 1024
+
+
+def service_date(service):
+    """When a service finished, or when it was booked if it has not"""
+    return service.get('completed_at') or service.get('timestamp') or ''
+
+
+def filter_services(services, date_from=None, date_to=None, worker=None, car_model=None):
+    """Lazily select service records by date range (inclusive ISO dates), worker and car model"""
+    for service in services:
+        day = service_date(service)[:10]
+        if date_from and day < date_from:
+            continue
+        if date_to and day > date_to:
+            continue
+        if worker:
+            assigned = service.get('worker_assigned', {})
+            if worker not in (assigned.get('worker_id'), assigned.get('worker_name')):
+                continue
+        if car_model and service.get('car_details', {}).get('car_model') != car_model:
+            continue
+        yield service
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_report_zip(services, report_cache, report_generator):
+    """Yield a ZIP of per-service PDFs one entry at a time.
+
+    Each report comes from the report cache (rendered in memory on a miss), so only one
+    entry is buffered no matter how many services match.
+    """
+    sink = _ChunkSink()
+    failures = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for service in services:
+            try:
+                _, data = report_cache.get_bytes_or_render(
+                    service, lambda: report_generator.render_service_report(service))
+                archive.writestr(f"{service['service_id']}_report.pdf", data)
+            except Exception as e:
+                failures.append(f"{service.get('service_id')}: {e}")
+            yield sink.drain()
+        if failures:
+            archive.writestr('errors.txt', "Reports that could not be rendered:\n" + "\n".join(failures) + "\n")
+    yield sink.drain()  # Central directory
+
+
+class _SectionDocTemplate(SimpleDocTemplate):
+    """Document that pulls the next service's flowables only when the current ones run out"""
+
+    def __init__(self, output, sections, **kwargs):
+        super().__init__(output, **kwargs)
+        self.sections = sections
+        self.story = []
+
+    def filterFlowables(self, flowables):
+        # ReportLab's hook before each flowable is handled (of the story, or of its own internal
+        # lists). Keep one more story flowable queued behind the current one, so the build loop
+        # does not stop between sections and keepWithNext can look ahead
+        while flowables is self.story and len(flowables) < 2:
+            section = next(self.sections, None)
+            if section is None:
+                break
+            flowables.extend(section)
+
+
+def stream_report_pdf(services, report_generator):
+    """Yield one PDF with a section per service.
+
+    Sections are laid out one at a time as ReportLab consumes the story, so only one
+    service's flowables are held at once. ReportLab writes the file only when the whole
+    document is built, though, so the first chunk comes after the last page: the document
+    is spooled to a temporary file (to disk past 8 MB) and streamed back from there.
+    """
+    def sections():
+        first = True
+        for service in services:
+            try:
+                story = report_generator.build_service_story(service)
+            except Exception as e:
+                print(f"⚠️ Skipping {service.get('service_id')} in bulk export: {e}")
+                continue
+            yield ([] if first else [PageBreak()]) + story
+            first = False
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+        sections = sections()
+        doc = _SectionDocTemplate(output, sections, pagesize=A4, topMargin=0.5*inch,
+                                  title=f"VSIS service reports ({datetime.now().strftime('%Y-%m-%d')})")
+        doc.story = next(sections, [])
+        doc.build(doc.story)
+        output.seek(0)
+        while True:
+            chunk = output.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,186 @@
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.report_generator import ReportGenerator
+
+
+def render_report(service_data, path):
+    """Render one report in a worker process"""
+    ReportGenerator().generate_service_report(service_data, path)
+    return path
+
+
+def warm_up():
+    return os.getpid()
+
+
+@contextmanager
+def script_main_hidden():
+    """Keep 'spawn' and 'forkserver' workers from re-running a script's top level.
+
+    Started as `python app.py`, each worker would otherwise run app.py again as __mp_main__,
+    with its shards, threads and exit-time saves; rendering needs only this module. Modules
+    run with -m (and launchers like gunicorn) are left alone, as multiprocessing handles them.
+    """
+    main = sys.modules['__main__']
+    path = getattr(main, '__file__', None)
+    if path is None or getattr(main, '__spec__', None) is not None:
+        yield
+        return
+    del main.__file__
+    try:
+        yield
+    finally:
+        main.__file__ = path
+
+
+class ReportJobManager:
+    """Renders reports on a process pool so request threads only enqueue and poll.
+
+    Each render is a job with an ID; requests for a report that is already cached finish
+    immediately, and concurrent requests for the same report share one render.
+    """
+
+    def __init__(self, report_cache, max_workers=None, executor=None, max_jobs=500, start_method='spawn'):
+        self.report_cache = report_cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # 'fork' is only safe before the process starts any threads; see start()
+        self.start_method = start_method
+        self._executor = executor  # Created on the first render unless one is passed in
+        self.max_jobs = max_jobs  # Finished jobs kept for status polling
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()  # job_id -> job
+        self._inflight = {}  # report key -> job_id of the render producing it
+        self._job_ids = itertools.count(1)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context(self.start_method))
+            print(f"🖨️ Report render pool started with {self.max_workers} worker(s) ({self.start_method})")
+        return self._executor
+
+    def start(self):
+        """Launch the worker processes now rather than on the first render.
+        
+        With the 'fork' start method every worker is forked on the first submit, so calling
+        this before any other thread exists keeps them from inheriting held locks.
+        """
+        with script_main_hidden():
+            self.executor.submit(warm_up).result()
+        return self
+
+    def submit(self, service_data):
+        """Queue a render for a service record and return its job"""
+        key = self.report_cache.content_key(service_data)
+        with self.lock:
+            if key in self._inflight:
+                return self.describe(self.jobs[self._inflight[key]])
+
+            job_id = f"RPT_{next(self._job_ids):06d}"
+            job = {
+                'job_id': job_id,
+                'service_id': service_data['service_id'],
+                'report_key': key,
+                'status': 'queued',
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'error': None,
+                'future': None
+            }
+            self.jobs[job_id] = job
+            self.trim_jobs()
+
+            if self.report_cache.get(key):
+                job['status'] = 'done'
+                job['finished_at'] = job['submitted_at']
+                return self.describe(job)
+
+            self._inflight[key] = job_id
+            # Only one render per key is in flight, so the parent's scratch name is unique.
+            # Workers are started on demand, here, so the script main stays hidden around it
+            with script_main_hidden():
+                job['future'] = self.executor.submit(render_report, service_data,
+                                                     self.report_cache.tmp_path_for(key))
+        job['future'].add_done_callback(lambda future: self.finish(job, future))
+        return self.get_job(job_id)
+
+    def finish(self, job, future):
+        try:
+            self.report_cache.add(job['report_key'], future.result())
+            status, error = 'done', None
+        except Exception as e:
+            status, error = 'failed', str(e)
+            print(f"❌ Report render {job['job_id']} failed: {e}")
+        with self.lock:
+            job['status'] = status
+            job['error'] = error
+            job['finished_at'] = datetime.now().isoformat()
+            job['future'] = None
+            self._inflight.pop(job['report_key'], None)
+
+    def trim_jobs(self):
+        # Forget the oldest finished jobs; unfinished ones are always kept
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            if self.jobs[job_id]['status'] in ('done', 'failed'):
+                del self.jobs[job_id]
+                excess -= 1
+
+    def describe(self, job):
+        status = job['status']
+        future = job['future']
+        position = None
+        if future is not None and status == 'queued':
+            if future.running():
+                status = 'rendering'
+            else:
+                # Renders are picked up in submission order
+                position = sum(1 for other in self.jobs.values()
+                               if other['future'] is not None and not other['future'].running()
+                               and other['job_id'] < job['job_id'])
+        return {
+            'job_id': job['job_id'],
+            'service_id': job['service_id'],
+            'status': status,
+            'queue_position': position,
+            'submitted_at': job['submitted_at'],
+            'finished_at': job['finished_at'],
+            'error': job['error']
+        }
+
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self.describe(job) if job else None
+
+    def get_report_path(self, job_id):
+        """(report key, path) of a finished job's report, or None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if not job or job['status'] != 'done':
+            return None
+        path = self.report_cache.get(job['report_key'])
+        return (job['report_key'], path) if path else None
+
+    def get_stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                status = self.describe(job)['status']
+                counts[status] = counts.get(status, 0) + 1
+        return {'workers': self.max_workers, 'jobs': counts}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class ServiceHistory:
+    """Completed service records: every one in SQLite, the newest few also in memory.
+
+    Records are written to disk as they complete, so the in-memory window only has to
+    answer the dashboard's "latest completions" and report lookups for recent services.
+    Older pages are read from the database by cursor, newest first.
+    """
+
+    def __init__(self, db_file='data/service_history.db', hot_size=200):
+        self.hot_size = hot_size
+        self.lock = threading.Lock()
+        self.hot = OrderedDict()  # service_id -> (seq, record), oldest first
+        self.version = 0  # Bumped on every change, so readers can detect changes
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS services (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                service_id TEXT NOT NULL UNIQUE,
+                site_id TEXT NOT NULL,
+                completed_at TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS services_site ON services (site_id, seq);
+        """)
+        self.db.commit()
+        self.load_hot()
+
+    def load_hot(self):
+        rows = self.db.execute(
+            "SELECT seq, service_id, record FROM services ORDER BY seq DESC LIMIT ?", (self.hot_size,)).fetchall()
+        self.hot = OrderedDict((service_id, (seq, json.loads(record))) for seq, service_id, record in reversed(rows))
+
+    def add(self, record):
+        """Store a completed service record and return its history sequence number"""
+        with self.lock:
+            self.hot.pop(record['service_id'], None)
+            self.db.execute("DELETE FROM services WHERE service_id = ?", (record['service_id'],))
+            cursor = self.db.execute(
+                "INSERT INTO services (service_id, site_id, completed_at, record) VALUES (?, ?, ?, ?)",
+                (record['service_id'], record['site_id'], record.get('completed_at'), json.dumps(record)))
+            self.db.commit()
+            self.hot[record['service_id']] = (cursor.lastrowid, record)
+            self.version += 1
+            while len(self.hot) > self.hot_size:
+                self.hot.popitem(last=False)
+            return cursor.lastrowid
+
+    def get_version(self):
+        return self.version
+
+    def get(self, service_id):
+        with self.lock:
+            if service_id in self.hot:
+                return self.hot[service_id][1]
+            row = self.db.execute("SELECT record FROM services WHERE service_id = ?", (service_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def page(self, site_id, cursor=None, limit=10):
+        """One page of a site's completions older than cursor (newest page without one).
+
+        Returns the records oldest first and the cursor of the next older page, or None.
+        """
+        with self.lock:
+            if cursor is None:
+                newest = []
+                for seq, record in reversed(self.hot.values()):
+                    if record['site_id'] == site_id:
+                        newest.append((seq, record))
+                        if len(newest) > limit:
+                            break
+                # A window that is not full holds every record there is
+                if len(newest) > limit or len(self.hot) < self.hot_size:
+                    return self._page(newest, limit)
+            rows = self.db.execute(
+                "SELECT seq, record FROM services WHERE site_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (site_id, cursor if cursor is not None else 2 ** 63 - 1, limit + 1)).fetchall()
+        return self._page([(seq, json.loads(record)) for seq, record in rows], limit)
+
+    @staticmethod
+    def _page(newest, limit):
+        more = len(newest) > limit
+        newest = newest[:limit]
+        return {
+            'services': [record for _, record in reversed(newest)],
+            'next_cursor': newest[-1][0] if more else None
+        }
+
+    def select(self, site_id, date_from=None, date_to=None):
+        """A site's completions in order, optionally between two ISO dates (inclusive)"""
+        query = "SELECT record FROM services WHERE site_id = ?"
+        params = [site_id]
+        if date_from:
+            query += " AND substr(completed_at, 1, 10) >= ?"
+            params.append(date_from)
+        if date_to:
+            query += " AND substr(completed_at, 1, 10) <= ?"
+            params.append(date_to)
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY seq", params).fetchall()
+        return [json.loads(record) for record, in rows]
+
+    def count(self, site_id):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM services WHERE site_id = ?", (site_id,)).fetchone()[0]
+
+    def clear_site(self, site_id):
+        with self.lock:
+            self.db.execute("DELETE FROM services WHERE site_id = ?", (site_id,))
+            self.db.commit()
+            self.version += 1
+            # Refill the window so it is again the newest records that are left
+            self.load_hot()
+
+    def get_stats(self):
+        with self.lock:
+            stored = self.db.execute("SELECT COUNT(*) FROM services").fetchone()[0]
+        return {'in_memory': len(self.hot), 'hot_size': self.hot_size, 'stored': stored}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,166 @@
+import heapq
+import itertools
+import threading
+
+SERVICE_STATUSES = ('queued', 'active', 'completed')
+
+
+class ServiceRegistry:
+    """Every service record keyed by service ID, with indexes for the ways endpoints look them up.
+
+    Indexes map a key to an insertion-ordered dict of service IDs, so adding, removing and
+    moving a service between statuses are constant-time and listings keep their order
+    (completed services in the order they finished).
+    """
+
+    def __init__(self, default_site='main'):
+        self.default_site = default_site
+        self.lock = threading.RLock()
+        self.services = {}  # service_id -> record
+        self.by_site_status = {}  # (site_id, status) -> {service_id: None}
+        self.by_worker = {}  # worker_id -> {service_id: None}
+        self.by_plate = {}  # number plate -> {service_id: None}
+        self.by_model = {}  # car model -> {service_id: None}
+        self.by_specialization = {}  # worker (or, while queued, required) specialization -> {service_id: None}
+        self.seqs = {}  # service_id -> order it was added in, for paging
+        self._next_seq = itertools.count(1)
+        self.version = 0  # Bumped on every change, so readers can detect changes
+
+    @staticmethod
+    def _index_add(index, key, service_id):
+        if key is not None:
+            index.setdefault(key, {})[service_id] = None
+
+    @staticmethod
+    def _index_remove(index, key, service_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.pop(service_id, None)
+            if not ids:
+                del index[key]
+
+    def _keys(self, record):
+        site_id = record.get('site_id', self.default_site)
+        worker = record.get('worker_assigned') or {}
+        car_details = record.get('car_details') or {}
+        specialization = worker.get('specialization') if worker.get('worker_id') else worker.get('required_specialization')
+        return ((self.by_site_status, (site_id, record.get('status'))),
+                (self.by_worker, worker.get('worker_id')),
+                (self.by_plate, car_details.get('number_plate')),
+                (self.by_model, car_details.get('car_model')),
+                (self.by_specialization, specialization))
+
+    def _index(self, record):
+        for index, key in self._keys(record):
+            self._index_add(index, key, record['service_id'])
+
+    def _unindex(self, record):
+        for index, key in self._keys(record):
+            self._index_remove(index, key, record['service_id'])
+
+    def add(self, record):
+        """Register a new service record (replacing any record with the same ID)"""
+        with self.lock:
+            self.remove(record['service_id'])
+            record.setdefault('site_id', self.default_site)
+            self.services[record['service_id']] = record
+            self.seqs[record['service_id']] = next(self._next_seq)
+            self._index(record)
+            self.version += 1
+            return record
+
+    def get_version(self):
+        return self.version
+
+    def get(self, service_id):
+        return self.services.get(service_id)
+
+    def update(self, service_id, **changes):
+        """Apply field changes (status, worker_assigned, ...) and re-index; None if unknown"""
+        with self.lock:
+            record = self.services.get(service_id)
+            if record is None:
+                return None
+            self._unindex(record)
+            record.update(changes)
+            self._index(record)
+            self.version += 1
+            return record
+
+    def remove(self, service_id):
+        with self.lock:
+            record = self.services.pop(service_id, None)
+            if record is not None:
+                self._unindex(record)
+                del self.seqs[service_id]
+                self.version += 1
+            return record
+
+    def find(self, status, site_id=None):
+        """Records with a status at one site, oldest first"""
+        with self.lock:
+            ids = list(self.by_site_status.get((site_id or self.default_site, status), ()))
+            return [self.services[service_id] for service_id in ids]
+
+    def recent(self, status, site_id=None, limit=10):
+        """The newest records with a status at one site, oldest of them first"""
+        with self.lock:
+            ids = self.by_site_status.get((site_id or self.default_site, status), {})
+            newest = []
+            for service_id in reversed(ids):
+                if len(newest) >= limit:
+                    break
+                newest.append(self.services[service_id])
+            return newest[::-1]
+
+    def query(self, site_id=None, statuses=('active', 'queued'), worker_id=None, specialization=None,
+              car_model=None, cursor=None, limit=50):
+        """One page of a site's records matching every given filter, in the order they were added.
+
+        Candidates come from the smallest index among the filters, so a selective filter stays
+        cheap however many services there are. Returns the records and the cursor of the next
+        page, or None.
+        """
+        with self.lock:
+            site_id = site_id or self.default_site
+            by_status = [self.by_site_status.get((site_id, status), {}) for status in statuses]
+            filters = [index.get(key, {}) for index, key in (
+                (self.by_worker, worker_id), (self.by_specialization, specialization), (self.by_model, car_model))
+                if key is not None]
+
+            smallest = min(filters, key=len, default=None)
+            if smallest is None or len(smallest) > sum(len(ids) for ids in by_status):
+                candidates = itertools.chain.from_iterable(by_status)
+            else:
+                candidates = smallest
+            after = cursor or 0
+            matches = (service_id for service_id in candidates
+                       if self.seqs[service_id] > after
+                       and any(service_id in ids for ids in by_status)
+                       and all(service_id in ids for ids in filters))
+            page = heapq.nsmallest(limit + 1, matches, key=self.seqs.__getitem__)
+            more = len(page) > limit
+            page = page[:limit]
+            return {
+                'services': [self.services[service_id] for service_id in page],
+                'next_cursor': self.seqs[page[-1]] if more else None
+            }
+
+    def count(self, status, site_id=None):
+        with self.lock:
+            return len(self.by_site_status.get((site_id or self.default_site, status), ()))
+
+    def for_worker(self, worker_id):
+        with self.lock:
+            return [self.services[service_id] for service_id in self.by_worker.get(worker_id, ())]
+
+    def for_plate(self, number_plate):
+        with self.lock:
+            return [self.services[service_id] for service_id in self.by_plate.get(number_plate, ())]
+
+    def clear_site(self, site_id):
+        """Drop every record of one site"""
+        with self.lock:
+            for status in SERVICE_STATUSES:
+                for service_id in list(self.by_site_status.get((site_id, status), ())):
+                    self.remove(service_id)
@@ -0,0 +1,250 @@
+"""Discrete-event simulator that replays booking streams against the assignment policies.
+
+Run a month of synthetic traffic derived from data/service_data.csv with:
+
+    python -m utils.simulator --days 30 --bookings-per-day 40
+"""
+import argparse
+import contextlib
+import heapq
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.inventory_manager import InventoryManager
+from utils.predictor import ServicePredictor
+from utils.workload_manager import WorkloadManager
+
+# Dataset columns that mark a selected task, mapped to the task IDs used by /predict
+TASK_COLUMNS = {
+    'Engine_Oil_Change': 'engine_oil',
+    'Air_Filter_Replacement': 'air_filter',
+    'Spark_Plugs_Replacement': 'spark_plugs',
+    'Brake_Pads_Replacement': 'brake_pads',
+    'Brake_Fluid_Change': 'brake_fluid',
+    'Wheel_Alignment': 'wheel_alignment',
+    'Tire_Rotation': 'tire_rotation',
+    'AC_Service': 'ac_service',
+    'AC_Filter_Replacement': 'ac_filter'
+}
+
+FEATURE_COLUMNS = ['Car_Model', 'Manufacture_Year', 'Fuel_Type', 'Service_Type', 'Total_KM',
+                   'KM_Since_Last_Service', 'Days_Since_Last_Service']
+
+
+class VirtualClock:
+    """Clock handed to the managers in place of datetime.now"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def advance_to(self, moment):
+        if moment > self.current:
+            self.current = moment
+
+
+def load_arrival_stream(csv_path='data/service_data.csv', days=30, bookings_per_day=40,
+                        start=None, open_hour=8, close_hour=18, seed=42):
+    """Build a synthetic arrival stream by sampling recorded bookings.
+
+    Daily booking counts are Poisson distributed and arrivals are spread uniformly over
+    opening hours. Returns a time-ordered list of (arrival_time, features, selected_tasks).
+    """
+    start = start or datetime(2025, 1, 6)
+    rng = np.random.default_rng(seed)
+    records = pd.read_csv(csv_path)
+
+    arrivals = []
+    for day in range(days):
+        day_start = start + timedelta(days=day, hours=open_hour)
+        count = rng.poisson(bookings_per_day)
+        offsets = np.sort(rng.uniform(0, (close_hour - open_hour) * 3600, count))
+        rows = records.iloc[rng.integers(0, len(records), count)]
+
+        for offset, (_, row) in zip(offsets, rows.iterrows()):
+            features = {column: row[column] for column in FEATURE_COLUMNS}
+            features['Manufacture_Year'] = int(features['Manufacture_Year'])
+            features['Total_KM'] = int(features['Total_KM'])
+            selected_tasks = []
+            for column, task_id in TASK_COLUMNS.items():
+                features[column] = int(row[column])
+                if row[column]:
+                    selected_tasks.append(task_id)
+            arrivals.append((day_start + timedelta(seconds=float(offset)), features, selected_tasks))
+
+    return arrivals
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else 0.0
+
+
+class ServiceSimulator:
+    """Drives WorkloadManager and InventoryManager through a booking stream on a virtual clock"""
+
+    def __init__(self, arrivals, predictor=None, restock_quantity=5, seed=42):
+        self.arrivals = arrivals
+        start = arrivals[0][0].replace(hour=0, minute=0, second=0, microsecond=0) if arrivals else datetime.now()
+        self.clock = VirtualClock(start)
+
+        random.seed(seed)
+        np.random.seed(seed)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            self.workload_manager = WorkloadManager(None, clock=self.clock.now)
+            self.inventory_manager = InventoryManager(None, clock=self.clock.now)
+            self.predictor = predictor or ServicePredictor('volvo_service_model.pkl')
+        self.restock_quantity = restock_quantity
+
+        self.events = []
+        self.sequence = 0
+        self.queued_at = {}  # Queue service ID -> (enqueue time, estimated wait)
+        self.stats = {
+            'bookings': 0,
+            'assigned_immediately': 0,
+            'queued': 0,
+            'completed': 0,
+            'parts_unavailable': 0,
+            'low_stock_alerts': 0,
+            'restocks': 0,
+            'restocked_units': 0
+        }
+        self.queue_waits = []
+        self.estimate_errors = []
+        self.utilization_area = 0.0
+        self.last_sample = start
+        self.last_utilization = 0.0
+
+    def schedule(self, moment, kind, payload):
+        self.sequence += 1
+        heapq.heappush(self.events, (moment, self.sequence, kind, payload))
+
+    def sample_utilization(self):
+        """Integrate capacity utilization over virtual time"""
+        now = self.clock.now()
+        self.utilization_area += self.last_utilization * (now - self.last_sample).total_seconds()
+        self.last_sample = now
+        self.last_utilization = self.workload_manager.get_workload_data()['summary']['total_capacity_utilization']
+
+    def handle_arrival(self, features, selected_tasks):
+        self.stats['bookings'] += 1
+        predicted_time = self.predictor.predict(features)
+        assignment, service_data = self.workload_manager.assign_worker(
+            predicted_time, features['Service_Type'], features['Car_Model'], selected_tasks)
+
+        inventory_status = self.inventory_manager.check_and_deduct_parts(selected_tasks)
+        if not inventory_status['available']:
+            self.stats['parts_unavailable'] += 1
+        self.stats['low_stock_alerts'] += sum(
+            1 for event in self.inventory_manager.pop_stock_events() if event['type'] == 'low_stock')
+
+        if assignment['worker_id']:
+            self.stats['assigned_immediately'] += 1
+            self.schedule(datetime.fromisoformat(assignment['completion_time']), 'complete',
+                          service_data['service_id'])
+        else:
+            self.stats['queued'] += 1
+            self.queued_at[service_data['service_id']] = (self.clock.now(), assignment['estimated_wait_time'])
+
+    def handle_completion(self, service_id):
+        if not self.workload_manager.complete_service(service_id):
+            return
+        self.stats['completed'] += 1
+
+        for promotion in self.workload_manager.last_promoted:
+            queue_id = promotion['original_queue_item']['service_id']
+            enqueued, estimate = self.queued_at.pop(queue_id, (self.clock.now(), 0))
+            waited = (self.clock.now() - enqueued).total_seconds() / 3600
+            self.queue_waits.append(waited)
+            self.estimate_errors.append(abs(waited - estimate))
+            self.schedule(datetime.fromisoformat(promotion['worker_assignment']['completion_time']),
+                          'complete', promotion['service_data']['service_id'])
+
+    def handle_day_start(self):
+        """Restock low parts once a day with the forecast quantity, as the admin would via /restock"""
+        queued_tasks = self.workload_manager.get_queued_tasks()
+        for part in self.inventory_manager.check_low_stock():
+            quantity = self.inventory_manager.suggest_restock_quantity(
+                part['id'], queued_tasks, default=self.restock_quantity)
+            self.inventory_manager.restock_part(part['id'], quantity)
+            self.stats['restocks'] += 1
+            self.stats['restocked_units'] += quantity
+
+    def run(self):
+        """Replay the whole arrival stream and return the simulation report"""
+        for arrival_time, features, selected_tasks in self.arrivals:
+            self.schedule(arrival_time, 'arrival', (features, selected_tasks))
+        if self.arrivals:
+            day = self.clock.now()
+            while day <= self.arrivals[-1][0]:
+                self.schedule(day, 'day_start', None)
+                day += timedelta(days=1)
+
+        wall_start = time.perf_counter()
+        sim_start = self.clock.now()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            while self.events:
+                moment, _, kind, payload = heapq.heappop(self.events)
+                self.clock.advance_to(moment)
+                if kind == 'arrival':
+                    self.handle_arrival(*payload)
+                elif kind == 'complete':
+                    self.handle_completion(payload)
+                else:
+                    self.handle_day_start()
+                self.sample_utilization()
+        wall_seconds = time.perf_counter() - wall_start
+
+        return self.build_report(sim_start, wall_seconds)
+
+    def build_report(self, sim_start, wall_seconds):
+        simulated_hours = (self.clock.now() - sim_start).total_seconds() / 3600
+        simulated_days = simulated_hours / 24 if simulated_hours else 0
+
+        return {
+            **self.stats,
+            'still_queued': len(self.workload_manager.service_queue),
+            'simulated_days': round(simulated_days, 2),
+            'throughput_per_day': round(self.stats['completed'] / simulated_days, 2) if simulated_days else 0,
+            'queue_wait_hours': {
+                'count': len(self.queue_waits),
+                'mean': round(float(np.mean(self.queue_waits)), 2) if self.queue_waits else 0.0,
+                'p50': percentile(self.queue_waits, 50),
+                'p90': percentile(self.queue_waits, 90),
+                'p99': percentile(self.queue_waits, 99),
+                'max': round(max(self.queue_waits), 2) if self.queue_waits else 0.0
+            },
+            'wait_estimate_mae_hours': round(float(np.mean(self.estimate_errors)), 2) if self.estimate_errors else 0.0,
+            'avg_capacity_utilization': round(self.utilization_area / (simulated_hours * 3600), 1) if simulated_hours else 0,
+            'wall_clock_seconds': round(wall_seconds, 3),
+            'simulated_hours_per_second': round(simulated_hours / wall_seconds, 1) if wall_seconds else 0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a booking stream against the workload policies')
+    parser.add_argument('--csv', default='data/service_data.csv')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--bookings-per-day', type=float, default=40)
+    parser.add_argument('--restock-quantity', type=int, default=5,
+                        help='Units restocked when the forecast does not suggest a quantity')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    arrivals = load_arrival_stream(args.csv, args.days, args.bookings_per_day, seed=args.seed)
+    print(f"🚗 Replaying {len(arrivals)} bookings over {args.days} days...")
+    report = ServiceSimulator(arrivals, restock_quantity=args.restock_quantity, seed=args.seed).run()
+
+    print("📊 Simulation report")
+    for key, value in report.items():
+        print(f"   {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
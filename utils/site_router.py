@@ -0,0 +1,198 @@
+import multiprocessing
+import os
+import threading
+import traceback
+
+from utils.inventory_manager import InventoryManager
+from utils.workload_manager import WorkloadManager
+
+DEFAULT_SITE = 'main'
+
+
+class UnknownSiteError(KeyError):
+    """Raised when a request names a site the router does not serve"""
+
+
+class ShardUnavailableError(RuntimeError):
+    """Raised when a site's shard process died while serving (or before) a call"""
+
+
+def site_data_files(site_id, data_dir='data', default_site=DEFAULT_SITE):
+    """Return the (workload_file, inventory_file) pair that holds a site's state"""
+    if site_id == default_site:
+        # The default site keeps using the original single-site files
+        return os.path.join(data_dir, 'workload.json'), os.path.join(data_dir, 'inventory.json')
+
+    site_dir = os.path.join(data_dir, 'sites', site_id)
+    os.makedirs(site_dir, exist_ok=True)
+    return os.path.join(site_dir, 'workload.json'), os.path.join(site_dir, 'inventory.json')
+
+
+class LocalShard:
+    """A site whose managers live in the web process"""
+
+    def __init__(self, site_id, workload_file, inventory_file):
+        self.site_id = site_id
+        self.workload_manager = WorkloadManager(workload_file)
+        self.inventory_manager = InventoryManager(inventory_file)
+
+    def close(self):
+        pass
+
+
+def run_shard_process(conn, site_id, workload_file, inventory_file):
+    """Entry point of a shard worker process: serve manager calls until told to stop"""
+    managers = {
+        'workload': WorkloadManager(workload_file),
+        'inventory': InventoryManager(inventory_file)
+    }
+    print(f"🏭 Shard process for site '{site_id}' ready (pid {os.getpid()})")
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+
+        if request is None:
+            break
+
+        target, method, args, kwargs = request
+        try:
+            result = getattr(managers[target], method)(*args, **kwargs)
+            conn.send(('ok', result))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}\n{traceback.format_exc()}"))
+
+    conn.close()
+
+
+class ShardProxy:
+    """Forwards method calls on a manager to the shard process that owns it"""
+
+    def __init__(self, shard, target):
+        self._shard = shard
+        self._target = target
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            return self._shard.call(self._target, method, args, kwargs)
+        return call
+
+
+class ProcessShard:
+    """A site whose managers live in a dedicated worker process"""
+
+    def __init__(self, site_id, workload_file, inventory_file):
+        self.site_id = site_id
+        self.files = (workload_file, inventory_file)
+        self.lock = threading.Lock()  # One in-flight call per shard, other sites are unaffected
+        self.conn = None
+        self.process = None
+        self.start()
+
+        self.workload_manager = ShardProxy(self, 'workload')
+        self.inventory_manager = ShardProxy(self, 'inventory')
+
+    def start(self):
+        """Start (or restart) the shard process, which loads the site's state from its files"""
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_shard_process,
+            args=(child_conn, self.site_id, *self.files),
+            name=f'vsis-shard-{self.site_id}',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def call(self, target, method, args, kwargs):
+        with self.lock:
+            if self.conn is None:
+                print(f"🔁 Restarting shard process for site '{self.site_id}'")
+                self.start()
+            try:
+                self.conn.send((target, method, args, kwargs))
+                status, result = self.conn.recv()
+            except (EOFError, OSError) as e:
+                # The process is gone; the next call starts a fresh one from the saved state
+                self.conn.close()
+                self.conn = None
+                self.process.join(timeout=5)
+                raise ShardUnavailableError(
+                    f"Shard process for site '{self.site_id}' stopped during {target}.{method} "
+                    f"(exit code {self.process.exitcode}): {type(e).__name__}") from e
+
+        if status == 'error':
+            raise RuntimeError(f"Shard '{self.site_id}' failed in {target}.{method}: {result}")
+        return result
+
+    def close(self):
+        with self.lock:
+            if self.conn is None:
+                return
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+
+
+class RemoteShard:
+    """A site whose managers live in the shared state server (see utils/state_server.py)"""
+
+    def __init__(self, site_id, state_client):
+        self.site_id = site_id
+        self.workload_manager = state_client.proxy('workload', site_id)
+        self.inventory_manager = state_client.proxy('inventory', site_id)
+
+    def close(self):
+        pass
+
+
+class SiteRouter:
+    """Routes requests to the per-site WorkloadManager/InventoryManager shard"""
+
+    def __init__(self, site_ids=None, data_dir='data', default_site=DEFAULT_SITE, use_processes=False,
+                 state_client=None):
+        self.default_site = default_site
+        self.shards = {}
+
+        site_ids = list(site_ids or [default_site])
+        if default_site not in site_ids:
+            site_ids.insert(0, default_site)
+
+        shard_class = ProcessShard if use_processes else LocalShard
+        for site_id in site_ids:
+            if state_client is not None:
+                self.shards[site_id] = RemoteShard(site_id, state_client)
+                continue
+            workload_file, inventory_file = site_data_files(site_id, data_dir, default_site)
+            self.shards[site_id] = shard_class(site_id, workload_file, inventory_file)
+
+        if state_client is not None:
+            mode = 'shared state server'
+        else:
+            mode = 'worker processes' if use_processes else 'in-process'
+        print(f"🏢 Site router ready with {len(self.shards)} site(s) ({mode}): {', '.join(self.shards)}")
+
+    @classmethod
+    def from_env(cls, data_dir='data', state_client=None):
+        """Build a router from VSIS_SITES (comma separated) and VSIS_SHARD_PROCESSES"""
+        site_ids = [s.strip() for s in os.environ.get('VSIS_SITES', DEFAULT_SITE).split(',') if s.strip()]
+        use_processes = os.environ.get('VSIS_SHARD_PROCESSES', '0') == '1'
+        return cls(site_ids, data_dir=data_dir, use_processes=use_processes, state_client=state_client)
+
+    def get(self, site_id=None):
+        """Return the shard for a site, raising UnknownSiteError for unknown sites"""
+        site_id = site_id or self.default_site
+        if site_id not in self.shards:
+            raise UnknownSiteError(site_id)
+        return self.shards[site_id]
+
+    def sites(self):
+        return list(self.shards)
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
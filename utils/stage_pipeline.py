@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from collections import deque
+
+LATENCY_SAMPLES = 1000  # Most recent timings kept per stage for the percentiles
+
+
+class StagePipeline:
+    """Runs the side effects of requests as ordered stages on a background thread.
+
+    A request handler does its critical work, submits a job and responds. The worker takes
+    jobs in submission order and passes each through every stage in turn. A stage that
+    raises is logged and counted, and the job still goes through the stages after it.
+    The queue is bounded: when it is full, submit() waits up to block_timeout for room and
+    then runs the job on the calling thread, so a slow stage slows requests down rather
+    than letting work pile up or get dropped.
+    """
+
+    def __init__(self, stages, max_pending=1000, block_timeout=1.0, clock=time.perf_counter):
+        self.stages = list(stages)  # [(name, fn(job))], run in this order
+        self.block_timeout = block_timeout
+        self.clock = clock
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.timings = {}  # name -> deque of recent seconds
+        self.stats = {'submitted': 0, 'completed': 0, 'ran_inline': 0, 'errors': 0}
+        self.stage_errors = {name: 0 for name, _ in self.stages}
+        self._worker = None
+
+    def submit(self, job):
+        """Queue a job (a dict every stage reads) for the background stages"""
+        with self.lock:
+            self.stats['submitted'] += 1
+        try:
+            self.jobs.put((self.clock(), job), timeout=self.block_timeout)
+        except queue.Full:
+            with self.lock:
+                self.stats['ran_inline'] += 1
+            self.process(self.clock(), job)
+
+    def process(self, submitted_at, job):
+        self.observe('queue_wait', self.clock() - submitted_at)
+        for name, stage in self.stages:
+            started = self.clock()
+            try:
+                stage(job)
+            except Exception as e:
+                with self.lock:
+                    self.stats['errors'] += 1
+                    self.stage_errors[name] += 1
+                print(f"❌ Pipeline stage {name} failed: {e}")
+            self.observe(name, self.clock() - started)
+        with self.lock:
+            self.stats['completed'] += 1
+
+    def observe(self, name, seconds):
+        """Record one timing of a stage (or of any step callers want reported with them)"""
+        with self.lock:
+            self.timings.setdefault(name, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+
+    def run(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                self.jobs.task_done()
+                break
+            try:
+                self.process(*item)
+            finally:
+                self.jobs.task_done()
+
+    def start(self):
+        """Start the background worker and return self"""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self.run, name='stage-pipeline', daemon=True)
+            self._worker.start()
+        return self
+
+    def drain(self):
+        """Wait until every queued job has been through all stages"""
+        self.jobs.join()
+
+    def stop(self):
+        if self._worker is not None:
+            self.jobs.put(None)
+            self._worker.join(timeout=10)
+            self._worker = None
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            timings = {name: sorted(samples) for name, samples in self.timings.items()}
+            stage_errors = dict(self.stage_errors)
+        stats['pending'] = self.jobs.qsize()
+
+        def percentile(samples, fraction):
+            return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 3)
+
+        stats['latency_ms'] = {
+            name: {'count': len(samples), 'p50': percentile(samples, 0.5), 'p99': percentile(samples, 0.99),
+                   'max': round(samples[-1] * 1000, 3), 'errors': stage_errors.get(name, 0)}
+            for name, samples in timings.items() if samples
+        }
+        return stats
@@ -0,0 +1,252 @@
+"""Shared state for running the web app as several worker processes.
+
+One state server process owns every site's WorkloadManager and InventoryManager plus
+the service registry, service history and change feed. Web workers reach them over a
+local socket (VSIS_STATE_SERVER=host:port or a socket path), so any worker can serve
+any request. The server also relays published messages to every subscriber, which
+lets the workers share SocketIO emits without an external message queue.
+
+    VSIS_STATE_SERVER=127.0.0.1:10001 VSIS_STATE_AUTHKEY=<secret> python -m utils.state_server
+
+Messages are pickles, so the server and its workers must share a secret VSIS_STATE_AUTHKEY
+(gunicorn.conf.py generates one), and only the methods in PROXY_METHODS can be called.
+"""
+import os
+import threading
+import traceback
+from datetime import datetime
+from multiprocessing.connection import Client, Listener
+
+import socketio
+
+from utils.change_feed import ChangeFeed
+from utils.service_history import ServiceHistory
+from utils.service_registry import ServiceRegistry
+from utils.site_router import DEFAULT_SITE, SiteRouter
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is a Unix socket path"""
+    host, _, port = address.rpartition(':')
+    return (host, int(port)) if host and port.isdigit() else address
+
+
+# The methods web workers call on each shared object; anything else is refused
+PROXY_METHODS = {
+    'server': {'get_epoch'},
+    'registry': {'add', 'clear_site', 'count', 'find', 'get', 'get_version', 'query', 'remove', 'update'},
+    'history': {'add', 'clear_site', 'get', 'get_version', 'page', 'select'},
+    'feed': {'get_stats', 'snapshot', 'update'},
+    'workload': {
+        'assign_worker', 'attach_booking', 'complete_service', 'flush', 'get_active_services_count',
+        'get_all_active_services', 'get_last_promoted', 'get_queue_info', 'get_queued_tasks',
+        'get_service_queue', 'get_version', 'get_workers', 'get_workload_changes', 'get_workload_data',
+        'reset_all', 'set_defer_saves'
+    },
+    'inventory': {
+        'check_and_deduct_parts', 'check_low_stock', 'commit_reservation', 'forecast_parts',
+        'get_inventory_data', 'get_movement_history', 'get_version', 'load_inventory', 'plan_capacity',
+        'pop_stock_events', 'release_reservation', 'reserve_parts_for_tasks', 'restock_part',
+        'suggest_restock_quantity'
+    }
+}
+
+
+def state_authkey():
+    """The secret shared by the state server and its workers; there is deliberately no default"""
+    key = os.environ.get('VSIS_STATE_AUTHKEY')
+    if not key:
+        raise RuntimeError('VSIS_STATE_AUTHKEY must be set to run or connect to a state server')
+    return key.encode()
+
+
+class StateServer:
+    """Serves method calls on the shared managers, one thread per connected worker thread"""
+
+    def __init__(self, address, authkey, site_ids=None, data_dir='data', default_site=DEFAULT_SITE,
+                 history_db='data/service_history.db', history_hot=200):
+        self.router = SiteRouter(site_ids, data_dir=data_dir, default_site=default_site)
+        # A site's managers take one call at a time, as they do in a shard process
+        self.site_locks = {site_id: threading.Lock() for site_id in self.router.sites()}
+        # These guard themselves
+        self.shared = {
+            'registry': ServiceRegistry(default_site),
+            'history': ServiceHistory(history_db, history_hot),
+            'feed': ChangeFeed()
+        }
+        self.subscribers = []
+        self.publish_lock = threading.Lock()
+        self.listener = Listener(address, authkey=authkey)
+        self.epoch = datetime.now().strftime('%Y%m%d%H%M%S')  # Versions restart with this process
+        self.stats = {'connections': 0, 'calls': 0, 'published': 0}
+
+    def serve_forever(self):
+        print(f"🗄️ State server listening on {self.listener.address} for {len(self.site_locks)} site(s)")
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break  # Listener closed
+            except Exception as e:
+                print(f"⚠️ State server refused a connection: {e}")
+                continue
+            self.stats['connections'] += 1
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            kind = request[0]
+            if kind == 'publish':
+                self.publish(request[1])
+                continue
+            if kind == 'subscribe':
+                with self.publish_lock:
+                    self.subscribers.append(conn)
+                return  # The connection now only receives published messages
+
+            _, target, site_id, method, args, kwargs = request
+            try:
+                reply = ('ok', self.call(target, site_id, method, args, kwargs))
+            except Exception as e:
+                # Includes OSErrors raised by the call, which must not look like a lost connection
+                reply = ('error', f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}\n{traceback.format_exc()}"))  # e.g. unpicklable
+        conn.close()
+
+    def call(self, target, site_id, method, args, kwargs):
+        self.stats['calls'] += 1
+        if method not in PROXY_METHODS.get(target, ()):
+            raise PermissionError(f"{target}.{method} cannot be called through the state server")
+        if target == 'server':
+            return self.epoch
+        if target in self.shared:
+            return getattr(self.shared[target], method)(*args, **kwargs)
+        shard = self.router.get(site_id)
+        manager = shard.workload_manager if target == 'workload' else shard.inventory_manager
+        with self.site_locks[shard.site_id]:
+            return getattr(manager, method)(*args, **kwargs)
+
+    def publish(self, message):
+        """Send a message to every subscriber, dropping the ones that went away"""
+        with self.publish_lock:
+            self.stats['published'] += 1
+            for conn in list(self.subscribers):
+                try:
+                    conn.send(message)
+                except (EOFError, OSError):
+                    self.subscribers.remove(conn)
+
+    def close(self):
+        self.listener.close()
+        self.router.close()
+        self.shared['history'].close()
+
+
+class StateProxy:
+    """Forwards method calls on one shared object to the state server"""
+
+    def __init__(self, client, target, site_id=None):
+        self._client = client
+        self._target = target
+        self._site_id = site_id
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            return self._client.call(self._target, self._site_id, method, args, kwargs)
+        return call
+
+
+class StateClient:
+    """A web worker's connection to the state server, one socket per calling thread"""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+
+    @classmethod
+    def from_env(cls):
+        """A client for VSIS_STATE_SERVER, or None when state stays in this process"""
+        address = os.environ.get('VSIS_STATE_SERVER')
+        return cls(parse_address(address), state_authkey()) if address else None
+
+    def connect(self):
+        return Client(self.address, authkey=self.authkey)
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+        return conn
+
+    def call(self, target, site_id, method, args=(), kwargs=None):
+        conn = self._conn()
+        try:
+            conn.send(('call', target, site_id, method, args, kwargs or {}))
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            self.local.conn = None  # Reconnect on the next call
+            raise
+        if status == 'error':
+            raise RuntimeError(f"State server failed in {target}.{method}: {result}")
+        return result
+
+    def proxy(self, target, site_id=None):
+        return StateProxy(self, target, site_id)
+
+    def publish(self, message):
+        self._conn().send(('publish', message))
+
+    def subscribe(self):
+        """Yield every message published by any worker, this one included"""
+        conn = self.connect()
+        conn.send(('subscribe',))
+        try:
+            while True:
+                yield conn.recv()
+        finally:
+            conn.close()
+
+
+class StateServerManager(socketio.PubSubManager):
+    """SocketIO client manager that shares emits between workers through the state server"""
+
+    name = 'vsis-state'
+
+    def __init__(self, client, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.client = client
+
+    def _publish(self, data):
+        self.client.publish(data)
+
+    def _listen(self):
+        yield from self.client.subscribe()
+
+
+def main():
+    address = parse_address(os.environ.get('VSIS_STATE_SERVER', '127.0.0.1:10001'))
+    site_ids = [s.strip() for s in os.environ.get('VSIS_SITES', DEFAULT_SITE).split(',') if s.strip()]
+    server = StateServer(address, state_authkey(), site_ids,
+                         history_db=os.environ.get('VSIS_HISTORY_DB', 'data/service_history.db'),
+                         history_hot=int(os.environ.get('VSIS_HISTORY_HOT', 200)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
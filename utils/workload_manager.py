@@ -1,33 +1,135 @@
+import atexit
+import heapq
 import json
+import os
+import threading
 from datetime import datetime, timedelta
 import random
 
+# Specialization required for each service type
+SPECIALIZATION_MAP = {
+    'General': 'General Maintenance',
+    'Major': 'Engine Specialist',
+    'Brake': 'Brake Expert',
+    'AC': 'AC Technician'
+}
+
 class WorkloadManager:
-    def __init__(self, workload_file):
-        self.workload_file = workload_file
+    def __init__(self, workload_file, clock=None):
+        self.workload_file = workload_file  # None keeps the workload in memory only
+        self.now = clock or datetime.now  # Swapped for a virtual clock by the simulator
         self.workers = []
         self.active_services = {}
         self.service_queue = []  # Queue for services waiting for workers
+        self.last_promoted = []  # Queue items promoted by the latest process_queue() run
+        self.version = 0  # Bumped on every mutation so readers can detect changes
+        self.defer_saves = False  # When set, save_workload() leaves the write to flush()
+        self._unsaved = False
+        self._snapshot = None  # Cached result of get_workload_data()
+        self._dirty_workers = set()  # Worker IDs whose snapshot entry needs patching
+        # Running aggregates kept in step with assign/complete, keyed by specialization
+        self._spec_completion_sum = {}  # Sum of completion epochs of active jobs not yet overdue
+        self._spec_due_count = {}  # Number of active jobs not yet overdue
+        self._spec_job_count = {}  # Number of active jobs
+        self._due_heap = []  # (completion epoch, service ID, specialization), soonest first
+        self._due_epochs = {}  # Service ID -> completion epoch, for jobs still in the sums
+        self._spec_worker_count = {}  # Number of workers
+        self._queue_backlog = {}  # Queued hours waiting for each required specialization
+        self._queue_counts = {}  # Queued services waiting for each required specialization
+        self.lock = threading.RLock()  # Flushes and snapshot builds also run on background threads
+        self.write_lock = threading.Lock()  # Orders writers of the workload file
         self.load_workload()
     
     def load_workload(self):
-        try:
-            with open(self.workload_file, 'r') as f:
-                data = json.load(f)
-                self.workers = data.get('workers', [])
-                self.active_services = data.get('active_services', {})
-                self.service_queue = data.get('service_queue', [])
+        with self.lock:
+            if self.workload_file is None:
+                self.initialize_default_workers()
+                return
+        
+            try:
+                with open(self.workload_file, 'r') as f:
+                    data = json.load(f)
+                    self.workers = data.get('workers', [])
+                    self.active_services = data.get('active_services', {})
+                    self.service_queue = data.get('service_queue', [])
             
-            # Migrate existing data to include new fields
-            self.migrate_worker_data()
+                # Migrate existing data to include new fields
+                self.migrate_worker_data()
+                self.rebuild_aggregates()
+                self.mark_changed()
             
-            print(f"✅ Workload loaded successfully with {len(self.workers)} workers")
-            print(f"📊 Current active services: {len(self.active_services)}, Queued services: {len(self.service_queue)}")
-        except Exception as e:
-            print(f"⚠️ Could not load workload data: {e}")
-            print("🔄 Initializing with default workers...")
-            self.initialize_default_workers()
-            self.save_workload()
+                print(f"✅ Workload loaded successfully with {len(self.workers)} workers")
+                print(f"📊 Current active services: {len(self.active_services)}, Queued services: {len(self.service_queue)}")
+            except Exception as e:
+                print(f"⚠️ Could not load workload data: {e}")
+                print("🔄 Initializing with default workers...")
+                self.initialize_default_workers()
+                self.save_workload()
+    
+    def rebuild_aggregates(self):
+        """Recompute the running wait-time aggregates from the full workload state"""
+        self._spec_completion_sum = {}
+        self._spec_due_count = {}
+        self._spec_job_count = {}
+        self._due_heap = []
+        self._due_epochs = {}
+        self._spec_worker_count = {}
+        self._queue_backlog = {}
+        self._queue_counts = {}
+        
+        for worker in self.workers:
+            specialization = worker.get('specialization', 'General Maintenance')
+            self._spec_worker_count[specialization] = self._spec_worker_count.get(specialization, 0) + 1
+            for job in worker['current_jobs']:
+                self.track_job(worker, job, 1)
+        
+        for queue_item in self.service_queue:
+            self.track_queue_item(queue_item, 1)
+    
+    def track_job(self, worker, job, sign):
+        """Add (sign=1) or remove (sign=-1) an active job from the running aggregates"""
+        specialization = worker.get('specialization', 'General Maintenance')
+        completion_epoch = datetime.fromisoformat(job['completion_time']).timestamp()
+        self._spec_job_count[specialization] = self._spec_job_count.get(specialization, 0) + sign
+        if sign > 0:
+            if completion_epoch > self.now().timestamp():
+                self._due_epochs[job['service_id']] = completion_epoch
+                heapq.heappush(self._due_heap, (completion_epoch, job['service_id'], specialization))
+                self.add_due_job(specialization, completion_epoch, 1)
+        elif self._due_epochs.pop(job['service_id'], None) is not None:
+            self.add_due_job(specialization, completion_epoch, -1)
+    
+    def add_due_job(self, specialization, completion_epoch, sign):
+        count = self._spec_due_count.get(specialization, 0) + sign
+        self._spec_due_count[specialization] = count
+        # Start an emptied sum afresh so float rounding cannot build up across jobs
+        self._spec_completion_sum[specialization] = (
+            self._spec_completion_sum.get(specialization, 0) + sign * completion_epoch if count else 0)
+    
+    def drop_overdue_jobs(self, now_epoch):
+        """Take jobs past their completion time out of the wait-time sums"""
+        while self._due_heap and self._due_heap[0][0] <= now_epoch:
+            completion_epoch, service_id, specialization = heapq.heappop(self._due_heap)
+            # Entries of completed jobs are left in the heap and skipped here
+            if self._due_epochs.get(service_id) == completion_epoch:
+                del self._due_epochs[service_id]
+                self.add_due_job(specialization, completion_epoch, -1)
+    
+    def track_queue_item(self, queue_item, sign):
+        """Add (sign=1) or remove (sign=-1) a queued service from the per-specialization backlog"""
+        specialization = queue_item.get('required_specialization') or SPECIALIZATION_MAP.get(
+            queue_item['service_type'], 'General Maintenance')
+        self._queue_backlog[specialization] = self._queue_backlog.get(specialization, 0) + sign * queue_item['job_duration']
+        self._queue_counts[specialization] = self._queue_counts.get(specialization, 0) + sign
+    
+    def mark_changed(self, worker=None):
+        """Bump the workload version and invalidate (or patch) the cached snapshot"""
+        self.version += 1
+        if worker is None:
+            self._snapshot = None
+            self._dirty_workers.clear()
+        elif self._snapshot is not None:
+            self._dirty_workers.add(worker['id'])
     
     def migrate_worker_data(self):
         """Migrate existing worker data to include new fields"""
@@ -69,456 +171,667 @@ class WorkloadManager:
     
     def initialize_default_workers(self):
         """Initialize with 20 default workers"""
-        self.workers = []
-        first_names = ['Alex', 'Brian', 'Chris', 'David', 'Eric', 'Frank', 'George', 'Henry', 'Ian', 'John', 
-                      'Kevin', 'Liam', 'Mike', 'Nathan', 'Oscar', 'Paul', 'Quinn', 'Ryan', 'Steve', 'Tom']
-        last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis', 'Garcia', 'Rodriguez', 'Wilson',
-                     'Martinez', 'Anderson', 'Taylor', 'Thomas', 'Moore', 'Jackson', 'Martin', 'Lee', 'Thompson', 'White']
-        
-        for i in range(1, 21):
-            first_name = random.choice(first_names)
-            last_name = random.choice(last_names)
+        with self.lock:
+            self.workers = []
+            first_names = ['Alex', 'Brian', 'Chris', 'David', 'Eric', 'Frank', 'George', 'Henry', 'Ian', 'John', 
+                          'Kevin', 'Liam', 'Mike', 'Nathan', 'Oscar', 'Paul', 'Quinn', 'Ryan', 'Steve', 'Tom']
+            last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis', 'Garcia', 'Rodriguez', 'Wilson',
+                         'Martinez', 'Anderson', 'Taylor', 'Thomas', 'Moore', 'Jackson', 'Martin', 'Lee', 'Thompson', 'White']
+        
+            for i in range(1, 21):
+                first_name = random.choice(first_names)
+                last_name = random.choice(last_names)
             
-            # Assign specializations based on worker ID ranges
-            if i <= 5:
-                specialization = 'Engine Specialist'
-            elif i <= 10:
-                specialization = 'Brake Expert'
-            elif i <= 15:
-                specialization = 'AC Technician'
-            else:
-                specialization = 'General Maintenance'
+                # Assign specializations based on worker ID ranges
+                if i <= 5:
+                    specialization = 'Engine Specialist'
+                elif i <= 10:
+                    specialization = 'Brake Expert'
+                elif i <= 15:
+                    specialization = 'AC Technician'
+                else:
+                    specialization = 'General Maintenance'
             
-            self.workers.append({
-                'id': f'W{i:02d}',
-                'name': f'{first_name} {last_name}',
-                'specialization': specialization,
-                'current_jobs': [],
-                'total_capacity': 8,  # hours per day
-                'current_workload': 0,
-                'max_concurrent_jobs': 3,  # Each worker can handle multiple cars
-                'efficiency': round(random.uniform(0.8, 1.2), 2),
-                'rating': round(random.uniform(4.0, 5.0), 1),
-                'experience_years': random.randint(1, 15),
-                'is_available': True
-            })
-        
-        print(f"✅ Initialized {len(self.workers)} default workers")
+                self.workers.append({
+                    'id': f'W{i:02d}',
+                    'name': f'{first_name} {last_name}',
+                    'specialization': specialization,
+                    'current_jobs': [],
+                    'total_capacity': 8,  # hours per day
+                    'current_workload': 0,
+                    'max_concurrent_jobs': 3,  # Each worker can handle multiple cars
+                    'efficiency': round(random.uniform(0.8, 1.2), 2),
+                    'rating': round(random.uniform(4.0, 5.0), 1),
+                    'experience_years': random.randint(1, 15),
+                    'is_available': True
+                })
+        
+            self.rebuild_aggregates()
+            self.mark_changed()
+            print(f"✅ Initialized {len(self.workers)} default workers")
     
     def save_workload(self):
+        with self.lock:
+            if self.workload_file is None:
+                return
+            if self.defer_saves:
+                self._unsaved = True
+                return
+            self.write_workload()
+    
+    def write_workload(self):
+        """Write the workload file; returns whether it was written"""
         try:
-            data = {
-                'workers': self.workers,
-                'active_services': self.active_services,
-                'service_queue': self.service_queue,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.workload_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self.lock:
+                data = json.dumps({
+                    'workers': self.workers,
+                    'active_services': self.active_services,
+                    'service_queue': self.service_queue,
+                    'last_updated': self.now().isoformat()
+                }, indent=2)
+            # Replace the file in one step so a crash never leaves half a workload behind
+            with self.write_lock:
+                with open(self.workload_file + '.tmp', 'w') as f:
+                    f.write(data)
+                os.replace(self.workload_file + '.tmp', self.workload_file)
+            return True
         except Exception as e:
             print(f"❌ Error saving workload: {e}")
+            return False
+    
+    def set_defer_saves(self, enabled):
+        """Leave writing the workload file to flush() calls, e.g. from a background stage"""
+        with self.lock:
+            if enabled and not self.defer_saves and self.workload_file is not None:
+                atexit.register(self.flush)
+            self.defer_saves = enabled
+            if not enabled:
+                self.flush()
+    
+    def flush(self):
+        """Write the changes that deferred saves held back"""
+        with self.lock:
+            if self._unsaved:
+                self._unsaved = False
+                if not self.write_workload():
+                    self._unsaved = True  # Try again on the next flush
     
     def get_available_workers(self, required_specialization=None):
         """Get list of available workers who can take more jobs"""
-        available_workers = []
+        with self.lock:
+            available_workers = []
         
-        for worker in self.workers:
-            # Ensure worker has the required field
-            if 'max_concurrent_jobs' not in worker:
-                worker['max_concurrent_jobs'] = 3  # Default value
+            for worker in self.workers:
+                # Ensure worker has the required field
+                if 'max_concurrent_jobs' not in worker:
+                    worker['max_concurrent_jobs'] = 3  # Default value
             
-            # Check if worker has capacity for more jobs
-            can_take_more_jobs = (
-                len(worker['current_jobs']) < worker['max_concurrent_jobs'] and
-                worker['current_workload'] < worker['total_capacity'] - 2  # Leave 2 hours buffer
-            )
+                # Check if worker has capacity for more jobs
+                can_take_more_jobs = (
+                    len(worker['current_jobs']) < worker['max_concurrent_jobs'] and
+                    worker['current_workload'] < worker['total_capacity'] - 2  # Leave 2 hours buffer
+                )
             
-            # Check specialization match if required
-            specialization_match = (
-                not required_specialization or 
-                required_specialization in worker['specialization'] or
-                worker['specialization'] == 'General Maintenance'
-            )
+                # Check specialization match if required
+                specialization_match = (
+                    not required_specialization or 
+                    required_specialization in worker['specialization'] or
+                    worker['specialization'] == 'General Maintenance'
+                )
             
-            if can_take_more_jobs and specialization_match:
-                available_workers.append(worker)
+                if can_take_more_jobs and specialization_match:
+                    available_workers.append(worker)
         
-        return available_workers
+            return available_workers
     
-    def assign_worker(self, job_duration, service_type=None, car_model=None):
+    def assign_worker(self, job_duration, service_type=None, car_model=None, selected_tasks=None):
         """Assign a worker to a job, considering multiple concurrent jobs"""
-        # Ensure workers list is not empty
-        if not self.workers:
-            print("⚠️ No workers available, initializing default workers...")
-            self.initialize_default_workers()
+        with self.lock:
+            # Ensure workers list is not empty
+            if not self.workers:
+                print("⚠️ No workers available, initializing default workers...")
+                self.initialize_default_workers()
         
-        # Determine required specialization based on service type
-        specialization_map = {
-            'General': 'General Maintenance',
-            'Major': 'Engine Specialist',
-            'Brake': 'Brake Expert',
-            'AC': 'AC Technician'
-        }
-        required_specialization = specialization_map.get(service_type, 'General Maintenance')
+            # Determine required specialization based on service type
+            required_specialization = SPECIALIZATION_MAP.get(service_type, 'General Maintenance')
         
-        print(f"🔧 Looking for {required_specialization} for {service_type} service on {car_model}")
+            print(f"🔧 Looking for {required_specialization} for {service_type} service on {car_model}")
         
-        # Get available workers
-        available_workers = self.get_available_workers(required_specialization)
+            # Get available workers
+            available_workers = self.get_available_workers(required_specialization)
         
-        if available_workers:
-            # Strategy 1: Prefer workers with matching specialization and lowest workload
-            best_worker = None
-            best_score = float('-inf')
+            if available_workers:
+                # Strategy 1: Prefer workers with matching specialization and lowest workload
+                best_worker = None
+                best_score = float('-inf')
             
-            for worker in available_workers:
-                # Calculate score for worker selection
-                score = 0
+                for worker in available_workers:
+                    # Calculate score for worker selection
+                    score = 0
                 
-                # Specialization match bonus
-                if required_specialization in worker['specialization']:
-                    score += 50
-                elif worker['specialization'] == 'General Maintenance':
-                    score += 25
+                    # Specialization match bonus
+                    if required_specialization in worker['specialization']:
+                        score += 50
+                    elif worker['specialization'] == 'General Maintenance':
+                        score += 25
                 
-                # Lower workload is better
-                workload_bonus = (worker['total_capacity'] - worker['current_workload']) * 10
-                score += workload_bonus
+                    # Lower workload is better
+                    workload_bonus = (worker['total_capacity'] - worker['current_workload']) * 10
+                    score += workload_bonus
                 
-                # Fewer current jobs is better
-                jobs_bonus = (worker['max_concurrent_jobs'] - len(worker['current_jobs'])) * 20
-                score += jobs_bonus
+                    # Fewer current jobs is better
+                    jobs_bonus = (worker['max_concurrent_jobs'] - len(worker['current_jobs'])) * 20
+                    score += jobs_bonus
                 
-                # Efficiency bonus
-                efficiency_bonus = (worker['efficiency'] - 1) * 30
-                score += efficiency_bonus
+                    # Efficiency bonus
+                    efficiency_bonus = (worker['efficiency'] - 1) * 30
+                    score += efficiency_bonus
                 
-                if score > best_score:
-                    best_score = score
-                    best_worker = worker
+                    if score > best_score:
+                        best_score = score
+                        best_worker = worker
             
-            if best_worker:
-                return self.assign_to_worker(best_worker, job_duration, service_type, car_model)
-        
-        # Strategy 2: If no specialized workers available, try general maintenance workers
-        if required_specialization != 'General Maintenance':
-            general_workers = self.get_available_workers('General Maintenance')
-            if general_workers:
-                # Pick the general worker with lowest workload
-                general_workers.sort(key=lambda w: w['current_workload'])
-                return self.assign_to_worker(general_workers[0], job_duration, service_type, car_model)
-        
-        # Strategy 3: If still no workers, find anyone with capacity
-        all_available = self.get_available_workers()
-        if all_available:
-            all_available.sort(key=lambda w: w['current_workload'])
-            return self.assign_to_worker(all_available[0], job_duration, service_type, car_model)
-        
-        # Strategy 4: If no workers available at all, add to queue
-        return self.add_to_queue(job_duration, service_type, car_model)
-    
-    def assign_to_worker(self, worker, job_duration, service_type, car_model):
-        """Assign a specific job to a worker and return both assignment info and service data"""
-        # Ensure worker has required fields
-        if 'max_concurrent_jobs' not in worker:
-            worker['max_concurrent_jobs'] = 3
+                if best_worker:
+                    return self.assign_to_worker(best_worker, job_duration, service_type, car_model)
+        
+            # Strategy 2: If no specialized workers available, try general maintenance workers
+            if required_specialization != 'General Maintenance':
+                general_workers = self.get_available_workers('General Maintenance')
+                if general_workers:
+                    # Pick the general worker with lowest workload
+                    general_workers.sort(key=lambda w: w['current_workload'])
+                    return self.assign_to_worker(general_workers[0], job_duration, service_type, car_model)
+        
+            # Strategy 3: If still no workers, find anyone with capacity
+            all_available = self.get_available_workers()
+            if all_available:
+                all_available.sort(key=lambda w: w['current_workload'])
+                return self.assign_to_worker(all_available[0], job_duration, service_type, car_model)
+        
+            # Strategy 4: If no workers available at all, add to queue
+            return self.add_to_queue(job_duration, service_type, car_model, selected_tasks)
+    
+    def assign_to_worker(self, worker, job_duration, service_type, car_model, service_id=None):
+        """Assign a specific job to a worker and return both assignment info and service data
+
+        Queued services pass their existing service_id so they keep it once promoted.
+        """
+        with self.lock:
+            # Ensure worker has required fields
+            if 'max_concurrent_jobs' not in worker:
+                worker['max_concurrent_jobs'] = 3
         
-        if 'efficiency' not in worker:
-            worker['efficiency'] = 1.0
-        
-        # Adjust job duration by worker efficiency
-        adjusted_duration = job_duration / worker['efficiency']
-        
-        # Calculate start time (can be now or later based on current workload)
-        start_time = datetime.now()
-        if worker['current_jobs']:
-            # Find the earliest available slot
-            latest_completion = max([
-                datetime.fromisoformat(job['completion_time']) 
-                for job in worker['current_jobs']
-            ])
-            start_time = max(start_time, latest_completion)
-        
-        completion_time = start_time + timedelta(hours=adjusted_duration)
-        
-        # Generate service ID
-        service_id = f"VOL_{datetime.now().strftime('%Y%m%d%H%M%S')}{worker['id']}"
-        
-        # Add job to worker
-        job_data = {
-            'service_id': service_id,
-            'car_model': car_model,
-            'service_type': service_type,
-            'start_time': start_time.isoformat(),
-            'completion_time': completion_time.isoformat(),
-            'duration': adjusted_duration,
-            'original_duration': job_duration,
-            'assigned_at': datetime.now().isoformat(),
-            'status': 'active'
-        }
+            if 'efficiency' not in worker:
+                worker['efficiency'] = 1.0
+        
+            # Adjust job duration by worker efficiency
+            adjusted_duration = job_duration / worker['efficiency']
+        
+            # Calculate start time (can be now or later based on current workload)
+            start_time = self.now()
+            if worker['current_jobs']:
+                # Find the earliest available slot
+                latest_completion = max([
+                    datetime.fromisoformat(job['completion_time']) 
+                    for job in worker['current_jobs']
+                ])
+                start_time = max(start_time, latest_completion)
+        
+            completion_time = start_time + timedelta(hours=adjusted_duration)
+        
+            # Generate service ID
+            service_id = service_id or self.unique_service_id(f"VOL_{self.now().strftime('%Y%m%d%H%M%S')}{worker['id']}")
+        
+            # Add job to worker
+            job_data = {
+                'service_id': service_id,
+                'car_model': car_model,
+                'service_type': service_type,
+                'start_time': start_time.isoformat(),
+                'completion_time': completion_time.isoformat(),
+                'duration': adjusted_duration,
+                'original_duration': job_duration,
+                'assigned_at': self.now().isoformat(),
+                'status': 'active'
+            }
         
-        worker['current_jobs'].append(job_data)
-        worker['current_workload'] = sum(job['duration'] for job in worker['current_jobs'])
+            worker['current_jobs'].append(job_data)
+            worker['current_workload'] = sum(job['duration'] for job in worker['current_jobs'])
+            self.track_job(worker, job_data, 1)
+            self.mark_changed(worker)
         
-        # Store in active services
-        self.active_services[service_id] = {
-            'worker_id': worker['id'],
-            'worker_name': worker['name'],
-            'job_data': job_data
-        }
+            # Store in active services
+            self.active_services[service_id] = {
+                'worker_id': worker['id'],
+                'worker_name': worker['name'],
+                'job_data': job_data
+            }
         
-        self.save_workload()
+            self.save_workload()
         
-        print(f"✅ Assigned service to {worker['name']} ({worker['specialization']})")
-        print(f"   📊 Worker now has {len(worker['current_jobs'])} jobs, {worker['current_workload']:.1f}h workload")
-        print(f"   ⏰ Completion: {completion_time.strftime('%Y-%m-%d %H:%M')}")
+            print(f"✅ Assigned service to {worker['name']} ({worker['specialization']})")
+            print(f"   📊 Worker now has {len(worker['current_jobs'])} jobs, {worker['current_workload']:.1f}h workload")
+            print(f"   ⏰ Completion: {completion_time.strftime('%Y-%m-%d %H:%M')}")
         
-        # Return both assignment info AND service data for app.py to use
-        assignment_info = {
-            'worker_id': worker['id'],
-            'worker_name': worker['name'],
-            'specialization': worker['specialization'],
-            'efficiency': worker['efficiency'],
-            'rating': worker.get('rating', 4.5),
-            'completion_time': completion_time.isoformat(),
-            'adjusted_duration': round(adjusted_duration, 2),
-            'workload_percentage': (worker['current_workload'] / worker['total_capacity']) * 100,
-            'current_jobs_count': len(worker['current_jobs']),
-            'queue_position': 0,  # Not in queue
-            'immediate_start': len(worker['current_jobs']) == 1  # Immediate start if first job
-        }
+            # Return both assignment info AND service data for app.py to use
+            assignment_info = {
+                'worker_id': worker['id'],
+                'worker_name': worker['name'],
+                'specialization': worker['specialization'],
+                'efficiency': worker['efficiency'],
+                'rating': worker.get('rating', 4.5),
+                'completion_time': completion_time.isoformat(),
+                'adjusted_duration': round(adjusted_duration, 2),
+                'workload_percentage': (worker['current_workload'] / worker['total_capacity']) * 100,
+                'current_jobs_count': len(worker['current_jobs']),
+                'queue_position': 0,  # Not in queue
+                'immediate_start': len(worker['current_jobs']) == 1  # Immediate start if first job
+            }
         
-        # Also return the service data that should be added to active_services
-        service_data = {
-            'service_id': service_id,
-            'worker_assigned': assignment_info,
-            'job_data': job_data
-        }
+            # Also return the service data that should be added to active_services
+            service_data = {
+                'service_id': service_id,
+                'worker_assigned': assignment_info,
+                'job_data': job_data
+            }
         
-        return assignment_info, service_data
+            return assignment_info, service_data
     
-    def add_to_queue(self, job_duration, service_type, car_model):
-        """Add service to queue when no workers are available and return both assignment info and service data"""
-        service_id = f"QUEUE_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        queue_item = {
-            'service_id': service_id,
-            'car_model': car_model,
-            'service_type': service_type,
-            'job_duration': job_duration,
-            'added_to_queue': datetime.now().isoformat(),
-            'estimated_wait_time': self.estimate_wait_time()
-        }
-        
-        self.service_queue.append(queue_item)
-        self.save_workload()
-        
-        queue_position = len(self.service_queue)
-        estimated_wait = self.estimate_wait_time()
-        
-        print(f"⏳ Service added to queue. Position: {queue_position}, Estimated wait: {estimated_wait}h")
-        
-        assignment_info = {
-            'worker_id': None,
-            'worker_name': 'Queue',
-            'specialization': 'Waiting',
-            'completion_time': None,
-            'adjusted_duration': job_duration,
-            'workload_percentage': 0,
-            'current_jobs_count': 0,
-            'queue_position': queue_position,
-            'estimated_wait_time': estimated_wait,
-            'immediate_start': False
-        }
-        
-        service_data = {
-            'service_id': service_id,
-            'worker_assigned': assignment_info,
-            'is_queued': True
-        }
-        
-        return assignment_info, service_data
+    def unique_service_id(self, base_id):
+        """Suffix a service ID when another service was created in the same second"""
+        with self.lock:
+            queued_ids = {item['service_id'] for item in self.service_queue} if base_id.startswith('QUEUE_') else ()
+            service_id = base_id
+            suffix = 1
+            while service_id in self.active_services or service_id in queued_ids:
+                suffix += 1
+                service_id = f"{base_id}_{suffix}"
+            return service_id
     
-    def estimate_wait_time(self):
-        """Estimate wait time for queued services"""
-        if not self.workers:
-            return 4.0  # Default estimate
+    def add_to_queue(self, job_duration, service_type, car_model, selected_tasks=None):
+        """Add service to queue when no workers are available and return both assignment info and service data"""
+        with self.lock:
+            service_id = self.unique_service_id(f"QUEUE_{self.now().strftime('%Y%m%d%H%M%S')}")
+            required_specialization = SPECIALIZATION_MAP.get(service_type, 'General Maintenance')
+            estimated_wait = self.estimate_wait_time(required_specialization)
+        
+            queue_item = {
+                'service_id': service_id,
+                'car_model': car_model,
+                'service_type': service_type,
+                'required_specialization': required_specialization,
+                'job_duration': job_duration,
+                'selected_tasks': list(selected_tasks or []),
+                'added_to_queue': self.now().isoformat(),
+                'estimated_wait_time': estimated_wait
+            }
         
-        # Calculate average completion time of current jobs
-        total_remaining_time = 0
-        active_jobs = 0
+            self.service_queue.append(queue_item)
+            self.track_queue_item(queue_item, 1)
+            self.mark_changed()
+            self.save_workload()
         
-        for worker in self.workers:
-            for job in worker['current_jobs']:
-                completion_time = datetime.fromisoformat(job['completion_time'])
-                remaining_time = (completion_time - datetime.now()).total_seconds() / 3600
-                if remaining_time > 0:
-                    total_remaining_time += remaining_time
-                    active_jobs += 1
+            queue_position = len(self.service_queue)
+        
+            print(f"⏳ Service added to queue. Position: {queue_position}, Estimated wait: {estimated_wait}h")
+        
+            assignment_info = {
+                'worker_id': None,
+                'worker_name': 'Queue',
+                'specialization': 'Waiting',
+                'required_specialization': required_specialization,
+                'completion_time': None,
+                'adjusted_duration': job_duration,
+                'workload_percentage': 0,
+                'current_jobs_count': 0,
+                'queue_position': queue_position,
+                'estimated_wait_time': estimated_wait,
+                'immediate_start': False
+            }
         
-        if active_jobs == 0:
-            return 1.0  # Minimal wait if no active jobs
+            service_data = {
+                'service_id': service_id,
+                'worker_assigned': assignment_info,
+                'is_queued': True
+            }
         
-        avg_remaining = total_remaining_time / active_jobs
-        queue_length = len(self.service_queue)
+            return assignment_info, service_data
+    
+    def estimate_wait_time(self, required_specialization=None):
+        """Estimate wait time for queued services from the running aggregates"""
+        with self.lock:
+            if not self.workers:
+                return 4.0  # Default estimate
+        
+            # Specialists and general maintenance workers can both take the job
+            if required_specialization:
+                eligible = {required_specialization, 'General Maintenance'}
+            else:
+                eligible = self._spec_job_count.keys() | self._spec_worker_count.keys()
+        
+            active_jobs = sum(self._spec_job_count.get(spec, 0) for spec in eligible)
+            if active_jobs <= 0:
+                return 1.0  # Minimal wait if no active jobs
+        
+            # Average the time left over jobs not yet due; an overdue job has no time left to
+            # count, and left in the sums it would pull the average below what is really left
+            now_epoch = self.now().timestamp()
+            self.drop_overdue_jobs(now_epoch)
+            due_jobs = sum(self._spec_due_count.get(spec, 0) for spec in eligible)
+            if due_jobs > 0:
+                completion_sum = sum(self._spec_completion_sum.get(spec, 0) for spec in eligible)
+                avg_remaining = max(0.0, (completion_sum / due_jobs - now_epoch) / 3600)
+            else:
+                avg_remaining = 1.0  # Every job is overdue but still running: the same minimal wait
         
-        # Estimate: average remaining time + 1 hour per queued job
-        estimated_wait = avg_remaining + (queue_length * 1.0)
+            # Spread the queued backlog that competes for the same workers across them
+            if required_specialization:
+                queued_hours = self._queue_backlog.get(required_specialization, 0)
+            else:
+                queued_hours = sum(self._queue_backlog.values())
+            eligible_workers = sum(self._spec_worker_count.get(spec, 0) for spec in eligible)
+            estimated_wait = avg_remaining + queued_hours / max(1, eligible_workers)
         
-        return min(estimated_wait, 8.0)  # Cap at 8 hours
+            return min(round(estimated_wait, 2), 8.0)  # Cap at 8 hours
     
     def process_queue(self):
         """Process queued services when workers become available"""
-        processed = []
-        
-        for queue_item in self.service_queue[:]:  # Copy for safe iteration
-            available_workers = self.get_available_workers()
-            if available_workers:
-                # Assign this queued service
-                worker_assignment, service_data = self.assign_to_worker(
-                    available_workers[0],
-                    queue_item['job_duration'],
-                    queue_item['service_type'],
-                    queue_item['car_model']
-                )
+        with self.lock:
+            processed = []
+            self.last_promoted = processed  # Exposed so callers of complete_service can see promotions
+        
+            for queue_item in self.service_queue[:]:  # Copy for safe iteration
+                available_workers = self.get_available_workers()
+                if available_workers:
+                    # Assign this queued service
+                    worker_assignment, service_data = self.assign_to_worker(
+                        available_workers[0],
+                        queue_item['job_duration'],
+                        queue_item['service_type'],
+                        queue_item['car_model'],
+                        service_id=queue_item['service_id']
+                    )
                 
-                # Update the service ID to match the original queue item if needed
-                if worker_assignment:
-                    self.service_queue.remove(queue_item)
-                    processed.append({
-                        'original_queue_item': queue_item,
-                        'worker_assignment': worker_assignment,
-                        'service_data': service_data
-                    })
-                    print(f"🚀 Processed queued service: {queue_item['car_model']} {queue_item['service_type']}")
-        
-        self.save_workload()
-        return processed
+                    if worker_assignment:
+                        self.service_queue.remove(queue_item)
+                        self.track_queue_item(queue_item, -1)
+                        if queue_item.get('booking'):
+                            self.active_services[queue_item['service_id']]['booking'] = {
+                                **queue_item['booking'],
+                                'status': 'active',
+                                'worker_assigned': worker_assignment,
+                                'completion_time': worker_assignment['completion_time'],
+                                'start_time': self.now().isoformat() if worker_assignment.get('immediate_start') else None
+                            }
+                        self.mark_changed()
+                        processed.append({
+                            'original_queue_item': queue_item,
+                            'worker_assignment': worker_assignment,
+                            'service_data': service_data
+                        })
+                        print(f"🚀 Processed queued service: {queue_item['car_model']} {queue_item['service_type']}")
+        
+            self.save_workload()
+            return processed
     
     def complete_service(self, service_id):
         """Mark a service as completed and remove from worker's workload"""
-        if service_id in self.active_services:
-            worker_id = self.active_services[service_id]['worker_id']
-            worker = next((w for w in self.workers if w['id'] == worker_id), None)
+        with self.lock:
+            self.last_promoted = []
+            if service_id in self.active_services:
+                worker_id = self.active_services[service_id]['worker_id']
+                worker = next((w for w in self.workers if w['id'] == worker_id), None)
             
-            if worker:
-                # Remove the job from worker's current jobs
-                worker['current_jobs'] = [
-                    job for job in worker['current_jobs'] 
-                    if job['service_id'] != service_id
-                ]
+                if worker:
+                    # Remove the job from worker's current jobs
+                    for job in worker['current_jobs']:
+                        if job['service_id'] == service_id:
+                            self.track_job(worker, job, -1)
+                    worker['current_jobs'] = [
+                        job for job in worker['current_jobs'] 
+                        if job['service_id'] != service_id
+                    ]
                 
-                # Recalculate workload
-                worker['current_workload'] = sum(job['duration'] for job in worker['current_jobs'])
+                    # Recalculate workload
+                    worker['current_workload'] = sum(job['duration'] for job in worker['current_jobs'])
                 
-                # Remove from active services
-                del self.active_services[service_id]
+                    # Remove from active services
+                    del self.active_services[service_id]
+                    self.mark_changed(worker)
                 
-                self.save_workload()
-                print(f"✅ Completed service {service_id}, removed from {worker['name']}")
+                    self.save_workload()
+                    print(f"✅ Completed service {service_id}, removed from {worker['name']}")
                 
-                # Process queue after completing a service
-                self.process_queue()
+                    # Process queue after completing a service
+                    self.process_queue()
+                    return True
+        
+            # Also check if service is in queue
+            queue_item = next((item for item in self.service_queue if item['service_id'] == service_id), None)
+            if queue_item:
+                self.service_queue.remove(queue_item)
+                self.track_queue_item(queue_item, -1)
+                self.mark_changed()
+                self.save_workload()
+                print(f"✅ Removed queued service {service_id}")
                 return True
         
-        # Also check if service is in queue
-        queue_item = next((item for item in self.service_queue if item['service_id'] == service_id), None)
-        if queue_item:
-            self.service_queue.remove(queue_item)
-            self.save_workload()
-            print(f"✅ Removed queued service {service_id}")
-            return True
-        
-        return False
+            return False
     
     def get_workload_data(self):
-        """Get current workload data for all workers"""
-        if not self.workers:
-            self.initialize_default_workers()
-            
-        workload_data = []
-        total_concurrent_jobs = 0
+        """Get current workload data for all workers (served from a cached snapshot)"""
+        with self.lock:
+            if not self.workers:
+                self.initialize_default_workers()
         
-        for worker in self.workers:
-            # Ensure worker has all required fields
-            if 'max_concurrent_jobs' not in worker:
-                worker['max_concurrent_jobs'] = 3
-            
-            workload_percentage = (worker['current_workload'] / worker['total_capacity']) * 100
-            total_concurrent_jobs += len(worker['current_jobs'])
-            
-            # Determine status
-            if workload_percentage < 40:
-                status = 'low'
-                status_text = 'Available'
-            elif workload_percentage < 70:
-                status = 'medium'
-                status_text = 'Moderate'
-            else:
-                status = 'high'
-                status_text = 'Busy'
-            
-            workload_data.append({
-                'id': worker['id'],
-                'name': worker['name'],
-                'specialization': worker.get('specialization', 'General Maintenance'),
-                'workload_percentage': round(workload_percentage, 1),
-                'current_jobs': len(worker['current_jobs']),
-                'max_jobs': worker['max_concurrent_jobs'],
-                'current_workload': round(worker['current_workload'], 2),
-                'total_capacity': worker['total_capacity'],
-                'efficiency': worker.get('efficiency', 1.0),
-                'rating': worker.get('rating', 4.5),
-                'status': status,
-                'status_text': status_text,
-                'jobs_list': [f"{job['car_model']} ({job['service_type']})" for job in worker['current_jobs']]
-            })
+            if self._snapshot is None:
+                self._snapshot = self.build_workload_snapshot()
+            elif self._dirty_workers:
+                self.patch_workload_snapshot()
         
-        total_capacity = sum(w['total_capacity'] for w in self.workers)
-        utilized_capacity = sum(w['current_workload'] for w in self.workers)
-        capacity_utilization = (utilized_capacity / total_capacity * 100) if total_capacity > 0 else 0
+            return self._snapshot
+    
+    def get_version(self):
+        return self.version
+    
+    def get_workload_changes(self, since_version):
+        """Return the workload snapshot only if it changed after since_version"""
+        with self.lock:
+            snapshot = self.get_workload_data()
+            if since_version is not None and since_version == self.version:
+                return {'changed': False, 'version': self.version}
+            return snapshot
+    
+    def build_worker_entry(self, worker):
+        """Build the dashboard view of a single worker"""
+        # Ensure worker has all required fields
+        if 'max_concurrent_jobs' not in worker:
+            worker['max_concurrent_jobs'] = 3
+        
+        workload_percentage = (worker['current_workload'] / worker['total_capacity']) * 100
+        
+        # Determine status
+        if workload_percentage < 40:
+            status = 'low'
+            status_text = 'Available'
+        elif workload_percentage < 70:
+            status = 'medium'
+            status_text = 'Moderate'
+        else:
+            status = 'high'
+            status_text = 'Busy'
         
         return {
-            'workers': workload_data,
-            'summary': {
-                'total_workers': len(self.workers),
-                'total_active_jobs': total_concurrent_jobs,
-                'available_workers': len(self.get_available_workers()),
-                'queued_services': len(self.service_queue),
-                'total_capacity': total_capacity,
-                'utilized_capacity': utilized_capacity,
-                'total_capacity_utilization': round(capacity_utilization, 1)
-            }
+            'id': worker['id'],
+            'name': worker['name'],
+            'specialization': worker.get('specialization', 'General Maintenance'),
+            'workload_percentage': round(workload_percentage, 1),
+            'current_jobs': len(worker['current_jobs']),
+            'max_jobs': worker['max_concurrent_jobs'],
+            'current_workload': round(worker['current_workload'], 2),
+            'total_capacity': worker['total_capacity'],
+            'efficiency': worker.get('efficiency', 1.0),
+            'rating': worker.get('rating', 4.5),
+            'status': status,
+            'status_text': status_text,
+            'jobs_list': [f"{job['car_model']} ({job['service_type']})" for job in worker['current_jobs']]
         }
     
-    def get_queue_info(self):
-        """Get queue and worker availability information"""
-        workload_data = self.get_workload_data()
-        available_workers = len(self.get_available_workers())
+    def worker_contribution(self, worker):
+        """Raw per-worker figures that the snapshot summary is made of"""
+        can_take_more_jobs = (
+            len(worker['current_jobs']) < worker.get('max_concurrent_jobs', 3) and
+            worker['current_workload'] < worker['total_capacity'] - 2
+        )
+        return {
+            'jobs': len(worker['current_jobs']),
+            'workload': worker['current_workload'],
+            'available': 1 if can_take_more_jobs else 0
+        }
+    
+    def build_workload_snapshot(self):
+        """Rebuild the full workload snapshot from scratch"""
+        with self.lock:
+            workload_data = []
+            self._snapshot_index = {}
+            self._snapshot_contrib = {}
+            total_concurrent_jobs = 0
+            utilized_capacity = 0
+            available_workers = 0
+        
+            for position, worker in enumerate(self.workers):
+                workload_data.append(self.build_worker_entry(worker))
+                contribution = self.worker_contribution(worker)
+                self._snapshot_index[worker['id']] = position
+                self._snapshot_contrib[worker['id']] = contribution
+                total_concurrent_jobs += contribution['jobs']
+                utilized_capacity += contribution['workload']
+                available_workers += contribution['available']
+        
+            self._dirty_workers.clear()
+            total_capacity = sum(w['total_capacity'] for w in self.workers)
+        
+            return {
+                'workers': workload_data,
+                'summary': self.build_summary(total_capacity, utilized_capacity,
+                                              total_concurrent_jobs, available_workers),
+                'version': self.version
+            }
+    
+    def patch_workload_snapshot(self):
+        """Refresh only the workers that changed since the snapshot was built"""
+        with self.lock:
+            summary = self._snapshot['summary']
+            # Readers may still hold the previous snapshot, so patch a copy of it
+            workload_data = list(self._snapshot['workers'])
+            total_concurrent_jobs = summary['total_active_jobs']
+            utilized_capacity = summary['utilized_capacity']
+            available_workers = summary['available_workers']
+        
+            for worker_id in self._dirty_workers:
+                position = self._snapshot_index.get(worker_id)
+                if position is None:
+                    # Unknown worker, fall back to a full rebuild
+                    self._snapshot = self.build_workload_snapshot()
+                    return
+            
+                worker = self.workers[position]
+                old = self._snapshot_contrib[worker_id]
+                new = self.worker_contribution(worker)
+                total_concurrent_jobs += new['jobs'] - old['jobs']
+                utilized_capacity += new['workload'] - old['workload']
+                available_workers += new['available'] - old['available']
+            
+                workload_data[position] = self.build_worker_entry(worker)
+                self._snapshot_contrib[worker_id] = new
+        
+            self._dirty_workers.clear()
+            self._snapshot = {
+                'workers': workload_data,
+                'summary': self.build_summary(summary['total_capacity'], utilized_capacity,
+                                              total_concurrent_jobs, available_workers),
+                'version': self.version
+            }
+    
+    def build_summary(self, total_capacity, utilized_capacity, total_concurrent_jobs, available_workers):
+        """Build the summary block of the workload snapshot"""
+        capacity_utilization = (utilized_capacity / total_capacity * 100) if total_capacity > 0 else 0
         
         return {
-            'total_active_jobs': workload_data['summary']['total_active_jobs'],
-            'available_workers': available_workers,
-            'busy_workers': len(self.workers) - available_workers,
             'total_workers': len(self.workers),
+            'total_active_jobs': total_concurrent_jobs,
+            'available_workers': available_workers,
             'queued_services': len(self.service_queue),
-            'average_workload': workload_data['summary']['utilized_capacity'] / len(self.workers) if self.workers else 0,
-            'total_capacity_utilization': workload_data['summary']['total_capacity_utilization']
+            'total_capacity': total_capacity,
+            'utilized_capacity': utilized_capacity,
+            'total_capacity_utilization': round(capacity_utilization, 1)
         }
     
+    def get_queue_info(self, service_type=None):
+        """Get queue and worker availability information"""
+        with self.lock:
+            summary = self.get_workload_data()['summary']
+            available_workers = summary['available_workers']
+            required_specialization = SPECIALIZATION_MAP.get(service_type) if service_type else None
+        
+            return {
+                'total_active_jobs': sum(self._spec_job_count.values()),
+                'available_workers': available_workers,
+                'busy_workers': len(self.workers) - available_workers,
+                'total_workers': len(self.workers),
+                'queued_services': len(self.service_queue),
+                'queued_for_specialization': self._queue_counts.get(required_specialization, 0) if required_specialization else len(self.service_queue),
+                'average_workload': summary['utilized_capacity'] / len(self.workers) if self.workers else 0,
+                'total_capacity_utilization': summary['total_capacity_utilization'],
+                'estimated_wait_time': self.estimate_wait_time(required_specialization)
+            }
+    
     def get_active_services_count(self):
         """Get the actual count of active services"""
         return len(self.active_services)
     
+    def attach_booking(self, service_id, booking):
+        """Keep a service's full booking record with its job or queue item, so a restart restores it"""
+        with self.lock:
+            entry = self.active_services.get(service_id) or next(
+                (item for item in self.service_queue if item['service_id'] == service_id), None)
+            if entry is None:
+                return False
+            entry['booking'] = booking
+            self.save_workload()
+            return True
+    
     def get_all_active_services(self):
         """Get all active services data"""
-        return self.active_services
+        with self.lock:
+            return dict(self.active_services)
+    
+    def get_last_promoted(self):
+        """Get the queue items promoted to a worker by the latest process_queue() run"""
+        return self.last_promoted
+    
+    def get_service_queue(self):
+        """Get the services waiting for a worker"""
+        with self.lock:
+            return list(self.service_queue)
+    
+    def get_queued_tasks(self):
+        """Selected tasks of every queued service, for forecasting the parts they will need"""
+        with self.lock:
+            return [item.get('selected_tasks', []) for item in self.service_queue]
+    
+    def get_workers(self):
+        """Get the raw worker records"""
+        with self.lock:
+            return list(self.workers)
     
     def reset_all(self):
         """Reset all workload data"""
-        self.workers = []
-        self.active_services = {}
-        self.service_queue = []
-        self.initialize_default_workers()
-        self.save_workload()
-        print("🔄 Reset all workload data")
\ No newline at end of file
+        with self.lock:
+            self.workers = []
+            self.active_services = {}
+            self.service_queue = []
+            self.initialize_default_workers()
+            self.mark_changed()
+            self.save_workload()
+            print("🔄 Reset all workload data")
\ No newline at end of file